@@ -1,8 +1,16 @@
 # Flask_App.py
+import base64
+import hmac
+import html
+import json
 import os
 import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, request, render_template, jsonify, redirect, url_for, flash, Response
+from flask import Flask, request, render_template, jsonify, redirect, url_for, flash, Response, stream_with_context
+from jinja2 import FileSystemBytecodeCache
 from flask_login import (
     LoginManager,
     login_user,
@@ -11,9 +19,26 @@ from flask_login import (
     current_user,
     UserMixin,
 )
-from sqlalchemy import create_engine, Integer, String, Text, DateTime, ForeignKey, or_, text
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, Session
-from openai import OpenAI
+from sqlalchemy import create_engine, inspect, Boolean, Integer, LargeBinary, String, Text, DateTime, ForeignKey, Index, func, text, tuple_, update
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import DeclarativeBase, Mapped, joinedload, mapped_column, relationship, Session
+from sqlalchemy.types import TypeDecorator
+from blob_store import decompress, put_blob
+from assets import Assets
+import instrumentation
+import metrics
+import prompts
+from prompts import PromptBudgetError, loading_pressure, providers, scales
+from jobs import JobRunner, TERMINAL_STATES
+import llm_client
+from llm_cache import CachedAnswer, LRUTTLCache, PostgresCacheTier, TwoTierCache, make_cache_key
+from singleflight import SharedFlightLocks, SingleFlight
+from near_dup import NearDuplicateIndex
+from history_writer import WriteBehindQueue
+from pipeline import DependencyFailed, Stage, run_dag
+from terraform_modules import parse_modules, part_fingerprints, section_paths, stitch_part
+from result_parser import normalize_result, strip_code_fences
+from zip_export import ARCHIVE_TYPES, ArchiveItem, archive_name, stream_archive
 
 print(">>> PY:", sys.executable)
 print(">>> CWD:", os.getcwd())
@@ -21,10 +46,19 @@ print(">>> FILE:", __file__)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret-change-me")
+# Hashed, precompressed static files (python assets.py); see assets.py.
+static_assets = Assets(app)
 file_path = ""
 
 
-def load_env_files():
+_env_file_keys: set[str] = set()
+
+
+def load_env_files(reload: bool = False):
+    """Load .env (or .env.example) into os.environ without clobbering real env vars.
+
+    With ``reload=True`` keys that originally came from the file are refreshed.
+    """
     base_dir = os.path.dirname(os.path.abspath(__file__))
     for name in [".env", ".env.example"]:
         path = os.path.join(base_dir, name)
@@ -39,14 +73,38 @@ def load_env_files():
                     k, v = line.split("=", 1)
                     k = k.strip()
                     v = v.strip().strip('"').strip("'")
-                    if k and os.environ.get(k) is None:
+                    if k and (os.environ.get(k) is None or (reload and k in _env_file_keys)):
                         os.environ[k] = v
+                        _env_file_keys.add(k)
             break
         except Exception:
             pass 
 
 load_env_files()
 
+# APP_ENV=development: debug on, templates re-checked on disk per render.
+# Otherwise (production, the default under gunicorn) compiled templates stay
+# cached and Jinja bytecode is persisted to a directory shared by the workers.
+# Running this file directly defaults to development.
+APP_ENV = (os.environ.get("APP_ENV") or ("development" if __name__ == "__main__" else "production")).strip().lower()
+DEV_MODE = APP_ENV in ("dev", "development")
+if DEV_MODE:
+    app.config["DEBUG"] = True
+    app.config["TEMPLATES_AUTO_RELOAD"] = True
+    app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 0
+else:
+    app.config["TEMPLATES_AUTO_RELOAD"] = False
+    _bytecode_dir = os.environ.get("JINJA_BYTECODE_CACHE_DIR", "/tmp/jinja-bytecode")
+    try:
+        os.makedirs(_bytecode_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(_bytecode_dir)
+    except OSError as e:
+        print(f">>> WARN: Jinja bytecode cache disabled ({_bytecode_dir}): {e}")
+    # Compile every template now so workers (forked after preload) start warm.
+    for _name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(_name)
+print(f">>> APP_ENV={APP_ENV} (debug={app.debug}, template auto-reload={app.jinja_env.auto_reload})")
+
 class Base(DeclarativeBase):
     pass
 
@@ -61,6 +119,34 @@ class User(Base, UserMixin):
     histories: Mapped[list["History"]] = relationship("History", back_populates="user")
 
 
+HISTORY_PREVIEW_CHARS = 200
+
+
+class SearchVector(TypeDecorator):
+    """``tsvector`` on Postgres; elsewhere a plain, always-NULL text column (no search)."""
+
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        return dialect.type_descriptor(TSVECTOR() if dialect.name == "postgresql" else Text())
+
+
+class ResultBlob(Base):
+    """Compressed generation output, stored once per distinct text (see blob_store)."""
+
+    __tablename__ = "result_blobs"
+    digest: Mapped[str] = mapped_column(String(64), primary_key=True)
+    codec: Mapped[str] = mapped_column(String(8))
+    size: Mapped[int] = mapped_column(Integer)
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    @property
+    def text(self) -> str:
+        return decompress(self.codec, self.data)
+
+
 class History(Base):
     __tablename__ = "histories"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -71,10 +157,75 @@ class History(Base):
     loading: Mapped[str] = mapped_column(String(64), default="")
     country: Mapped[str] = mapped_column(String(128), default="")
     prompt_text: Mapped[str] = mapped_column(Text)
-    result_text: Mapped[str] = mapped_column(Text)
+    # Legacy inline result; new rows reference a ResultBlob instead. Read via .result
+    result_text: Mapped[str | None] = mapped_column(Text, nullable=True)
+    result_digest: Mapped[str | None] = mapped_column(ForeignKey("result_blobs.digest"), nullable=True)
+    result_preview: Mapped[str | None] = mapped_column(String(HISTORY_PREVIEW_CHARS), nullable=True)
+    result_chars: Mapped[int | None] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Weighted prompt (A) + result (B) lexemes, written with each row by
+    # _save_history() and backfilled by init_database(). Postgres only.
+    search_vector = mapped_column(SearchVector, nullable=True, deferred=True)
 
     user: Mapped[User] = relationship("User", back_populates="histories")
+    result_blob: Mapped[ResultBlob | None] = relationship(ResultBlob)
+
+    @property
+    def result(self) -> str:
+        if self.result_digest is not None and self.result_blob is not None:
+            return self.result_blob.text
+        return self.result_text or ""
+
+    __table_args__ = (
+        # Serves the keyset-paginated /history list; INCLUDE makes it covering
+        # for the metadata columns on Postgres.
+        Index(
+            "ix_histories_user_created",
+            "user_id",
+            "created_at",
+            "id",
+            postgresql_include=["item_type", "provider", "scale", "loading", "country"],
+        ),
+        Index("ix_histories_search_vector", "search_vector", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    item_type: Mapped[str] = mapped_column(String(32), default="")
+    model: Mapped[str] = mapped_column(String(64), default="")
+    prompt_version: Mapped[str] = mapped_column(String(32), default="")
+    value: Mapped[str] = mapped_column(Text)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    completion_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    latency_ms: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+
+class LLMInflight(Base):
+    """Cross-worker claim on a cache key while its generation runs (see singleflight.py)."""
+
+    __tablename__ = "llm_inflight"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    owner: Mapped[str] = mapped_column(String(96))
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
+    item_type: Mapped[str] = mapped_column(String(32))
+    status: Mapped[str] = mapped_column(String(16), default="queued")
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False)
+    history_id: Mapped[int | None] = mapped_column(ForeignKey("histories.id"), nullable=True)
+    cache_status: Mapped[str] = mapped_column(String(16), default="")
+    error: Mapped[str] = mapped_column(Text, default="")
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
 
 def _build_db_url_from_env() -> str:
@@ -91,7 +242,128 @@ def _build_db_url_from_env() -> str:
 
 
 DB_URL = os.environ.get("DATABASE_URL", _build_db_url_from_env())
-engine = create_engine(DB_URL, pool_pre_ping=True)
+engine = create_engine(
+    DB_URL,
+    pool_pre_ping=True,
+    pool_size=int(os.environ.get("DB_POOL_SIZE", "5")),
+    max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+    pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT", "30")),
+)
+
+# Sampled request timing (routing/db/template/llm) as JSON log records; see
+# instrumentation.py. Off unless REQUEST_TRACE_SAMPLE_RATE or _SLOW_MS is set.
+request_tracing = instrumentation.Instrumentation.from_env()
+request_tracing.init_app(app, engine)
+metrics.init_app(app, engine)
+
+SEARCH_CONFIG = os.environ.get("SEARCH_TEXT_CONFIG", "english")
+# Full-text search (history search, export ?q=) uses Postgres tsvector/tsquery.
+SEARCH_ENABLED = engine.dialect.name == "postgresql"
+SEARCH_UNAVAILABLE = "Full-text search needs a PostgreSQL database."
+
+
+def history_search_vector(prompt_text, result_text):
+    """SQL expression for History.search_vector; prompt matches rank above result matches."""
+    return func.setweight(func.to_tsvector(SEARCH_CONFIG, func.coalesce(prompt_text, "")), "A").op("||")(
+        func.setweight(func.to_tsvector(SEARCH_CONFIG, func.coalesce(result_text, "")), "B")
+    )
+
+
+def history_search_query(q: str):
+    return func.websearch_to_tsquery(SEARCH_CONFIG, q)
+
+
+def _ensure_columns():
+    """create_all() never alters existing tables; add (nullable) columns introduced later."""
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl_type = column.type.compile(dialect=engine.dialect)
+                    print(f">>> Adding column {table.name}.{column.name} ({ddl_type})")
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl_type}"))
+
+
+SCHEMA_UPGRADES = [
+    # Results moved to result_blobs; legacy rows keep result_text until migrated.
+    "ALTER TABLE histories ALTER COLUMN result_text DROP NOT NULL",
+]
+
+
+def _apply_schema_upgrades():
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for stmt in SCHEMA_UPGRADES:
+            conn.execute(text(stmt))
+
+
+def _migrate_results_to_blobs(batch_size: int = 200):
+    """Move inline History.result_text into compressed, deduplicated result_blobs."""
+    total = 0
+    while True:
+        with Session(engine) as s:
+            rows = (
+                s.query(History.id, History.result_text)
+                .filter(History.result_digest.is_(None), History.result_text.isnot(None))
+                .limit(batch_size)
+                .all()
+            )
+            for item_id, result in rows:
+                s.execute(
+                    update(History)
+                    .where(History.id == item_id)
+                    .values(
+                        result_digest=put_blob(s, ResultBlob, result),
+                        result_preview=result[:HISTORY_PREVIEW_CHARS],
+                        result_chars=len(result),
+                        result_text=None,
+                    )
+                )
+            s.commit()
+        total += len(rows)
+        if len(rows) < batch_size:
+            break
+    if total:
+        print(f">>> Moved {total} history results into result_blobs")
+
+
+def _backfill_search_vectors(batch_size: int = 1000):
+    if not SEARCH_ENABLED:
+        return
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            pending = (
+                History.__table__.select()
+                .with_only_columns(History.id)
+                .where(History.search_vector.is_(None))
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            n = conn.execute(
+                update(History)
+                .where(History.id.in_(pending))
+                .values(search_vector=history_search_vector(History.prompt_text, History.result_text))
+            ).rowcount
+        total += n
+        if n < batch_size:
+            break
+    if total:
+        print(f">>> Backfilled search vectors for {total} history rows")
+
+
+def _ensure_indexes():
+    """create_all() only indexes the tables it creates; add indexes introduced later."""
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
 
 def init_database():
     """Initialize database tables and test connection with retry logic"""
@@ -108,11 +380,14 @@ def init_database():
                 print(">>> Database connection test successful!")
             print(">>> Creating database tables...")
             Base.metadata.create_all(engine)
+            _ensure_columns()
+            _apply_schema_upgrades()
+            _backfill_search_vectors()
+            _migrate_results_to_blobs()
+            _ensure_indexes()
             print(">>> Database tables created successfully!")
-            with engine.connect() as conn:
-                result = conn.execute(text("SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'"))
-                tables = [row[0] for row in result]
-                print(f">>> Tables in database: {tables}")
+            tables = inspect(engine).get_table_names()
+            print(f">>> Tables in database: {tables}")
                 
             print(">>> Database initialization completed successfully!")
             return True
@@ -130,9 +405,91 @@ def init_database():
     
     return False
 
-print(">>> Flask worker starting database initialization...")
-db_initialized = init_database()
-print(f">>> Database initialization result: {db_initialized}")
+# "import": migrate the schema when this module is imported (local runs; with
+# gunicorn.conf.py's preload_app that is once, in the master, before forking).
+# "skip": the schema is managed by a separate step (`flask --app Flask_App
+# init-db`, e.g. a k8s init container) and workers start without touching it.
+DB_INIT_MODE = (os.environ.get("DB_INIT_MODE") or "import").strip().lower()
+
+if DB_INIT_MODE == "skip":
+    print(">>> DB_INIT_MODE=skip: schema is managed by `flask init-db`")
+    db_initialized = None
+else:
+    print(">>> Flask worker starting database initialization...")
+    db_initialized = init_database()
+    print(f">>> Database initialization result: {db_initialized}")
+
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Create/upgrade the schema once; exits non-zero if the database never came up."""
+    ok = db_initialized if db_initialized is not None else init_database()
+    if not ok:
+        raise SystemExit(1)
+
+
+def _env_flag(name: str, default: str = "1") -> bool:
+    return (os.environ.get(name, default) or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL_SECONDS", "86400"))
+llm_cache = TwoTierCache(
+    LRUTTLCache(
+        max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "256")),
+        max_bytes=int(os.environ.get("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+        ttl=int(os.environ.get("LLM_CACHE_L1_TTL_SECONDS", str(min(LLM_CACHE_TTL, 3600)))),
+    ),
+    PostgresCacheTier(
+        engine,
+        LLMCacheEntry,
+        ttl=LLM_CACHE_TTL,
+        purge_interval=float(os.environ.get("LLM_CACHE_PURGE_INTERVAL_SECONDS", "3600")),
+    )
+    if _env_flag("LLM_CACHE_SHARED")
+    else None,
+    enabled=_env_flag("LLM_CACHE_ENABLED"),
+    report=metrics.observe_llm_cache,
+)
+
+# Near-duplicate descriptions (same other inputs): at or above the seed
+# threshold the answer is generated fresh with the earlier answer as a draft.
+# Serving the earlier answer as is stays off unless a serve threshold is set,
+# and even then needs the same words (stop words aside): a one-word change
+# ("PostgreSQL" -> "MySQL", an added "not") scores above 0.9 yet changes the
+# request. 0 disables either.
+NEAR_DUP_SERVE_THRESHOLD = float(os.environ.get("NEAR_DUP_SERVE_THRESHOLD", "0"))
+NEAR_DUP_SEED_THRESHOLD = float(os.environ.get("NEAR_DUP_SEED_THRESHOLD", "0.8"))
+near_index = (
+    NearDuplicateIndex(max_entries=int(os.environ.get("NEAR_DUP_MAX_ENTRIES", "5000")))
+    if llm_cache.enabled and _env_flag("NEAR_DUP_ENABLED")
+    else None
+)
+
+# Identical concurrent generations share one upstream call. Across workers the
+# answer is handed over through the shared cache tier, so that part needs it.
+LLM_COALESCE_WAIT = float(os.environ.get("LLM_COALESCE_WAIT_SECONDS", "330"))
+inflight = SingleFlight(
+    SharedFlightLocks(engine, LLMInflight, ttl=LLM_COALESCE_WAIT)
+    if llm_cache.enabled
+    and llm_cache.l2 is not None
+    and engine.dialect.name == "postgresql"
+    and _env_flag("LLM_COALESCE_SHARED")
+    else None,
+    wait_timeout=LLM_COALESCE_WAIT,
+    poll_interval=float(os.environ.get("LLM_COALESCE_POLL_SECONDS", "0.5")),
+)
+
+job_runner = JobRunner(
+    max_workers=int(os.environ.get("JOB_WORKERS", "4")),
+    max_pending=int(os.environ.get("JOB_MAX_PENDING", "32")),
+    report=metrics.observe_jobs,
+)
+JOB_CANCEL_POLL_SECONDS = float(os.environ.get("JOB_CANCEL_POLL_SECONDS", "2"))
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", "900"))
+
+# Part of every cache key; bump a template's version in prompts.py whenever
+# its prompt changes so stale cached answers are not served for the new prompt.
+PROMPT_VERSIONS = {name: tpl.version for name, tpl in prompts.TEMPLATES.items()}
 
 
 login_manager = LoginManager()
@@ -140,47 +497,464 @@ login_manager.login_view = "login"
 login_manager.init_app(app)
 
 
+# Flask-Login resolves the user on every authenticated request. Loaded users
+# are kept per worker (detached, read-only) for USER_CACHE_TTL_SECONDS, so
+# polling /history costs no DB round trip. Logout drops the entry here; on
+# other workers the TTL bounds how long a changed account can be served stale.
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL_SECONDS", "300"))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_ENTRY_BYTES = 1024
+user_cache = LRUTTLCache(
+    max_entries=USER_CACHE_MAX_ENTRIES,
+    max_bytes=USER_CACHE_MAX_ENTRIES * USER_CACHE_ENTRY_BYTES,
+    ttl=USER_CACHE_TTL,
+)
+
+
+def _cache_user(user: User) -> None:
+    if USER_CACHE_TTL > 0:
+        user_cache.set(str(user.id), user, USER_CACHE_ENTRY_BYTES)
+
+
+def invalidate_user(user_id) -> None:
+    """Forget a cached user; call after logout or any change to the account."""
+    user_cache.delete(str(user_id))
+
+
 @login_manager.user_loader
 def load_user(user_id: str):
+    user = user_cache.get(user_id) if USER_CACHE_TTL > 0 else None
+    if user is not None:
+        return user
     try:
         with Session(engine) as s:
-            return s.get(User, int(user_id))
+            user = s.get(User, int(user_id))
     except Exception:
         return None
-
-providers = ["AWS", "Azure", "Google Cloud"]
-scales = ["Small (<1k/day)", "Medium (1k-100k/day)", "Large (>100k/day)"]
-loading_pressure = ["Everyday", "3-5 days in week", "No loading pressure"]
+    if user is not None:
+        _cache_user(user)
+    return user
+
+OPENAI_KEY_MISSING = (
+    "OPENAI_API_KEY not set. "
+    "Add it to a .env file (preferred) or .env.example in the project root, "
+    "or export it in your shell."
+)
 
 
-def build_region_accuracy_rules(provider: str | None, country: str | None = None) -> str:
-    """Return a short instruction block to keep region recommendations accurate.
+def reload_config() -> None:
+    """Explicit reload hook: re-read .env and rebuild the shared OpenAI client.
 
-    - Never suggest regions a provider doesn't offer.
-    - Specific guardrails (e.g., Azure has no Bahrain region, AWS does).
+    Affects the calling process only. ``kill -HUP`` on the gunicorn master
+    does not help: with ``preload_app`` the new workers fork from the master's
+    already-imported module, so they keep its config. To change config for
+    every worker, do a rolling restart of the pods.
     """
-    p = (provider or "").strip().lower()
-    c = (country or "").strip()
+    load_env_files(reload=True)
+    llm_client.reset_client()
+    print(">>> Configuration reloaded")
+
+
+SEED_PREAMBLE = (
+    "A previous answer for a very similar project description follows. Reuse what still applies, "
+    "change whatever the description above requires, and answer in the same format:\n\n"
+)
+
 
-    rules: list[str] = [
-        "Do NOT list regions that the selected provider does not actually offer.",
-        "If a requested region is unavailable, clearly state it's not available for this provider and recommend the nearest supported regions instead.",
+def _completion_kwargs(spec: dict) -> dict:
+    messages = [
+        {"role": "system", "content": spec["system"]},
+        {"role": "user", "content": spec["prompt"]},
     ]
+    if spec.get("seed"):
+        messages.append({"role": "user", "content": spec["seed"]})
+    return {
+        "model": spec["model"],
+        "temperature": spec["temperature"],
+        "max_tokens": spec["max_tokens"],
+        "messages": messages,
+    }
 
-    if p == "azure":
-        # User highlighted this specifically; enforce it in the prompt to avoid hallucinations.
-        rules.append(
-            "Azure does not have a Bahrain region. Do not recommend 'Bahrain' for Azure; instead suggest nearby Azure regions (for example 'UAE North' or 'Qatar Central') and explicitly note Bahrain is not an Azure region when relevant."
-        )
-    elif p == "aws":
-        # Useful contrast to avoid removing Bahrain when AWS is selected.
-        rules.append("AWS includes the Bahrain region (me-south-1). Use it when appropriate.")
-    elif p in ("google cloud", "gcp", "google"):
-        rules.append(
-            "Google Cloud does not have a Bahrain region. Use valid GCP regions in the Middle East such as 'me-central2' (Dammam, Saudi Arabia), 'me-central1' (Doha, Qatar), or 'me-west1' (Tel Aviv, Israel). When the user's country is Saudi Arabia, prefer 'me-central2' (Dammam) for proximity/latency unless other constraints apply."
-        )
 
-    return "\nProvider region accuracy rules:\n- " + "\n- ".join(rules) + "\n"
+def _cache_key(spec: dict) -> str:
+    item_type = spec["item_type"]
+    return make_cache_key(item_type, spec["model"], PROMPT_VERSIONS[item_type], spec["cache_fields"])
+
+
+def _near_scope(spec: dict) -> str:
+    """Everything but the description must match exactly for a near-duplicate."""
+    fields = {k: v for k, v in spec["cache_fields"].items() if k != "description"}
+    return make_cache_key(spec["item_type"], spec["model"], PROMPT_VERSIONS[spec["item_type"]], fields)
+
+
+def _same_words(spec: dict, other: str) -> bool:
+    return near_index.same_words(other, spec["cache_fields"]["description"])
+
+
+def _seed(spec: dict, answer: str) -> bool:
+    """Attach ``answer`` as a draft, trimmed to the context left by the fitted prompt."""
+    seed, tokens = prompts.fit_extra_message(
+        SEED_PREAMBLE + answer, spec["model"], spec["input_tokens"], spec["max_tokens"]
+    )
+    if not seed:
+        return False
+    spec["seed"] = seed
+    spec["input_tokens"] += tokens
+    return True
+
+
+def _near_duplicate(spec: dict, key: str):
+    """Serve or seed from a cached answer to a similar description.
+
+    Returns the cached answer when it is similar enough to serve and has the
+    same words; sets ``spec["seed"]`` (preamble included, within the token
+    budget) when it is only similar enough to seed. Records the best
+    similarity in ``spec["similarity"]``.
+    """
+    if near_index is None or "description" not in spec["cache_fields"]:
+        return None
+    best = None
+    for other, similarity in near_index.query(_near_scope(spec), spec["cache_fields"]["description"], exclude=key):
+        cached, _tier = llm_cache.get(other, count=False)
+        if cached is None:
+            near_index.discard(other)  # evicted or expired since it was indexed
+            continue
+        best = similarity
+        spec["similarity"] = similarity
+        if NEAR_DUP_SERVE_THRESHOLD and similarity >= NEAR_DUP_SERVE_THRESHOLD and _same_words(spec, other):
+            outcome = "served"
+        elif NEAR_DUP_SEED_THRESHOLD and similarity >= NEAR_DUP_SEED_THRESHOLD and _seed(spec, cached.value):
+            outcome = "seeded"
+        else:
+            break
+        near_index.record(outcome, similarity)
+        metrics.NEAR_DUP_LOOKUPS.labels(outcome).inc()
+        metrics.NEAR_DUP_SIMILARITY.observe(similarity)
+        print(f">>> Near-duplicate {spec['item_type']} description ({similarity:.2f}): {outcome}")
+        return cached.value if outcome == "served" else None
+    near_index.record("misses", best)
+    metrics.NEAR_DUP_LOOKUPS.labels("miss").inc()
+    if best is not None:
+        metrics.NEAR_DUP_SIMILARITY.observe(best)
+    return None
+
+
+def _lookup(spec: dict, key: str, refresh: bool):
+    """``(answer, cache_status)`` from the exact or near-duplicate cache, or None on a miss."""
+    if refresh:
+        return None
+    cached, tier = llm_cache.get(key)
+    if cached is not None:
+        print(f">>> LLM cache hit ({tier}) for {spec['item_type']}")
+        return cached.value, f"hit-{tier}"
+    answer = _near_duplicate(spec, key)
+    if answer is not None:
+        return answer, "near"
+    return None
+
+
+def _store_answer(spec: dict, key: str, answer: str, usage, started: float) -> None:
+    if near_index is not None and "description" in spec["cache_fields"]:
+        near_index.add(_near_scope(spec), spec["cache_fields"]["description"], key)
+    llm_cache.set(
+        key,
+        CachedAnswer(
+            value=answer,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            latency_ms=int((time.perf_counter() - started) * 1000),
+        ),
+        item_type=spec["item_type"],
+        model=spec["model"],
+        prompt_version=PROMPT_VERSIONS[spec["item_type"]],
+    )
+
+
+def _cached_completion(client, spec: dict, refresh: bool = False):
+    """Run a chat completion through the two-tier LLM cache.
+
+    Returns ``(answer, cache_status)`` where the status is ``hit-l1``,
+    ``hit-l2``, ``near`` (answer to a near-duplicate description), ``miss``,
+    ``seeded`` (generated with a near-duplicate's answer as a draft),
+    ``refresh`` (lookup skipped, answer re-stored) or ``coalesced`` (answer
+    shared with an identical in-flight request).
+    """
+    key = _cache_key(spec)
+    hit = _lookup(spec, key, refresh)
+    if hit is not None:
+        return hit
+
+    result = ("", "miss")
+    for kind, value in _coalesced(key, lambda: _blocking_completion(client, spec, key, refresh)):
+        if kind == "done":
+            result = value
+    return result
+
+
+def _blocking_completion(client, spec: dict, key: str, refresh: bool):
+    print(f">>> Calling OpenAI for {spec['label']} ({spec['model']})...")
+    started = time.perf_counter()
+    with instrumentation.timed("llm"), metrics.LLMCall(spec["model"], spec["item_type"]):
+        resp = client.chat.completions.create(**_completion_kwargs(spec))
+    metrics.observe_tokens(spec["model"], spec["item_type"], getattr(resp, "usage", None))
+    answer = (resp.choices[0].message.content or "").strip()
+    if answer:
+        _store_answer(spec, key, answer, getattr(resp, "usage", None), started)
+        yield "delta", answer
+    yield "done", (answer, _miss_status(spec, refresh))
+
+
+def _miss_status(spec: dict, refresh: bool) -> str:
+    if refresh:
+        return "refresh"
+    return "seeded" if spec.get("seed") else "miss"
+
+
+def _coalesced(key: str, produce):
+    """Run ``produce()`` once per key across concurrent identical requests.
+
+    ``produce`` returns a generator of ``("delta", text)`` then ``("done",
+    (answer, cache_status))``. The leader relays it while publishing to the
+    flight; local followers replay the flight, and other workers wait for the
+    answer to land in the shared cache tier. Followers report ``coalesced``.
+    """
+    flight, leader = inflight.begin(key)
+    if not leader:
+        print(f">>> Coalescing with in-flight generation {key[:12]}")
+        try:
+            for kind, value in flight.follow(LLM_COALESCE_WAIT):
+                if kind == "delta":
+                    yield kind, value
+                else:
+                    answer = value[0]
+                    if not answer:
+                        raise GenerationError("OpenAI returned an empty response.", 502)
+                    yield "done", (answer, "coalesced")
+        except TimeoutError as e:
+            raise GenerationError("Timed out waiting for an identical in-flight request.", 504) from e
+        except GenerationError:
+            raise
+        except Exception as e:
+            raise GenerationError(f"OpenAI request failed: {e}") from e
+        return
+
+    try:
+        started = datetime.utcnow()
+        cached = inflight.claim_shared(key, flight, lambda: llm_cache.l2.get(key, newer_than=started))
+        if cached is not None:
+            print(f">>> Coalesced with another worker's generation {key[:12]}")
+            llm_cache.l1.set(key, cached, cached.size)
+            flight.publish(cached.value)
+            flight.finish((cached.value, "coalesced"))
+            yield "delta", cached.value
+            yield "done", (cached.value, "coalesced")
+            return
+        for kind, value in produce():
+            if kind == "delta":
+                flight.publish(value)
+            else:
+                flight.finish(value)
+            yield kind, value
+    except GeneratorExit:
+        flight.fail(GenerationError("The identical request this one joined was cancelled; please retry.", 503))
+        raise
+    except BaseException as e:
+        flight.fail(e)
+        raise
+    finally:
+        inflight.end(key, flight)
+
+
+def _cache_refresh_requested() -> bool:
+    return (request.form.get("no_cache") or request.args.get("no_cache") or "0").strip() in ("1", "true", "yes")
+
+
+def _stream_requested() -> bool:
+    flag = (request.args.get("stream") or request.form.get("stream") or "").strip().lower()
+    if flag:
+        return flag in ("1", "true", "yes")
+    return "text/event-stream" in (request.headers.get("Accept") or "")
+
+
+def _current_user_id():
+    return current_user.id if current_user.is_authenticated else None
+
+
+def _history_row(s, record: tuple) -> History:
+    item_type, history, answer, user_id = record
+    row = History(
+        user_id=user_id,
+        item_type=item_type,
+        result_digest=put_blob(s, ResultBlob, answer),
+        result_preview=answer[:HISTORY_PREVIEW_CHARS],
+        result_chars=len(answer),
+        **history,
+    )
+    if SEARCH_ENABLED:
+        row.search_vector = history_search_vector(history["prompt_text"], answer)
+    return row
+
+
+def _save_history(spec: dict, answer: str, user_id):
+    """Persist a finished generation; returns the new History id (or None)."""
+    if user_id is None:
+        return None
+    try:
+        with Session(engine) as s:
+            h = _history_row(s, (spec["item_type"], spec["history"], answer, user_id))
+            s.add(h)
+            s.commit()
+            return h.id
+    except Exception as _e:
+        print(f">>> WARN: Failed to save {spec['item_type']} history:", _e)
+        return None
+
+
+def _write_history_batch(records: list) -> None:
+    with Session(engine) as s:
+        s.add_all([_history_row(s, record) for record in records])
+        s.commit()
+
+
+history_writer = WriteBehindQueue(
+    _write_history_batch,
+    max_batch=int(os.environ.get("HISTORY_WRITE_BATCH", "50")),
+    flush_interval=float(os.environ.get("HISTORY_WRITE_FLUSH_SECONDS", "0.5")),
+    max_pending=int(os.environ.get("HISTORY_WRITE_MAX_PENDING", "1000")),
+    name="history-writer",
+    report=lambda outcome, n: metrics.HISTORY_WRITES.labels(outcome).inc(n),
+    depth=metrics.HISTORY_QUEUE_DEPTH.set,
+)
+
+
+def _queue_history(spec: dict, answer: str, user_id) -> None:
+    """Save History off the request path when nobody needs its id."""
+    if user_id is None:
+        return
+    if not history_writer.submit((spec["item_type"], spec["history"], answer, user_id)):
+        _save_history(spec, answer, user_id)
+
+
+def _sse(data: dict, event: str | None = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class GenerationError(Exception):
+    """Upstream generation failure; ``status`` is the HTTP code to report."""
+
+    def __init__(self, message: str, status: int = 500):
+        super().__init__(message)
+        self.status = status
+
+
+def _completion_chunks(client, spec: dict, refresh: bool):
+    """Yield ``("delta", text)`` while the answer streams in, then ``("done", (answer, cache_status))``.
+
+    Cache hits, and answers coalesced from another worker, are yielded as a
+    single delta. Raises ``GenerationError``.
+    """
+    key = _cache_key(spec)
+    hit = _lookup(spec, key, refresh)
+    if hit is not None:
+        yield "delta", hit[0]
+        yield "done", hit
+        return
+
+    yield from _coalesced(key, lambda: _streamed_completion(client, spec, key, refresh))
+
+
+def _streamed_completion(client, spec: dict, key: str, refresh: bool):
+    print(f">>> Streaming OpenAI {spec['label']} ({spec['model']})...")
+    started = time.perf_counter()
+    parts: list[str] = []
+    usage = None
+    try:
+        with metrics.LLMCall(spec["model"], spec["item_type"]) as call:
+            stream = client.chat.completions.create(
+                **_completion_kwargs(spec),
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                for choice in chunk.choices or []:
+                    delta = getattr(choice.delta, "content", None)
+                    if delta:
+                        call.first_token()
+                        parts.append(delta)
+                        yield "delta", delta
+    except Exception as e:
+        raise GenerationError(f"OpenAI request failed: {e}") from e
+    instrumentation.add("llm", time.perf_counter() - started)
+    metrics.observe_tokens(spec["model"], spec["item_type"], usage)
+    answer = "".join(parts).strip()
+    if not answer:
+        raise GenerationError("OpenAI returned an empty response.", 502)
+    _store_answer(spec, key, answer, usage, started)
+    yield "done", (answer, _miss_status(spec, refresh))
+
+
+def _stream_generation(client, spec: dict, refresh: bool, user_id):
+    """Relay the completion as Server-Sent Events.
+
+    Events: ``meta`` (once), unnamed ``{"delta": ...}`` chunks, then either
+    ``done`` with the full text (after it is saved to History) or ``error``.
+    """
+    item_type = spec["item_type"]
+
+    def events():
+        yield _sse({"type": item_type, "model": spec["model"]}, "meta")
+        try:
+            for kind, value in _completion_chunks(client, spec, refresh):
+                if kind == "delta":
+                    yield _sse({"delta": value})
+                else:
+                    answer, cache_status = value
+        except GenerationError as e:
+            yield _sse({"error": str(e)}, "error")
+            return
+        history_id = _save_history(spec, answer, user_id)
+        done = {item_type: answer, "cache": cache_status, "history_id": history_id}
+        if spec.get("similarity") is not None:
+            done["similarity"] = round(spec["similarity"], 3)
+        yield _sse(done, "done")
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+def _serve_generation(spec: dict):
+    """Shared tail of the generation routes: JSON by default, SSE on request."""
+    client = llm_client.get_client()
+    if client is None:
+        return jsonify({"error": OPENAI_KEY_MISSING}), 400
+
+    refresh = _cache_refresh_requested()
+    if _stream_requested():
+        return _stream_generation(client, spec, refresh, _current_user_id())
+
+    try:
+        answer, cache_status = _cached_completion(client, spec, refresh)
+        if not answer:
+            return jsonify({"error": "OpenAI returned an empty response."}), 502
+    except GenerationError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": f"OpenAI request failed: {e}"}), 500
+
+    _queue_history(spec, answer, _current_user_id())
+
+    resp = jsonify({spec["item_type"]: answer})
+    resp.headers["X-Cache"] = cache_status
+    if spec.get("similarity") is not None:
+        resp.headers["X-Cache-Similarity"] = f"{spec['similarity']:.3f}"
+    return resp
+
 
 @app.route("/", methods=["GET"])
 @login_required
@@ -201,8 +975,9 @@ def history_page():
 
 @app.route("/init-db")
 def init_db_endpoint():
+    global db_initialized
     try:
-        success = init_database()
+        success = db_initialized = init_database()
         if success:
             return jsonify({"status": "success", "message": "Database initialized successfully"})
         else:
@@ -211,6 +986,55 @@ def init_db_endpoint():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: the process is serving requests. Never touches the database."""
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: the database answers and schema initialization did not fail."""
+    if db_initialized is False:
+        return jsonify({"status": "error", "message": "Database initialization failed"}), 503
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Database unavailable: {e}"}), 503
+    return jsonify({"status": "ready"})
+
+
+@app.route("/cache/stats", methods=["GET"])
+@login_required
+def cache_stats():
+    """Debug view of this worker's caches.
+
+    The counters here cover one process. For hit rates use the
+    ``llm_cache_*`` series on /metrics, which add up every worker.
+    """
+    return jsonify(
+        {
+            "llm_cache": llm_cache.stats(),
+            "coalescing": inflight.stats(),
+            "near_duplicates": near_index.stats() if near_index is not None else None,
+            "users": {"entries": len(user_cache), "evictions": user_cache.evictions, "ttl_seconds": USER_CACHE_TTL},
+            "pid": os.getpid(),
+        }
+    )
+
+
+@app.route("/config/reload", methods=["POST"])
+def config_reload():
+    """Reload this worker's config; requires the CONFIG_RELOAD_TOKEN header."""
+    token = os.environ.get("CONFIG_RELOAD_TOKEN")
+    supplied = request.headers.get("X-Reload-Token") or ""
+    if not token or not hmac.compare_digest(supplied.encode("utf-8"), token.encode("utf-8")):
+        return jsonify({"error": "Forbidden"}), 403
+    reload_config()
+    return jsonify({"status": "reloaded", "pid": os.getpid()})
+
+
 @app.route("/auth/register", methods=["GET", "POST"])
 def register():
     from werkzeug.security import generate_password_hash
@@ -251,6 +1075,7 @@ def login():
                     flash("Invalid email or password", "error")
                     return redirect(url_for("login"))
                 login_user(u)
+                _cache_user(u)
                 return redirect(url_for("index"))
         except Exception as e:
             flash(f"Login failed: {e}", "error")
@@ -261,1056 +1086,589 @@ def login():
 @app.route("/auth/logout")
 @login_required
 def logout():
+    invalidate_user(current_user.id)
     logout_user()
     return redirect(url_for("login"))
 
+
+def _form_fields(form, *extra) -> dict:
+    fields = {
+        "provider": form.get("provider"),
+        "description": form.get("description", ""),
+        "scale": form.get("scale", scales[0]),
+        "loading": form.get("loading_pressure", loading_pressure[0]),
+    }
+    if "country" in extra:
+        fields["country"] = form.get("country", "").strip()
+    if "structure" in extra:
+        fields["structure"] = form.get("structure", "")
+    return fields
+
+
+def _prompt_spec(kind: str, label: str, fields: dict) -> dict:
+    """Render the ``kind`` prompt within its token budget and describe the request."""
+    fitted = prompts.fit(kind, fields)
+    tpl = fitted.template
+    if fitted.trimmed:
+        print(f">>> Prompt budget: shrank {kind} inputs (tokens before, after): {fitted.trimmed}")
+    history = {"provider": fields["provider"] or "", "scale": fields["scale"] or "", "loading": fields["loading"] or ""}
+    if "country" in fields:
+        history["country"] = fields["country"] or ""
+    history["prompt_text"] = fields["description"] or ""
+    return {
+        "item_type": kind,
+        "label": label,
+        "model": tpl.model,
+        "temperature": tpl.temperature,
+        "max_tokens": fitted.max_tokens,
+        "system": tpl.system,
+        "prompt": fitted.prompt,
+        "input_tokens": fitted.input_tokens,
+        "cache_fields": fields,
+        "history": history,
+    }
+
+
+def build_cost_spec(form) -> dict:
+    return _prompt_spec("cost", "cost best practices", _form_fields(form, "country"))
+
+
 @app.route("/best_practices_cost", methods=["POST"])
 @login_required
 def best_practices_cost():
-    provider = request.form.get("provider")
-    description = request.form.get("description", "")
-    scale = request.form.get("scale", scales[0])
-    loading = request.form.get("loading_pressure", loading_pressure[0])
-    country = request.form.get("country", "").strip()
+    return _serve_generation(build_cost_spec(request.form))
 
-    try:
-        scale_factors = {
-            scales[0]: 1.0,
-            scales[1]: 2.0,
-            scales[2]: 3.0,
-        }
-        pressure_factors = {
-            loading_pressure[2]: 1.0,
-            loading_pressure[1]: 1.5,
-            loading_pressure[0]: 2.0,
-        }
-    except Exception:
-        scale_factors = {scale: 1.0}
-        pressure_factors = {loading: 1.0}
 
-    scale_factor = scale_factors.get(scale, 1.0)
-    pressure_factor = pressure_factors.get(loading, 1.0)
-    combined_multiplier = round(scale_factor * pressure_factor, 2)
+def build_performance_spec(form) -> dict:
+    return _prompt_spec("performance", "performance best practices", _form_fields(form, "country"))
 
-    load_env_files()
 
-    openai_key = os.environ.get("OPENAI_API_KEY")
-    if not openai_key:
-        return (
-            jsonify(
-                {
-                    "error": (
-                        "OPENAI_API_KEY not set. "
-                        "Add it to a .env file (preferred) or .env.example in the project root, "
-                        "or export it in your shell."
-                    )
-                }
-            ),
-            400,
-        )
+@app.route("/best_practices_performance", methods=["POST"])
+@login_required
+def best_practices_performance():
+    return _serve_generation(build_performance_spec(request.form))
 
-    client = OpenAI(api_key=openai_key)
-    print(f">>> OPENAI_API_KEY present: True (length={len(openai_key)})")
-
-    # Build region context
-    region_context = ""
-    if country:
-        region_context = f"""
-**CRITICAL: USER'S COUNTRY/REGION**: {country}
-
-Based on the user's location ({country}), you MUST provide:
-1. **TOP 3 RECOMMENDED REGIONS** for {provider} that offer the BEST COST-TO-PERFORMANCE ratio for users in {country}
-   - Consider: proximity/latency, regional pricing differences, data sovereignty, available services
-   - Rank them: #1 (Best), #2 (Alternative), #3 (Fallback)
-   - For each region, explain WHY it's recommended (latency, cost, compliance)
-
-2. **COST COMPARISON BY REGION**: Show the cost range (min-max in SAR) for EACH of the 3 recommended regions
-   - Region pricing varies significantly (some regions are 20-40% more expensive)
-   - Be specific: "Region A: SAR X,XXX - SAR Y,YYY/month"
-   - Highlight which region offers the best value
-
-Format this as the FIRST section of your response.
-"""
-    else:
-        region_context = ""
-
-    influence_context = f"""
-Things that strongly influence cost:
-1) The greater the pressure, the greater the cost.
-2) The greater the scale, the greater the cost.
-
-Apply the following numeric influence when producing SAR estimates:
-- Scale: {scale} → factor {scale_factor:.2f}
-- Loading pressure: {loading} → factor {pressure_factor:.2f}
-- Combined cost multiplier: {combined_multiplier:.2f}
-
-You MUST apply the combined cost multiplier to all SAR minimum/maximum estimates and to each
-service category proportionally. First base ranges on realistic {provider} pricing, then scale by
-this multiplier to reflect the user's scale and loading pressure.
-"""
-
-    prompt = f"""
-You are an expert DevOps and Cloud Cost Optimization consultant specializing in {provider}.
-
-Context:
-- Cloud provider: {provider}
-- Expected scale tier: {scale}
-- Loading pressure / request pattern: {loading}
-- Project description: {description}
-{region_context}
-
-{build_region_accuracy_rules(provider, country)}
-
-{influence_context}
-
-Your task is to provide **COST OPTIMIZATION BEST PRACTICES ONLY** - NO CODE, NO CONFIGURATIONS, NO TERRAFORM, NO CI/CD PIPELINES.
-
-Focus exclusively on cost optimization:
-
-### 1. REGIONAL COST OPTIMIZATION (if country provided)
-{f"Provide the TOP 3 cost-optimized {provider} regions for users in {country} with detailed cost ranges for each region in SAR." if country else "Skip this section if no country is provided."}
-
-### 2. COST-EFFICIENT ARCHITECTURE RECOMMENDATIONS
-Recommend the most cost-effective services and architectural patterns for {provider} based on the scale tier:
-- For Small scale: Emphasize serverless, pay-per-use, and managed services to minimize operational overhead
-- For Medium scale: Balance between cost and performance with autoscaling and caching strategies
-- For Large scale: Focus on reserved instances, committed use discounts, and multi-region optimization
-
-### 3. COST BREAKDOWN & ESTIMATES IN SAUDI RIYALS (SAR)
-Based on the project description and scale, provide:
-- **Minimum Monthly Cost (SAR)**: Most cost-optimized configuration
-- **Maximum Monthly Cost (SAR)**: Peak usage with high availability
-- Cost breakdown by service category:
-  * Compute costs
-  * Storage costs
-  * Database costs
-  * Network/bandwidth costs
-  * Additional services (monitoring, backup, etc.)
-
-Use realistic {provider} pricing converted to SAR (1 USD ≈ 3.75 SAR).
- IMPORTANT: After determining realistic baseline costs, multiply the min/max and each category
- by the combined cost multiplier of {combined_multiplier:.2f} derived from the user's
- scale and loading pressure inputs.
-
-### 4. COST OPTIMIZATION BEST PRACTICES
-List specific recommendations to reduce costs:
-- Auto-scaling policies
-- Resource scheduling (shutdown during off-hours)
-- Reserved capacity vs on-demand
-- Data transfer optimization
-- Monitoring and alerting for cost anomalies
-- Right-sizing recommendations
-- Spot/preemptible instances where applicable
-- Storage lifecycle policies
-
-### 5. COST VS FEATURE TRADEOFFS
-Explain key decisions:
-- When to use premium vs standard tiers
-- When to use managed vs self-managed services
-- Reserved vs on-demand pricing strategies
-
-### OUTPUT FORMAT:
-- Use clear headings and bullet points
-- NO code blocks, NO configuration examples, NO YAML/JSON/HCL
-- Focus on WHAT to do and WHY, not HOW to implement
-- Provide specific service names from {provider}
-- Include realistic cost ranges in SAR with minimum and maximum estimates
-{f"- START with the Regional Recommendations section showing the 3 best regions for {country}" if country else ""}
-
-**IMPORTANT**: This is a cost-focused strategic advisory document. Keep it business-focused and decision-oriented.
-""".strip()
 
-    try:
-        print(">>> Calling OpenAI for cost best practices (gpt-4o-mini)...")
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",  
-            temperature=0.7,
-            max_tokens=3000,
-            messages=[
-                {"role": "system", "content": "You are an expert Cloud Cost Optimization consultant. Provide strategic cost recommendations with SAR pricing without code or configurations."},
-                {"role": "user", "content": prompt},
-            ],
-        )
-        answer = (resp.choices[0].message.content or "").strip()
-        if not answer:
-            return jsonify({"error": "OpenAI returned an empty response."}), 502
-    except Exception as e:
-        return jsonify({"error": f"OpenAI request failed: {e}"}), 500
+def build_structure_spec(form) -> dict:
+    return _prompt_spec("structure", "project structure generation", _form_fields(form))
 
-    try:
-        if current_user.is_authenticated:
-            with Session(engine) as s:
-                h = History(
-                    user_id=current_user.id,
-                    item_type="cost",
-                    provider=provider or "",
-                    scale=scale or "",
-                    loading=loading or "",
-                    country=country or "",
-                    prompt_text=description or "",
-                    result_text=answer,
-                )
-                s.add(h)
-                s.commit()
-    except Exception as _e:
-        print(">>> WARN: Failed to save cost history:", _e)
 
-    return jsonify({"cost": answer})
+@app.route("/structure", methods=["POST"])
+def structure():
+    return _serve_generation(build_structure_spec(request.form))
 
 
-@app.route("/best_practices_performance", methods=["POST"])
-@login_required
-def best_practices_performance():
-    provider = request.form.get("provider")
-    description = request.form.get("description", "")
-    scale = request.form.get("scale", scales[0])
-    loading = request.form.get("loading_pressure", loading_pressure[0])
-    country = request.form.get("country", "").strip()
-
-    load_env_files()
-
-    openai_key = os.environ.get("OPENAI_API_KEY")
-    if not openai_key:
-        return (
-            jsonify(
-                {
-                    "error": (
-                        "OPENAI_API_KEY not set. "
-                        "Add it to a .env file (preferred) or .env.example in the project root, "
-                        "or export it in your shell."
-                    )
-                }
-            ),
-            400,
-        )
+def build_terraform_spec(form) -> dict:
+    return _prompt_spec("terraform", "Terraform module generation", _form_fields(form, "structure"))
+
+
+# "modules" generates the root files and each module listed in the structure
+# concurrently (at most TERRAFORM_MODULE_CONCURRENCY calls per worker) instead
+# of one large answer; requests can pick with ?mode=single|modules.
+TERRAFORM_MODE = os.environ.get("TERRAFORM_MODE", "single").strip().lower()
+terraform_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("TERRAFORM_MODULE_CONCURRENCY", "4")),
+    thread_name_prefix="tfmodule",
+)
 
-    client = OpenAI(api_key=openai_key)
-    print(f">>> OPENAI_API_KEY present: True (length={len(openai_key)})")
-
-    region_perf_context = ""
-    if country:
-        region_perf_context = f"""
-**USER'S COUNTRY/REGION**: {country}
-
-Consider regional performance factors:
-- Recommend {provider} regions with lowest latency from {country}
-- Explain impact of region selection on performance (latency, data residency, edge locations)
-- Suggest multi-region strategies if applicable for high availability and performance
-"""
-
-    prompt = f"""
-You are an expert DevOps and Cloud Performance Optimization consultant specializing in {provider}.
-
-Context:
-- Cloud provider: {provider}
-- Expected scale tier: {scale}
-- Loading pressure / request pattern: {loading}
-- Project description: {description}
-{region_perf_context}
-
-{build_region_accuracy_rules(provider, country)}
-
-Your task is to provide **PERFORMANCE OPTIMIZATION BEST PRACTICES ONLY** - NO CODE, NO CONFIGURATIONS, NO TERRAFORM, NO CI/CD PIPELINES.
-
-Focus exclusively on performance optimization:
-
-### 1. REGIONAL PERFORMANCE OPTIMIZATION (if country provided)
-{f"Recommend the best {provider} regions for users in {country} based on latency, edge presence, and performance characteristics." if country else "Skip this section if no country is provided."}
-
-### 2. COMPUTE PERFORMANCE OPTIMIZATION
-Provide specific performance recommendations:
-- Right-sizing for performance (CPU, memory, IOPS requirements based on scale and loading)
-- Premium/compute-optimized SKUs when warranted
-- Autoscaling strategies for handling traffic spikes
-- Load balancing and traffic distribution
-- Containerization and orchestration benefits (AKS/EKS/GKE)
-
-### 3. STORAGE PERFORMANCE OPTIMIZATION
-- Storage tier selection (Premium SSD vs Standard, IOPS provisioning)
-- Caching strategies (Redis, CDN, application-level caching)
-- Database read replicas for read-heavy workloads
-- Content Delivery Networks (CDN) for static assets
-
-### 4. NETWORK PERFORMANCE OPTIMIZATION
-- CDN and edge locations for global performance
-- Private endpoints and network latency reduction
-- Traffic routing and geo-routing strategies
-- Connection pooling and keep-alive optimizations
-
-### 5. DATABASE PERFORMANCE OPTIMIZATION
-- Query optimization and indexing strategies
-- Read replicas and horizontal scaling
-- Caching layers (Redis, Memcached)
-- Connection pooling
-- Database SKU selection for IOPS and throughput
-
-### 6. APPLICATION-LEVEL PERFORMANCE
-- Caching strategies (in-memory, distributed cache)
-- Asynchronous processing and message queues
-- API optimization and rate limiting
-- Compression and minification
-
-### 7. MONITORING & OBSERVABILITY FOR PERFORMANCE
-- Application Performance Monitoring (APM) tools
-- Real-time metrics and alerting
-- Performance bottleneck identification
-- Load testing and capacity planning
-
-### 8. PERFORMANCE VS COST TRADEOFFS
-Explain when to prioritize performance over cost:
-- Premium vs standard tiers
-- Over-provisioning for reliability
-- Reserved capacity for predictable workloads
-
-### OUTPUT FORMAT:
-- Use clear headings and bullet points
-- NO code blocks, NO configuration examples, NO YAML/JSON/HCL
-- Focus on WHAT to do and WHY, not HOW to implement
-- Provide specific service names from {provider}
-- Explain performance impact quantitatively where possible (e.g., "reduces latency by 40%")
-{f"- START with the Regional Performance section for {country}" if country else ""}
-
-**IMPORTANT**: This is a performance-focused strategic advisory document. Keep it business-focused and decision-oriented.
-""".strip()
 
+def build_terraform_part_specs(form):
+    """``(part names, specs)`` for per-module generation, or None if the structure lists no modules.
+
+    Each part is cached under its own fingerprint (see ``part_fingerprints``)
+    rather than the whole request, so editing the description only
+    regenerates the parts the edit is about.
+    """
+    fields = _form_fields(form, "structure")
+    modules = parse_modules(fields["structure"])
+    if not modules:
+        return None
+    listing = "\n".join(
+        f"- {m.name}: {m.purpose or 'see project description'}" + (f"; outputs: {m.outputs}" if m.outputs else "")
+        for m in modules
+    )
+    shared = {**fields, "modules": listing}
+    specs = [_prompt_spec("terraform_root", "Terraform root configuration", shared)]
+    for m in modules:
+        module_fields = {**shared, "module": m.name, "purpose": m.purpose, "outputs": m.outputs}
+        specs.append(_prompt_spec("terraform_module", f"Terraform module {m.name}", module_fields))
+    for spec, fingerprint in zip(specs, part_fingerprints(fields, modules)):
+        spec["cache_fields"] = fingerprint
+    return [None] + [m.name for m in modules], specs
+
+
+def _file_report(done: list) -> dict:
+    """Which stitched files came from cache and which were generated for this request."""
+    report = {"reused": [], "regenerated": []}
+    for _name, section, cache_status in done:
+        bucket = "reused" if cache_status.startswith("hit-") else "regenerated"
+        report[bucket].extend(section_paths(section))
+    return report
+
+
+def _terraform_parts(client, names: list, specs: list, refresh: bool):
+    """Yield ``(name, section, cache_status)`` in order; the parts run concurrently."""
+    futures = [
+        terraform_executor.submit(instrumentation.propagate(_cached_completion), client, spec, refresh)
+        for spec in specs
+    ]
     try:
-        print(">>> Calling OpenAI for performance best practices (gpt-4o-mini)...")
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",  
-            temperature=0.7,
-            max_tokens=3000,
-            messages=[
-                {"role": "system", "content": "You are an expert Cloud Performance Optimization consultant. Provide strategic performance recommendations without code or configurations."},
-                {"role": "user", "content": prompt},
-            ],
+        for name, future in zip(names, futures):
+            try:
+                answer, cache_status = future.result()
+            except GenerationError:
+                raise
+            except Exception as e:
+                raise GenerationError(f"OpenAI request failed for {name or 'root'} module: {e}") from e
+            if not answer:
+                raise GenerationError(f"OpenAI returned an empty response for {name or 'root'} module.", 502)
+            yield name, stitch_part(answer, name), cache_status
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _serve_terraform_modules(form):
+    client = llm_client.get_client()
+    if client is None:
+        return jsonify({"error": OPENAI_KEY_MISSING}), 400
+    parts = build_terraform_part_specs(form)
+    if parts is None:
+        print(">>> No modules found in the structure; generating Terraform in one call")
+        return _serve_generation(build_terraform_spec(form))
+    names, specs = parts
+    record = {"item_type": "terraform", "history": specs[0]["history"]}
+    refresh = _cache_refresh_requested()
+    print(f">>> Generating Terraform root + {len(names) - 1} modules concurrently")
+
+    if _stream_requested():
+        user_id = _current_user_id()
+
+        def events():
+            yield _sse({"type": "terraform", "model": specs[0]["model"], "modules": names[1:]}, "meta")
+            sections, cache, done = [], {}, []
+            try:
+                for name, section, cache_status in _terraform_parts(client, names, specs, refresh):
+                    cache[name or "root"] = cache_status
+                    done.append((name, section, cache_status))
+                    if section:
+                        yield _sse({"delta": ("\n\n" if sections else "") + section})
+                        sections.append(section)
+            except GenerationError as e:
+                yield _sse({"error": str(e)}, "error")
+                return
+            answer = "\n\n".join(sections)
+            history_id = _save_history(record, answer, user_id)
+            yield _sse(
+                {"terraform": answer, "cache": cache, "files": _file_report(done), "history_id": history_id}, "done"
+            )
+
+        return Response(
+            stream_with_context(events()),
+            mimetype="text/event-stream",
+            headers={"X-Accel-Buffering": "no"},
         )
-        answer = (resp.choices[0].message.content or "").strip()
-        if not answer:
-            return jsonify({"error": "OpenAI returned an empty response."}), 502
-    except Exception as e:
-        return jsonify({"error": f"OpenAI request failed: {e}"}), 500
 
-    # Save history 
     try:
-        if current_user.is_authenticated:
-            with Session(engine) as s:
-                h = History(
-                    user_id=current_user.id,
-                    item_type="performance",
-                    provider=provider or "",
-                    scale=scale or "",
-                    loading=loading or "",
-                    country=country or "",
-                    prompt_text=description or "",
-                    result_text=answer,
-                )
-                s.add(h)
-                s.commit()
-    except Exception as _e:
-        print(">>> WARN: Failed to save performance history:", _e)
+        done = list(_terraform_parts(client, names, specs, refresh))
+    except GenerationError as e:
+        return jsonify({"error": str(e)}), e.status
+    answer = "\n\n".join(section for _name, section, _status in done if section)
+    _queue_history(record, answer, _current_user_id())
+    cache = {name or "root": cache_status for name, _section, cache_status in done}
+    resp = jsonify({"terraform": answer, "cache": cache, "files": _file_report(done)})
+    statuses = set(cache.values())
+    resp.headers["X-Cache"] = statuses.pop() if len(statuses) == 1 else "mixed"
+    return resp
 
-    return jsonify({"performance": answer})
 
+@app.route("/terraform", methods=["POST"])
+def terraform():
+    mode = (request.args.get("mode") or request.form.get("mode") or TERRAFORM_MODE).strip().lower()
+    if mode == "modules":
+        return _serve_terraform_modules(request.form)
+    return _serve_generation(build_terraform_spec(request.form))
 
-@app.route("/structure", methods=["POST"])
-def structure():
-    provider = request.form.get("provider")
-    description = request.form.get("description", "")
-    scale = request.form.get("scale", scales[0])
-    loading = request.form.get("loading_pressure", loading_pressure[0])
 
-    load_env_files()
+def build_cli_spec(form) -> dict:
+    return _prompt_spec("cli", "Infra CLI generation", _form_fields(form, "structure"))
 
-    openai_key = os.environ.get("OPENAI_API_KEY")
-    if not openai_key:
-        return (
-            jsonify(
-                {
-                    "error": (
-                        "OPENAI_API_KEY not set. "
-                        "Add it to a .env file (preferred) or .env.example in the project root, "
-                        "or export it in your shell."
-                    )
-                }
-            ),
-            400,
-        )
 
-    client = OpenAI(api_key=openai_key)
-    print(f">>> OPENAI_API_KEY present: True (length={len(openai_key)})")
-
-    structure_prompt = f"""
-You are an expert Software Architect and DevOps engineer specializing in {provider}.
-
-**PRIMARY INPUT (90% weight) - Read every word carefully:**
-Project description: {description}
-
-Context:
-- Cloud provider: {provider}
-- Expected scale: {scale}
-- Loading pressure: {loading}
-
-YOUR MISSION:
-Analyze the project description thoroughly and generate a COMPLETE, production-ready folder structure. Base 90% of your decisions on what the user wrote. If the description lacks infrastructure details (user may not know DevOps/cloud well), intelligently suggest best practices for {provider} that fit their application type.
-
-INTELLIGENT INFERENCE RULES:
-- If user mentions "web app" but no specifics → suggest appropriate frontend framework + backend + database
-- If user mentions "database" without type → suggest PostgreSQL (most versatile) or MySQL based on use case
-- If user mentions "API" without backend tech → suggest modern REST/GraphQL backend for {provider}
-- If user mentions "mobile app" → suggest backend API + database + possibly blob storage for media
-- If user mentions "authentication" → include identity/auth module in infrastructure
-- If user mentions "files/images/uploads" → include object storage (S3/Blob/Cloud Storage)
-- If user mentions "real-time" or "notifications" → suggest caching/Redis + message queue
-- If containers not mentioned but app is modern → suggest containerization as best practice
-- Always include monitoring, secrets management, and CI/CD unless user explicitly says otherwise
-
-Generate a CLEAR, WELL-FORMATTED project folder structure tailored to the project description.
-
-## FORMATTING RULES (CRITICAL - MUST FOLLOW EXACTLY):
-
-1. **Use ONLY these tree characters**: ├──, └──, │
-2. **Consistent spacing**: 4 spaces per indentation level
-3. **Clear hierarchy**: Parent folders before children
-4. **Comments**: Add concise comments using "  # " (two spaces then #). Keep comments ≤ 40 chars. Never wrap comments to a new line.
-5. **File extensions**: Always include (.tf, .yml, .json, .js, .py, etc.)
-6. **NO MARKDOWN**: Do NOT include triple backticks, code fences, or prose paragraphs. Output ONLY the tree lines.
-7. **LINE LENGTH**: Keep each line ≤ 100 characters to avoid wrapping in UIs.
-8. **ROOT NAME**: Always start with a single top-level folder named `project-root/` and put everything under it.
-
-## SECTION ORDER (TOP → BOTTOM):
-project-root/ → frontend/ (if any) → backend/ or services/ → terraform/ → .github/workflows/ (if any) → scripts/ → tests/ → docs/ → docker-compose.yml → README.md
-
-## TERRAFORM STRUCTURE (MOST IMPORTANT, ADAPTIVE):
-
-**If infrastructure provisioning is needed**, create a Terraform folder using the base layout below. The root files (main.tf, variables.tf, outputs.tf) are required, but under modules/ you must include only the modules that are actually needed for the described project. Omit any modules that are not relevant. Use conventional module names so downstream Terraform generation can rely on them.
-
-```
-terraform/
-├── main.tf                      # Root configuration - calls all modules
-├── variables.tf                 # Root-level input variables
-├── outputs.tf                   # Root-level outputs
-└── modules/                     # Reusable Terraform modules
-    ├── networking/              # VPC/VNet, subnets, security groups
-    │   ├── main.tf             # Networking resources definition
-    │   ├── variables.tf        # Networking input variables
-    │   └── outputs.tf          # Networking outputs (subnet_id, vpc_id)
-    ├── compute/                 # AKS/EKS/GKE, VMs, App Service
-    │   ├── main.tf             # Compute resources definition
-    │   ├── variables.tf        # Compute input variables
-    │   └── outputs.tf          # Compute outputs (cluster_id, endpoint)
-    ├── database/                # Database resources (flexible servers, RDS, Cloud SQL)
-    │   ├── main.tf             # Database resources definition
-    │   ├── variables.tf        # Database input variables
-    │   └── outputs.tf          # Database outputs (connection_string, db_id)
-    ├── security/                # Key Vault/Secrets Manager, IAM/roles, policies
-    │   ├── main.tf             # Security resources definition
-    │   ├── variables.tf        # Security input variables
-    │   └── outputs.tf          # Security outputs (keyvault_id, acr_id)
-    ├── monitoring/              # Log Analytics/CloudWatch/Cloud Monitoring + APM wiring
-    │   ├── main.tf             # Monitoring resources definition
-    │   ├── variables.tf        # Monitoring input variables
-    │   └── outputs.tf          # Monitoring outputs (workspace_id)
-    ├── storage/                 # Storage accounts, S3 buckets, Cloud Storage
-    │   ├── main.tf             # Storage resources definition
-    │   ├── variables.tf        # Storage input variables
-    │   └── outputs.tf          # Storage outputs (storage_id, bucket_name)
-    ├── registry/                # Container registry (ACR/ECR/Artifact Registry)
-    │   ├── main.tf             # Registry creation and RBAC
-    │   ├── variables.tf        # Registry input variables
-    │   └── outputs.tf          # Registry outputs (registry_id, login_server)
-    ├── cdn/                     # CDN/Front Door/Cloud CDN for web/static
-    │   ├── main.tf             # CDN profiles, endpoints/origins/rules
-    │   ├── variables.tf        # CDN input variables
-    │   └── outputs.tf          # CDN endpoint/hostname
-    └── cache/                   # Redis Cache, ElastiCache, Memorystore
-        ├── main.tf             # Cache resources definition
-        ├── variables.tf        # Cache input variables
-        └── outputs.tf          # Cache outputs (cache_endpoint)
-```
-
-**TERRAFORM MODULES TO INCLUDE** (based on project needs):
-- **networking/** - ALWAYS include if using AKS/EKS/GKE or multi-tier apps
-- **compute/** - Include for AKS, EKS, GKE, App Service, VMs, containers
-- **database/** - Include if database is mentioned (PostgreSQL, MySQL, MongoDB, etc.)
-- **security/** - Include for Key Vault/Secrets Manager, IAM roles/policies, secrets management
-- **monitoring/** - Include if observability/logging is mentioned
-- **storage/** - Include if file storage, backups, or object storage needed
-- **cache/** - Include if Redis/caching layer is mentioned
-- **registry/** - Include if containers are mentioned (grant pull to compute identity; disable admin on ACR)
-- **cdn/** - Include if you expose static assets or a public web app and want global performance
-
-PRODUCTION INFERENCE (GO BEYOND USER INPUT):
-- If the description hints at containers, proactively add `registry/` and wire `compute` to pull images via identity/role (no admin passwords).
-- If a public web or static site is implied, add `cdn/` in front of the app service/storage static website.
-- Always pair databases with secrets management in `security/` and connect monitoring/APM via `monitoring/`.
-- Prefer private networking (subnets, NSGs/SGs, private endpoints) when networking + database/storage exist.
-
-## APPLICATION STRUCTURE (ADAPTIVE):
-Infer the stack from the project description and generate ONLY the folders for the chosen technologies. Do NOT output multiple stacks; pick the best match and keep it consistent end‑to‑end.
-
-### Frontend (generate only if a web/mobile UI is mentioned)
-- Detect the framework and language: React, Next.js, Vue, Angular, Svelte, plain HTML, or mobile (React Native/Flutter). Also infer TypeScript vs JavaScript.
-- Produce a clean, idiomatic structure for that framework. Examples of conventions to follow (pick ONE based on description):
-    - React (JS/TS): `src/components/`, `src/pages/ or src/routes/`, `src/hooks/`, `src/context/`, entry (`src/main.tsx` or `src/index.jsx`), `public/`, `package.json`, `vite.config.*` or CRA config.
-    - Next.js: prefer `app/` router for new projects, otherwise `pages/`; include `app/layout.tsx`, `app/page.tsx`, `next.config.js`, `public/`.
-    - Vue 3 + Vite: `src/components/`, `src/views/`, `src/router/`, `src/store/`, `main.ts`, `vite.config.ts`.
-    - Angular: standard CLI layout with `src/app/`, feature modules, `angular.json`.
-    - Static site: `public/`, `assets/`, minimal `index.html`.
-- Use proper file extensions: .tsx/.ts when TypeScript is implied; otherwise .jsx/.js.
-- Include `.env` only if the framework supports runtime env injection; otherwise note build‑time env (e.g., NEXT_PUBLIC_*, Vite env files).
-
-### Backend (generate only if an API/service is mentioned)
-- Detect the backend stack and show the conventional structure for exactly one framework:
-    - Node.js Express or NestJS
-    - Python FastAPI/Flask/Django
-    - Java Spring Boot
-    - Go (Gin/Fiber)
-    - .NET (minimal API or MVC)
-- Follow community‑standard folder names for the selected stack. Examples of conventions to follow (pick ONE based on description):
-    - Express: `src/routes/`, `src/controllers/`, `src/services/`, `src/models/`, `src/middleware/`, `src/config/`, `src/server.ts`.
-    - NestJS: `src/modules/feature/`, `src/common/`, `src/main.ts`, `nest-cli.json`.
-    - FastAPI: `app/api/routers/`, `app/core/`, `app/models/`, `app/services/`, `app/main.py`, `pyproject.toml` or `requirements.txt`.
-    - Django: project folder + one app; `manage.py`, `settings.py`, `urls.py`, `apps/`.
-    - Spring Boot: `src/main/java/...`, `src/main/resources/`, `pom.xml` or `build.gradle`.
-    - Go: `cmd/service/main.go`, `internal/handlers`, `internal/services`, `internal/repository`, `go.mod`.
-- Use `.env` only for local dev; keep secrets out of VCS.
-
-### Multi‑service or monorepo
-- If the description implies multiple services, create a `services/` folder with one subfolder per service (e.g., `services/api/`, `services/web/`, `services/worker/`) each with its own Dockerfile and README.
-- If the user mentions packages/shared libs, include `packages/` for shared code.
-
-## CI/CD STRUCTURE:
-**If deployment is mentioned:**
-```
-.github/
-└── workflows/
-    ├── ci.yml                   # Build, test, lint pipeline
-    └── cd.yml                   # Deploy to {provider} pipeline
-```
-
-## ADDITIONAL FOLDERS (as needed):
-```
-scripts/                         # Deployment and utility scripts
-├── build.sh
-├── deploy.sh
-└── init-db.sh
-
-tests/                           # Test suites
-├── unit/                        # Unit tests
-├── integration/                 # Integration tests
-└── e2e/                         # End-to-end tests
-
-docs/                            # Documentation
-├── architecture.md              # System architecture
-├── api.md                       # API documentation
-└── setup.md                     # Setup instructions
-
-docker-compose.yml               # Local multi-service development
-README.md                        # Project overview
-```
-
-## OUTPUT FORMAT:
-Generate the structure with:
-- Clear ASCII tree using ├──, └──, │ characters
-- 4-space indentation per level
-- Descriptive comments for each major folder
-- ALL files must have extensions (.tf, .js, .yml, .md, etc.)
-- Keep it clean, readable, and properly aligned
-
-**IMPORTANT**: Terraform modules/ directory is CRITICAL for generating infrastructure code later. Make sure it's complete and well-organized!
-
-Generate the structure now based on the project description above.
-""".strip()
+@app.route("/infra_cli", methods=["POST"])
+def infra_cli():
+    return _serve_generation(build_cli_spec(request.form))
 
-    try:
-        print(">>> Calling OpenAI for project structure generation (gpt-4o-mini)...")
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            temperature=0.6,
-            max_tokens=2500,
-            messages=[
-                {"role": "system", "content": "You are an expert Software Architect and DevOps engineer. Analyze the user's project description word-by-word and suggest best-practice infrastructure when details are missing. Output clear, well-organized project structures."},
-                {"role": "user", "content": structure_prompt},
-            ],
-        )
-        answer = (resp.choices[0].message.content or "").strip()
-        if not answer:
-            return jsonify({"error": "OpenAI returned an empty response."}), 502
-    except Exception as e:
-        return jsonify({"error": f"OpenAI request failed: {e}"}), 500
 
-    # Save history
-    try:
-        if current_user.is_authenticated:
-            with Session(engine) as s:
-                h = History(
-                    user_id=current_user.id,
-                    item_type="structure",
-                    provider=provider or "",
-                    scale=scale or "",
-                    loading=loading or "",
-                    prompt_text=description or "",
-                    result_text=answer,
-                )
-                s.add(h)
-                s.commit()
-    except Exception as _e:
-        print(">>> WARN: Failed to save structure history:", _e)
+@app.errorhandler(PromptBudgetError)
+def prompt_budget_exceeded(e):
+    return jsonify({"error": str(e)}), 413
 
-    return jsonify({"structure": answer})
 
+SPEC_BUILDERS = {
+    "cost": build_cost_spec,
+    "performance": build_performance_spec,
+    "structure": build_structure_spec,
+    "terraform": build_terraform_spec,
+    "cli": build_cli_spec,
+}
 
-@app.route("/terraform", methods=["POST"])
-def terraform():
-    provider = request.form.get("provider")
-    description = request.form.get("description", "")
-    scale = request.form.get("scale", scales[0])
-    loading = request.form.get("loading_pressure", loading_pressure[0])
-    structure = request.form.get("structure", "") 
-
-    load_env_files()
-
-    openai_key = os.environ.get("OPENAI_API_KEY")
-    if not openai_key:
-        return (
-            jsonify(
-                {
-                    "error": (
-                        "OPENAI_API_KEY not set. "
-                        "Add it to a .env file (preferred) or .env.example in the project root, "
-                        "or export it in your shell."
-                    )
-                }
-            ),
-            400,
-        )
 
-    client = OpenAI(api_key=openai_key)
-    print(f">>> OPENAI_API_KEY present: True (length={len(openai_key)})")
-
-    terraform_prompt = f"""
-You are an expert DevOps and Infrastructure as Code (Terraform) engineer specializing in {provider}.
-
-**PRIMARY SOURCE (90% weight) - Read every word:**
-Project description: {description}
-
-Context:
-- Cloud provider: {provider}
-- Expected scale: {scale}
-- Loading pressure: {loading}
-
-**SECONDARY REFERENCE (for module organization hints):**
-Project structure:
-{structure}
-
-YOUR MISSION:
-Generate complete, production-ready, MODERN Terraform code based primarily (90%) on the project description. If the user didn't specify infrastructure details (they may not know DevOps/cloud), intelligently recommend best-practice resources for {provider} that fit their application needs.
-
-INTELLIGENT DEFAULTS WHEN USER DOESN'T SPECIFY:
-- No database mentioned but app needs data → suggest PostgreSQL Flexible/RDS/Cloud SQL
-- No networking mentioned but app is multi-tier → create VPC/VNet with subnets
-- No monitoring mentioned → include Log Analytics/CloudWatch/Cloud Monitoring + APM
-- No container registry mentioned but containers implied → create ACR/ECR/Artifact Registry
-- No secrets mentioned but DB exists → create Key Vault/Secrets Manager/Secret Manager
-- No CDN mentioned but static/web app → suggest Front Door/CloudFront/Cloud CDN
-- No identity mentioned but compute exists → use managed identity/IAM roles/service accounts
-- Always include: encryption at rest, HTTPS enforcement, health checks, backup policies
-
-Generate complete, production-ready, MODERN Terraform code organized as MODULES using current best practices for {provider}.
-
-## CRITICAL PRINCIPLES - MUST FOLLOW:
-
-### 1. MODULE ARCHITECTURE
-- **Self-contained modules**: Each module manages its own resources independently
-- **No cross-module resource references**: NEVER reference resources across modules directly
-- **Variable passing**: Pass resource IDs/ARNs between modules using outputs → variables
-- **Standard structure**: Each module MUST have main.tf, variables.tf, outputs.tf
-
-Example module wiring:
-```
-Root main.tf → module "networking" → outputs subnet_id
-             → module "compute" (receives var.subnet_id) → outputs cluster_id
-             → module "monitoring" (receives var.cluster_id)
-```
-
-### 2. USE MODERN, NON-DEPRECATED RESOURCES
-**Critical**: Research and use ONLY the latest resource types for {provider}:
-
-- **Azure AKS**: Use `default_node_pool` block (NOT deprecated `agent_pool_profile`)
-- **Azure AKS Auth**: Use `identity` block with `SystemAssigned` or `UserAssigned` (NOT deprecated `service_principal`)
-- **Azure PostgreSQL**: Use `azurerm_postgresql_flexible_server` (NOT deprecated `azurerm_postgresql_server`)
-- **Azure MySQL**: Use `azurerm_mysql_flexible_server` (NOT deprecated `azurerm_mysql_server`)
-- **AWS RDS**: Use `aws_db_instance` with current engine versions
-- **GCP Cloud SQL**: Use `google_sql_database_instance` with current versions
-
-### 3. NETWORKING & CONNECTIVITY
-- **VNet/VPC integration**: Wire compute resources to subnets via variables
-- **Private endpoints**: Use for databases and storage in production environments
-- **Security groups/NSGs**: Define with least-privilege rules
-- **Subnet passing**: networking module outputs → compute/database modules receive as variables
-
-### 4. MONITORING & OBSERVABILITY
-**Use proper monitoring resources for {provider}:**
-
-- **Azure**: Use `azurerm_log_analytics_workspace` for centralized logging
-  * Wire diagnostic settings to Log Analytics (NOT storage accounts)
-  * Enable Container Insights for AKS clusters
-  * Pass workspace_id from monitoring module to other modules
-
-- **AWS**: Use CloudWatch Log Groups and Container Insights for EKS
-  * Enable cluster logging for EKS
-  * Use CloudWatch alarms for critical metrics
-
-- **GCP**: Use Cloud Logging and Cloud Monitoring
-  * Enable GKE logging and monitoring
-  * Use Log sinks for centralized logging
-
-### 5. SECURITY BEST PRACTICES
-- **Managed identities**: Use managed/workload identities instead of service principals with secrets
-- **Key Vault/Secrets Manager**: Enable soft-delete and purge-protection
-- **Encryption**: Enable at-rest encryption for all storage and databases
-- **Network security**: Use network ACLs/security groups with deny-by-default
-- **Container registry integration**: Grant appropriate pull permissions (e.g., AcrPull for AKS)
-
-### 6. DATABASE CONFIGURATION
-- **High availability**: Use zone-redundant or multi-AZ configurations for production
-- **Backups**: Enable automated backups with appropriate retention
-- **Versions**: Use current stable versions (PostgreSQL 14/15/16, MySQL 8.0, etc.)
-- **Storage**: Configure appropriate storage sizes based on scale tier
-
-### 7. SCALE-APPROPRIATE SIZING
-- **Small scale ({scale})**: 
-  * Cost-optimized SKUs (B-series, burstable instances)
-  * Single region, basic redundancy
-  * Minimal node counts (1-3 nodes)
-  
-- **Medium scale**: 
-  * Balanced SKUs (Standard/General Purpose)
-  * Multi-AZ deployment
-  * Autoscaling enabled (3-10 nodes)
-  * Caching layer if applicable
-  
-- **Large scale**: 
-  * Performance SKUs (Premium, compute-optimized)
-  * Multi-region with geo-replication
-  * Advanced autoscaling (5-50 nodes)
-  * CDN and advanced monitoring
-
-### 8. OUTPUT FORMAT
-Use clear file separators for organization:
-
-```
-### FILE: main.tf
-# Root Terraform configuration
-# Calls all modules and wires them together
-
-### FILE: variables.tf
-# Root-level variables (region, environment, etc.)
-
-### FILE: outputs.tf
-# Root-level outputs (expose key resources)
-
-### FILE: modules/networking/main.tf
-# VPC/VNet, subnets, security groups
-
-### FILE: modules/networking/variables.tf
-# Networking input variables
-
-### FILE: modules/networking/outputs.tf
-# Export: subnet_ids, vpc_id, security_group_ids
-
-### FILE: modules/compute/main.tf
-# Compute resources (AKS/EKS/GKE, App Service, etc.)
-
-### FILE: modules/compute/variables.tf
-# Input: subnet_id (from networking module)
-
-### FILE: modules/compute/outputs.tf
-# Export: cluster_id, cluster_endpoint, managed_identity_id
-
-### FILE: modules/database/main.tf
-# Database resources (flexible servers, RDS, Cloud SQL)
-
-### FILE: modules/database/variables.tf
-# Input: subnet_id, security_group_id
-
-### FILE: modules/database/outputs.tf
-# Export: connection_string, database_id
-
-### FILE: modules/security/main.tf
-# Key Vault, Secrets Manager, IAM roles, ACR/ECR
-
-### FILE: modules/security/variables.tf
-# Input: managed_identity_id (if applicable)
-
-### FILE: modules/security/outputs.tf
-# Export: key_vault_id, registry_id
-
-### FILE: modules/monitoring/main.tf
-# Log Analytics, CloudWatch, Application Insights
-
-### FILE: modules/monitoring/variables.tf
-# Input: cluster_id, resource_ids to monitor
-
-### FILE: modules/monitoring/outputs.tf
-# Export: workspace_id, monitoring_endpoint
-
-[Include other modules as needed: storage, cache, load_balancing]
-```
-
-## QUALITY CHECKLIST:
-Before generating, verify:
-- ✅ All resource types are current (not deprecated)
-- ✅ No direct cross-module resource references
-- ✅ All modules receive inputs via variables
-- ✅ All modules expose outputs for other modules to consume
-- ✅ Monitoring wired to proper logging infrastructure
-- ✅ Security follows {provider} best practices
-- ✅ Scale tier ({scale}) reflected in SKU/instance sizing
-- ✅ Each module is independently valid and reusable
-
-## IMPORTANT NOTES:
-- Base decisions 90% on the project description; infer missing infrastructure intelligently
-- Use ONLY resources appropriate for {provider}
-- Reference the official {provider} Terraform provider documentation mentally
-- Ensure all resource names are valid for {provider} (e.g., ACR names must be alphanumeric)
-- Include data sources where needed (e.g., azurerm_client_config for Azure)
-- Add comments explaining key architectural decisions and why you chose specific resources
-
-Output ONLY valid Terraform HCL code with file separators. No explanations outside comments.
-""".strip()
+# Stages of /plan: cost, performance and structure start together; terraform
+# and cli start as soon as the structure is ready.
+PLAN_STAGES = (
+    ("cost", ()),
+    ("performance", ()),
+    ("structure", ()),
+    ("terraform", ("structure",)),
+    ("cli", ("structure",)),
+)
+plan_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("PLAN_WORKERS", "12")),
+    thread_name_prefix="plan",
+)
 
-    try:
-        print(">>> Calling OpenAI for Terraform module generation (gpt-4o)...")
-        resp = client.chat.completions.create(
-            model="gpt-4o",
-            temperature=0.5,
-            max_tokens=10000,
-            messages=[
-                {"role": "system", "content": "You are an expert Infrastructure as Code engineer. Analyze the user's project description thoroughly and suggest production-grade infrastructure when they don't specify details. Output only valid Terraform HCL code organized as modules with clear file separators."},
-                {"role": "user", "content": terraform_prompt},
-            ],
-        )
-        answer = (resp.choices[0].message.content or "").strip()
+
+def _plan_stage(client, kind: str, form: dict, refresh: bool, user_id):
+    def run(deps: dict):
+        stage_form = dict(form)
+        if "structure" in deps:
+            stage_form["structure"] = deps["structure"]["answer"]
+        spec = SPEC_BUILDERS[kind](stage_form)
+        started = time.perf_counter()
+        answer, cache_status = _cached_completion(client, spec, refresh)
         if not answer:
-            return jsonify({"error": "OpenAI returned an empty response."}), 502
-    except Exception as e:
-        return jsonify({"error": f"OpenAI request failed: {e}"}), 500
+            raise GenerationError("OpenAI returned an empty response.", 502)
+        _queue_history(spec, answer, user_id)
+        return {"answer": answer, "cache": cache_status, "ms": int((time.perf_counter() - started) * 1000)}
 
-    try:
-        if current_user.is_authenticated:
-            with Session(engine) as s:
-                h = History(
-                    user_id=current_user.id,
-                    item_type="terraform",
-                    provider=provider or "",
-                    scale=scale or "",
-                    loading=loading or "",
-                    prompt_text=description or "",
-                    result_text=answer,
-                )
-                s.add(h)
-                s.commit()
-    except Exception as _e:
-        print(">>> WARN: Failed to save terraform history:", _e)
+    return run
 
-    return jsonify({"terraform": answer})
 
+@app.route("/plan", methods=["POST"])
+@login_required
+def full_plan():
+    """Run every generation for one project as a dependency graph, streamed as SSE.
 
-@app.route("/infra_cli", methods=["POST"])
-def infra_cli():
-    provider = request.form.get("provider")
-    description = request.form.get("description", "")
-    scale = request.form.get("scale", scales[0])
-    loading = request.form.get("loading_pressure", loading_pressure[0])
-    structure = request.form.get("structure", "")
-
-    load_env_files()
-
-    openai_key = os.environ.get("OPENAI_API_KEY")
-    if not openai_key:
-        return (
-            jsonify(
-                {
-                    "error": (
-                        "OPENAI_API_KEY not set. "
-                        "Add it to a .env file (preferred) or .env.example in the project root, "
-                        "or export it in your shell."
-                    )
-                }
-            ),
-            400,
-        )
+    Events: ``meta`` (stage names and dependencies), one ``stage`` event per
+    stage as it finishes (``{"stage", <kind>, "cache", "ms"}`` or ``{"stage",
+    "error"}``), then ``done`` with the total wall time.
+    """
+    client = llm_client.get_client()
+    if client is None:
+        return jsonify({"error": OPENAI_KEY_MISSING}), 400
+
+    form = request.form.to_dict()
+    refresh = _cache_refresh_requested()
+    user_id = _current_user_id()
+    stages = [Stage(kind, _plan_stage(client, kind, form, refresh, user_id), deps) for kind, deps in PLAN_STAGES]
+
+    def events():
+        started = time.perf_counter()
+        yield _sse({"stages": {kind: list(deps) for kind, deps in PLAN_STAGES}}, "meta")
+        failed = []
+        for kind, result, error in run_dag(stages, plan_executor):
+            if error is None:
+                yield _sse({"stage": kind, kind: result["answer"], "cache": result["cache"], "ms": result["ms"]}, "stage")
+                continue
+            failed.append(kind)
+            if isinstance(error, (GenerationError, PromptBudgetError, DependencyFailed)):
+                message = str(error)
+            else:
+                message = f"OpenAI request failed: {error}"
+            yield _sse({"stage": kind, "error": message}, "stage")
+        yield _sse({"failed": failed, "total_ms": int((time.perf_counter() - started) * 1000)}, "done")
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+def _update_job(job_id: str, only_if_status: str | None = None, **fields) -> bool:
+    """Update a job row; with ``only_if_status`` the update is a compare-and-set."""
+    stmt = update(GenerationJob).where(GenerationJob.id == job_id)
+    if only_if_status:
+        stmt = stmt.where(GenerationJob.status == only_if_status)
+    with Session(engine) as s:
+        changed = s.execute(stmt.values(**fields)).rowcount
+        s.commit()
+    return bool(changed)
 
-    client = OpenAI(api_key=openai_key)
-    print(f">>> OPENAI_API_KEY present: True (length={len(openai_key)})")
-
-    cli_prompt = f"""
-You are a senior Cloud SRE. Generate a SINGLE Linux Bash CLI script that provisions the complete production infrastructure for the project described below. The script must use the correct cloud CLI for the provider ({provider}):
-
-- Azure → az
-- AWS → aws
-- Google Cloud → gcloud
-
-Context:
-- Cloud provider: {provider}
-- Scale tier: {scale}
-- Loading pressure: {loading}
-
-**PRIMARY SOURCE OF TRUTH - READ EVERY WORD CAREFULLY:**
-Project description: {description}
-
-**SECONDARY REFERENCE (for folder organization hints only):**
-Project structure (if available):
-{structure}
-
-GOAL:
-Create a production-ready CLI that builds ALL infrastructure requirements explicitly stated or clearly implied in the PROJECT DESCRIPTION above. Read EVERY detail the user wrote - database types, specific services, networking requirements, monitoring needs, container registries, CDN, identity/auth, secrets management, etc.
-
-The project structure is ONLY a folder layout reference. Your primary job is to implement EVERYTHING the user described in their requirements.
-
-STRICT REQUIREMENTS:
-1) Output ONLY a single Bash script with shebang (#!/usr/bin/env bash). No commentary outside script.
-2) Use: set -uo pipefail; IFS=$'\n\t'  # do NOT -e; we will keep going to maximize coverage
-3) Accept flags: --env (dev|staging|prod), --region, --name-prefix
-4) Validate prerequisites: correct CLI installed and logged in; print a clear error and exit if missing
-5) Creation policy: attempt resource creation UNCONDITIONALLY (no pre-checks). If the CLI returns an "already exists" error, TREAT AS SUCCESS and continue. Do not query for existence upfront.
-6) Safe defaults by provider and scale; choose sensible SKUs; parametrize where helpful
-7) Tag/label resources with environment and app name where supported
-8) Implement a run_step helper that executes commands, records success/failure without stopping the script, and logs human-friendly messages. Do not hard fail on individual step errors.
-9) At the END, print a coverage summary with percentage = (successful_steps / total_steps * 100). TARGET >= 95%. List failed steps so the user can retry them.
-10) Never echo secrets; avoid inline passwords; generate if needed and print retrieval instruction
-11) Keep it concise and readable; group by module; add helpful comments in the script
-
-CRITICAL REQUIREMENTS CHECKLIST (scan the description and implement ALL mentioned items):
-
-DATABASE:
-- If PostgreSQL mentioned → Azure Database for PostgreSQL Flexible Server (v16), NOT Azure SQL
-- If MySQL mentioned → Azure Database for MySQL Flexible Server (v8.0), NOT Azure SQL
-- If SQL Server/MSSQL mentioned → Azure SQL Database
-- If MongoDB/Cosmos mentioned → Cosmos DB with appropriate API
-- Store credentials in Key Vault/Secrets Manager; NEVER print them; output retrieval instruction
-
-CONTAINER REGISTRY & IMAGE PULL:
-- If containers/Docker/images mentioned → create ACR/ECR/Artifact Registry
-- Azure ACR: DISABLE admin user; create Managed Identity for App Service/AKS; grant AcrPull role assignment
-- AWS ECR: grant task/instance role ecr:GetAuthorizationToken, ecr:BatchGetImage, ecr:GetDownloadUrlForLayer
-- GCP Artifact Registry: grant service account artifactregistry.reader
-- Wire compute to pull images via identity/role (NO usernames/passwords)
-
-STATIC SITE & CDN:
-- If static site/frontend/web mentioned → enable Static Website on storage account
-- Set index document (index.html) and error document (404.html)
-- If CDN mentioned → create Azure Front Door/CloudFront/Cloud CDN with origin pointing to storage $web endpoint (NOT blob.core.windows.net)
-- Configure caching rules and HTTPS
-
-MONITORING & APPLICATION INSIGHTS:
-- Always create Log Analytics Workspace first
-- Create Application Insights and link it using the Log Analytics RESOURCE ID (not name)
-- Use correct CLI syntax: for Azure, pass --workspace as the full resource ID
-- Wire App Insights connection string to App Service via app settings (APPLICATIONINSIGHTS_CONNECTION_STRING)
-- Enable diagnostic settings for databases, storage, and compute
-
-IDENTITY & SECRETS:
-- App Service/Web App: enable System-Assigned Managed Identity
-- Store all secrets in Key Vault/Secrets Manager/Secret Manager
-- Grant the managed identity/role access to Key Vault secrets
-- Never use fake/placeholder connection strings; generate real ones and store in vault
-
-SECURITY & NETWORKING:
-- Enforce HTTPS-only on App Service/Web Apps
-- Configure health check endpoint (e.g., /health or /api/health)
-- Use private endpoints for databases if networking/vnet mentioned
-- Create NSGs/Security Groups with least-privilege rules
-- Enable minimum TLS version (1.2+)
-
-PROVIDER-SPECIFIC RULES FOR {provider}:
-
-Azure:
-- Resource Group first
-- VNet + Subnet (if multi-tier or DB mentioned)
-- PostgreSQL Flexible Server (NOT old PostgreSQL Server resource)
-- MySQL Flexible Server (NOT old MySQL Server resource)
-- ACR with admin disabled + managed identity + AcrPull
-- Storage Account with Static Website enabled (if static site mentioned)
-- Front Door with origin = storage $web endpoint (if CDN mentioned)
-- Log Analytics Workspace → Application Insights linked via resource ID
-- Key Vault with soft-delete and purge-protection
-- App Service with managed identity, HTTPS-only, health check, App Insights connection string
-
-AWS:
-- VPC + Subnets + Security Groups
-- RDS (PostgreSQL/MySQL with current versions)
-- ECR with IAM role for pull
-- S3 bucket with website hosting enabled (if static)
-- CloudFront with origin = S3 website endpoint (if CDN)
-- CloudWatch Logs + Alarms
-- Secrets Manager for DB creds
-- ECS/Fargate or Elastic Beanstalk with task role for ECR pull
-
-Google Cloud:
-- VPC + Subnets + Firewall rules
-- Cloud SQL (PostgreSQL/MySQL current versions)
-- Artifact Registry with service account reader
-- Cloud Storage with website config (if static)
-- Cloud CDN with backend = storage (if CDN)
-- Cloud Logging + Monitoring
-- Secret Manager for credentials
-- Cloud Run or GKE with service account for registry pullOUTPUT FORMAT:
-Print ONLY the script. No Markdown, no triple backticks, no explanations.
-""".strip()
 
+def _run_generation_job(job_id: str, cancel_event, spec: dict, refresh: bool, user_id: int):
+    # The job outlives the request that queued it, so it is traced on its own.
+    with request_tracing.background("generation_job", spec["item_type"]):
+        _generation_job(job_id, cancel_event, spec, refresh, user_id)
+
+
+def _generation_job(job_id: str, cancel_event, spec: dict, refresh: bool, user_id: int):
+    if not _update_job(job_id, only_if_status="queued", status="running", started_at=datetime.utcnow()):
+        return  # cancelled while queued
+
+    last_poll = time.monotonic()
+
+    def cancelled() -> bool:
+        nonlocal last_poll
+        if cancel_event.is_set():
+            return True
+        if time.monotonic() - last_poll < JOB_CANCEL_POLL_SECONDS:
+            return False
+        last_poll = time.monotonic()
+        with Session(engine) as s:
+            return bool(s.get(GenerationJob, job_id).cancel_requested)
+
+    client = llm_client.get_client()
+    if client is None:
+        _update_job(job_id, status="failed", error=OPENAI_KEY_MISSING, finished_at=datetime.utcnow())
+        return
     try:
-        print(">>> Calling OpenAI for Infra CLI generation (gpt-4o)...")
-        resp = client.chat.completions.create(
-            model="gpt-4o",
-            temperature=0.3,
-            max_tokens=16000,
-            messages=[
-                {"role": "system", "content": "You are a senior Cloud SRE and infrastructure automation expert. Read the user's project description word-by-word and implement EVERY requirement they mentioned. Output only a single robust Bash script with no extra text."},
-                {"role": "user", "content": cli_prompt},
-            ],
+        chunks = _completion_chunks(client, spec, refresh)
+        for kind, value in chunks:
+            if kind == "done":
+                answer, cache_status = value
+            elif cancelled():
+                chunks.close()
+                # only_if_status: a worker shutdown has already marked the job failed.
+                _update_job(job_id, only_if_status="running", status="cancelled", finished_at=datetime.utcnow())
+                print(f">>> Job {job_id} cancelled mid-generation")
+                return
+
+        history_id = _save_history(spec, answer, user_id)
+        _update_job(
+            job_id,
+            only_if_status="running",
+            status="succeeded",
+            history_id=history_id,
+            cache_status=cache_status,
+            finished_at=datetime.utcnow(),
         )
-        answer = (resp.choices[0].message.content or "").strip()
-        if not answer:
-            return jsonify({"error": "OpenAI returned an empty response."}), 502
+    except GenerationError as e:
+        _update_job(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
     except Exception as e:
-        return jsonify({"error": f"OpenAI request failed: {e}"}), 500
+        # A database error (cancel poll, history save, status update) must not
+        # leave the job "running" until JOB_STALE_SECONDS marks it stale.
+        print(f">>> ERROR: job {job_id} failed: {e}")
+        _update_job(job_id, only_if_status="running", status="failed", error=f"Job failed: {e}", finished_at=datetime.utcnow())
+
+
+def shutdown_jobs() -> None:
+    """Stop this worker's jobs and mark them failed now instead of after JOB_STALE_SECONDS."""
+    job_ids = job_runner.shutdown()
+    if not job_ids:
+        return
+    with Session(engine) as s:
+        n = s.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id.in_(job_ids), GenerationJob.status.in_(("queued", "running")))
+            .values(status="failed", error="The worker running this job shut down; please retry.", finished_at=datetime.utcnow())
+        ).rowcount
+        s.commit()
+    print(f">>> Marked {n} unfinished job(s) failed on worker shutdown")
+
+
+def _job_to_dict(job: GenerationJob) -> dict:
+    status = job.status
+    error = job.error or ""
+    since = job.started_at if status == "running" else job.created_at
+    if status in ("queued", "running") and since and (datetime.utcnow() - since).total_seconds() > JOB_STALE_SECONDS:
+        status, error = "failed", "Job worker stopped responding."
+    return {
+        "job_id": job.id,
+        "type": job.item_type,
+        "status": status,
+        "error": error or None,
+        "cache": job.cache_status or None,
+        "history_id": job.history_id,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status_url": url_for("job_status", job_id=job.id),
+        "result_url": url_for("job_result", job_id=job.id),
+    }
+
+
+def _get_own_job(s: Session, job_id: str):
+    job = s.get(GenerationJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        return None
+    return job
 
-    # Save history
-    try:
-        if current_user.is_authenticated:
-            with Session(engine) as s:
-                h = History(
-                    user_id=current_user.id,
-                    item_type="cli",
-                    provider=provider or "",
-                    scale=scale or "",
-                    loading=loading or "",
-                    prompt_text=description or "",
-                    result_text=answer,
-                )
-                s.add(h)
-                s.commit()
-    except Exception as _e:
-        print(">>> WARN: Failed to save cli history:", _e)
 
-    return jsonify({"cli": answer})
+@app.route("/jobs/<kind>", methods=["POST"])
+@login_required
+def submit_job(kind):
+    """Queue a generation and return immediately with a job id (202)."""
+    builder = SPEC_BUILDERS.get(kind)
+    if builder is None:
+        return jsonify({"error": f"Unknown job type: {kind}"}), 404
+
+    spec = builder(request.form)
+    job = GenerationJob(id=uuid.uuid4().hex, user_id=current_user.id, item_type=kind, status="queued")
+    with Session(engine) as s:
+        s.add(job)
+        s.commit()
+        if not job_runner.submit(job.id, _run_generation_job, spec, _cache_refresh_requested(), current_user.id):
+            job.status = "failed"
+            job.error = "Job queue is full, try again shortly."
+            job.finished_at = datetime.utcnow()
+            s.commit()
+            resp = jsonify(_job_to_dict(job))
+            resp.status_code = 503
+            resp.headers["Retry-After"] = "5"
+            return resp
+        resp = jsonify(_job_to_dict(job))
+    resp.status_code = 202
+    resp.headers["Location"] = url_for("job_status", job_id=job.id)
+    return resp
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+@login_required
+def job_status(job_id):
+    with Session(engine) as s:
+        job = _get_own_job(s, job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(_job_to_dict(job))
+
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+@login_required
+def job_result(job_id):
+    with Session(engine) as s:
+        job = _get_own_job(s, job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        info = _job_to_dict(job)
+        if info["status"] in ("queued", "running"):
+            return jsonify(info), 202
+        if info["status"] != "succeeded":
+            return jsonify(info), 409
+        h = s.get(History, job.history_id) if job.history_id else None
+        if h is None:
+            return jsonify({**info, "error": "Result was not stored."}), 410
+        info[job.item_type] = h.result
+        return jsonify(info)
+
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+@login_required
+def cancel_job(job_id):
+    with Session(engine) as s:
+        job = _get_own_job(s, job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        if job.status in TERMINAL_STATES:
+            return jsonify(_job_to_dict(job)), 409
+        job.cancel_requested = True
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finished_at = datetime.utcnow()
+        s.commit()
+        job_runner.cancel(job_id)
+        return jsonify(_job_to_dict(job))
+
+
+HISTORY_PAGE_SIZE = 20
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "200"))
+EXPORT_CHUNK_CHARS = 64 * 1024
+ZIP_MAX_ITEMS = int(os.environ.get("ZIP_MAX_ITEMS", "500"))
+HISTORY_MAX_PAGE_SIZE = 100
+
+
+def _encode_history_cursor(created_at: datetime, item_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{item_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_history_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        ts, item_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(item_id)
+    except Exception:
+        return None
 
 
 @app.route("/history", methods=["GET"])
 @login_required
 def history_list():
+    """Summary-first, keyset-paginated history.
+
+    Query params:
+      - limit: page size (default 20, max 100)
+      - cursor: ``next_cursor`` from the previous page
+      - type: filter by item type (cost|performance|structure|terraform|cli|all)
+
+    Items carry metadata and short previews only; fetch ``/history/<id>`` for
+    the full prompt and result.
+    """
+    try:
+        limit = min(max(int(request.args.get("limit") or HISTORY_PAGE_SIZE), 1), HISTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    item_type = (request.args.get("type") or "all").strip().lower()
+    cursor = (request.args.get("cursor") or "").strip()
+
     try:
         with Session(engine) as s:
-            items = (
-                s.query(History)
-                .filter(History.user_id == current_user.id)
-                .order_by(History.created_at.desc())
-                .limit(50)
-                .all()
-            )
-            out = [
+            query = s.query(
+                History.id,
+                History.item_type,
+                History.created_at,
+                History.provider,
+                History.scale,
+                History.loading,
+                History.country,
+                func.substr(History.prompt_text, 1, HISTORY_PREVIEW_CHARS).label("prompt_preview"),
+                func.coalesce(History.result_preview, func.substr(History.result_text, 1, HISTORY_PREVIEW_CHARS)).label(
+                    "result_preview"
+                ),
+                func.coalesce(History.result_chars, func.length(History.result_text)).label("result_chars"),
+            ).filter(History.user_id == current_user.id)
+            if item_type and item_type != "all":
+                query = query.filter(History.item_type == item_type)
+            if cursor:
+                position = _decode_history_cursor(cursor)
+                if position is None:
+                    return jsonify({"error": "Invalid cursor"}), 400
+                query = query.filter(tuple_(History.created_at, History.id) < tuple_(*position))
+            rows = query.order_by(History.created_at.desc(), History.id.desc()).limit(limit + 1).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        out = [
+            {
+                "id": r.id,
+                "type": r.item_type,
+                "created_at": r.created_at.isoformat(),
+                "provider": r.provider,
+                "scale": r.scale,
+                "loading": r.loading,
+                "country": r.country,
+                "prompt_preview": r.prompt_preview or "",
+                "result_preview": r.result_preview or "",
+                "result_chars": r.result_chars or 0,
+            }
+            for r in rows
+        ]
+        next_cursor = _encode_history_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+        return jsonify({"history": out, "next_cursor": next_cursor})
+    except Exception as e:
+        return jsonify({"error": f"Failed to load history: {e}"}), 500
+
+
+@app.route("/history/<int:item_id>", methods=["GET"])
+@login_required
+def history_detail(item_id):
+    try:
+        with Session(engine) as s:
+            h = s.get(History, item_id)
+            if h is None or h.user_id != current_user.id:
+                return jsonify({"error": "History item not found"}), 404
+            return jsonify(
                 {
                     "id": h.id,
                     "type": h.item_type,
@@ -1320,13 +1678,197 @@ def history_list():
                     "loading": h.loading,
                     "country": h.country,
                     "prompt": h.prompt_text,
-                    "result": h.result_text,
+                    "result": h.result,
                 }
-                for h in items
-            ]
-            return jsonify({"history": out})
+            )
     except Exception as e:
-        return jsonify({"error": f"Failed to load history: {e}"}), 500
+        return jsonify({"error": f"Failed to load history item: {e}"}), 500
+
+
+def _zip_response(chunks, filename: str) -> Response:
+    def _guarded():
+        try:
+            yield from chunks
+        except Exception as e:
+            print(">>> ERROR: ZIP download aborted mid-stream:", e)
+            raise
+
+    return Response(
+        _guarded(),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+@app.route("/history/<int:item_id>/zip", methods=["GET"])
+@login_required
+def history_zip(item_id):
+    """One terraform, structure or cli item as a ZIP archive of its files."""
+    try:
+        with Session(engine) as s:
+            h = s.get(History, item_id)
+            if h is None or h.user_id != current_user.id:
+                return jsonify({"error": "History item not found"}), 404
+            if h.item_type not in ARCHIVE_TYPES:
+                return jsonify({"error": f"{h.item_type} items have no files to download"}), 400
+            item = ArchiveItem(h.id, h.item_type, h.result, h.created_at)
+    except Exception as e:
+        return jsonify({"error": f"Failed to load history item: {e}"}), 500
+    return _zip_response(stream_archive([item], folders=False, dedup=False, manifest=False), f"{archive_name(item)}.zip")
+
+
+@app.route("/history/zip", methods=["GET"])
+@login_required
+def history_zip_bulk():
+    """Many history items in one ZIP archive, one folder per item.
+
+    The archive is streamed while rows are read in batches of
+    EXPORT_BATCH_SIZE; at most ZIP_MAX_ITEMS items, newest first.
+
+    Optional query params:
+      - ids: comma-separated item ids (default: all)
+      - type: terraform|structure|cli|all
+      - dedup: 1 (default) stores a file identical to one in an earlier item once;
+        manifest.json maps the copies. Files within one item are never dropped.
+    """
+    item_type = (request.args.get("type") or "all").strip().lower()
+    if item_type != "all" and item_type not in ARCHIVE_TYPES:
+        return jsonify({"error": f"type must be one of: all, {', '.join(ARCHIVE_TYPES)}"}), 400
+    try:
+        ids = [int(i) for i in (request.args.get("ids") or "").split(",") if i.strip()]
+    except ValueError:
+        return jsonify({"error": "ids must be comma-separated integers"}), 400
+    dedup = (request.args.get("dedup") or "1").strip() not in ("0", "false", "no")
+    user_id = current_user.id
+
+    def _items():
+        with Session(engine) as s:
+            query = (
+                s.query(History)
+                .options(joinedload(History.result_blob))
+                .filter(History.user_id == user_id, History.item_type.in_(ARCHIVE_TYPES))
+            )
+            if item_type != "all":
+                query = query.filter(History.item_type == item_type)
+            if ids:
+                query = query.filter(History.id.in_(ids))
+            query = query.order_by(History.created_at.desc(), History.id.desc()).limit(ZIP_MAX_ITEMS)
+            for h in query.yield_per(EXPORT_BATCH_SIZE):
+                yield ArchiveItem(h.id, h.item_type, h.result, h.created_at)
+                s.expunge(h)
+
+    return _zip_response(stream_archive(_items(), dedup=dedup), f"history_{user_id}.zip")
+
+
+SEARCH_HIGHLIGHT = "StartSel=\x02, StopSel=\x03, MaxWords=35, MinWords=12, MaxFragments=2, FragmentDelimiter=\" … \""
+
+
+def _highlight(snippet: str | None) -> str:
+    """Escape a ts_headline fragment for HTML and turn its markers into <mark>."""
+    return html.escape(snippet or "").replace("\x02", "<mark>").replace("\x03", "</mark>")
+
+
+def _result_snippets(s, rows, q):
+    """ts_headline over result texts for one search page.
+
+    Results are stored compressed, so the page's blobs are decompressed here
+    and handed back to Postgres as an array for highlighting.
+    """
+    digests = {r.result_digest for r in rows if r.result_digest}
+    blobs = {b.digest: b.text for b in s.query(ResultBlob).filter(ResultBlob.digest.in_(digests))} if digests else {}
+    docs = [blobs.get(r.result_digest) if r.result_digest else (r.result_text or "") for r in rows]
+    if not docs:
+        return []
+    snippets = s.execute(
+        text(
+            "SELECT ts_headline(CAST(:cfg AS regconfig), doc, websearch_to_tsquery(CAST(:cfg AS regconfig), :q), :opts) "
+            "FROM unnest(CAST(:docs AS text[])) WITH ORDINALITY AS t(doc, n) ORDER BY n"
+        ),
+        {"cfg": SEARCH_CONFIG, "q": q, "opts": SEARCH_HIGHLIGHT, "docs": [d or "" for d in docs]},
+    ).scalars().all()
+    return snippets
+
+
+@app.route("/history/search", methods=["GET"])
+@login_required
+def history_search():
+    """Ranked full-text search over the user's history.
+
+    Query params:
+      - q: search terms (web search syntax: quotes, OR, -exclude)
+      - type: filter by item type (cost|performance|structure|terraform|cli|all)
+      - limit / offset: paging; the response carries ``next_offset``
+
+    Snippets are HTML-escaped with matches wrapped in <mark>.
+    """
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return jsonify({"error": "q is required"}), 400
+    if not SEARCH_ENABLED:
+        return jsonify({"error": SEARCH_UNAVAILABLE}), 501
+    item_type = (request.args.get("type") or "all").strip().lower()
+    try:
+        limit = min(max(int(request.args.get("limit") or HISTORY_PAGE_SIZE), 1), HISTORY_MAX_PAGE_SIZE)
+        offset = max(int(request.args.get("offset") or 0), 0)
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers"}), 400
+
+    try:
+        with Session(engine) as s:
+            tsq = history_search_query(q)
+            rank = func.ts_rank_cd(History.search_vector, tsq)
+            matches = s.query(History.id.label("id"), rank.label("rank")).filter(
+                History.user_id == current_user.id,
+                History.search_vector.op("@@")(tsq),
+            )
+            if item_type and item_type != "all":
+                matches = matches.filter(History.item_type == item_type)
+            # Rank and page first; ts_headline then runs only on the page.
+            page = (
+                matches.order_by(rank.desc(), History.id.desc())
+                .offset(offset)
+                .limit(limit + 1)
+                .subquery()
+            )
+            rows = (
+                s.query(
+                    History.id,
+                    History.item_type,
+                    History.created_at,
+                    History.provider,
+                    History.scale,
+                    History.loading,
+                    History.country,
+                    page.c.rank,
+                    func.ts_headline(SEARCH_CONFIG, History.prompt_text, tsq, SEARCH_HIGHLIGHT).label("prompt_snippet"),
+                    History.result_digest,
+                    History.result_text,
+                )
+                .join(page, page.c.id == History.id)
+                .order_by(page.c.rank.desc(), History.id.desc())
+                .all()
+            )
+            result_snippets = _result_snippets(s, rows[:limit], q)
+
+        has_more = len(rows) > limit
+        out = [
+            {
+                "id": r.id,
+                "type": r.item_type,
+                "created_at": r.created_at.isoformat(),
+                "provider": r.provider,
+                "scale": r.scale,
+                "loading": r.loading,
+                "country": r.country,
+                "rank": round(float(r.rank), 6),
+                "prompt_snippet": _highlight(r.prompt_snippet),
+                "result_snippet": _highlight(result_snippets[i]),
+            }
+            for i, r in enumerate(rows[:limit])
+        ]
+        return jsonify({"results": out, "q": q, "next_offset": offset + limit if has_more else None})
+    except Exception as e:
+        return jsonify({"error": f"Failed to search history: {e}"}), 500
 
 
 @app.route("/history/export", methods=["GET"])
@@ -1334,172 +1876,120 @@ def history_list():
 def history_export():
     """Export the user's full history as a clean, readable JSON file.
 
+    The body is streamed: rows come from a server-side cursor in batches of
+    EXPORT_BATCH_SIZE and each item is serialized as soon as it is read, so
+    memory stays flat regardless of history size. ``count`` is therefore
+    written after ``items``.
+
     Optional query params:
       - type: filter by item type (cost|performance|structure|terraform|cli|all)
-      - q: full-text search in prompt/result
+      - q: full-text search in prompt/result (web search syntax, uses the GIN index)
+      - format: json (default) or ndjson (one item object per line)
     """
     try:
         item_type = (request.args.get("type") or "all").strip().lower()
         q = (request.args.get("q") or "").strip()
         include_raw = (request.args.get("include_raw") or "0").strip() in ("1", "true", "yes")
+        fmt = (request.args.get("format") or "json").strip().lower()
+        if fmt not in ("json", "ndjson"):
+            return jsonify({"error": "format must be json or ndjson"}), 400
+        if q and not SEARCH_ENABLED:
+            return jsonify({"error": SEARCH_UNAVAILABLE}), 501
+        user_id = current_user.id
+        user_email = getattr(current_user, "email", "") or ""
 
-        with Session(engine) as s:
-            query = s.query(History).filter(History.user_id == current_user.id)
-            if item_type and item_type != "all":
-                query = query.filter(History.item_type == item_type)
-            if q:
-                like = f"%{q}%"
-                query = query.filter(or_(History.prompt_text.ilike(like), History.result_text.ilike(like)))
-
-            items = query.order_by(History.created_at.desc()).all()
-
-        # Build a rich, readable JSON structure
         from datetime import datetime as _dt
-        def _strip_code_fences(txt: str) -> str:
-            if not txt:
-                return ""
-            t = txt.strip()
-            if t.startswith("```"):
-                # find closing fence
-                lines = t.splitlines()
-                # drop first fence line
-                core = []
-                open_seen = False
-                for i, line in enumerate(lines):
-                    if i == 0 and line.strip().startswith("```"):
-                        open_seen = True
-                        continue
-                    if open_seen and line.strip().startswith("```"):
-                        break
-                    core.append(line)
-                return "\n".join(core).strip()
-            return txt
-
-        import re as _re
-
-        def _normalize_result(item: History, include_raw_flag: bool) -> dict:
-            """Return a readable structure for JSON export.
-            - structure: provide tree lines (code fences removed), no raw unless include_raw=1
-            - terraform: split by '### FILE: <path>' headers into files with content lines
-            - cli: expose shebang and lines
-            - others: cleaned text field
-            """
-            raw = item.result_text or ""
-            plain = _strip_code_fences(raw)
-            if (item.item_type or "").lower() == "structure":
-                lines = [ln.rstrip() for ln in plain.splitlines()]
-                out = {"format": "tree", "lines": lines}
-                if include_raw_flag:
-                    out["raw"] = raw
-                return out
-            if (item.item_type or "").lower() == "terraform":
-                files = []
-                current = None
-                for ln in plain.splitlines():
-                    m = _re.match(r"^###\s*FILE:\s*(.+)$", ln.strip())
-                    if m:
-                        # start new file
-                        if current:
-                            # trim trailing blanks
-                            while current["content"] and current["content"][-1].strip() == "":
-                                current["content"].pop()
-                            files.append(current)
-                        current = {"path": m.group(1).strip(), "content": []}
-                    else:
-                        if current is None:
-                            # content before first header, treat as _root.tf
-                            current = {"path": "_root.tf", "content": []}
-                        current["content"].append(ln.rstrip())
-                if current:
-                    while current["content"] and current["content"][-1].strip() == "":
-                        current["content"].pop()
-                    files.append(current)
-                out = {"format": "terraform", "files": files}
-                if include_raw_flag:
-                    out["raw"] = raw
-                return out
-            if (item.item_type or "").lower() == "cli":
-                lines = [ln.rstrip() for ln in plain.splitlines()]
-                shebang = lines[0] if (lines and lines[0].startswith("#!")) else None
-                if shebang:
-                    lines = lines[1:]
-                out = {"format": "bash", "shebang": shebang, "lines": lines}
-                if include_raw_flag:
-                    out["raw"] = raw
-                return out
+
+        def _export_item(h: History) -> dict:
             return {
-                "format": "text",
-                "text": plain,
+                "id": h.id,
+                "type": h.item_type,
+                "timestamp": (h.created_at.isoformat() if h.created_at else None),
+                "context": {
+                    "provider": h.provider or "",
+                    "scale": h.scale or "",
+                    "loading": h.loading or "",
+                    "country": h.country or "",
+                },
+                "prompt": strip_code_fences(h.prompt_text),
+                "result_normalized": normalize_result(h.item_type, h.result, include_raw),
             }
 
-        payload = {
-            "version": 1,
-            "exported_at": _dt.utcnow().isoformat() + "Z",
-            "user": {
-                "id": current_user.id,
-                "email": getattr(current_user, "email", "") or "",
-            },
-            "filters": {
-                "type": item_type,
-                "q": q,
-            },
-            "count": len(items),
-            "items": []
-        }
-
-        for h in items:
-            payload["items"].append(
-                {
-                    "id": h.id,
-                    "type": h.item_type,
-                    "timestamp": (h.created_at.isoformat() if h.created_at else None),
-                    "context": {
-                        "provider": h.provider or "",
-                        "scale": h.scale or "",
-                        "loading": h.loading or "",
-                        "country": h.country or "",
-                    },
-                    "prompt": _strip_code_fences(h.prompt_text or ""),
-                    "result_normalized": _normalize_result(h, include_raw),
-                }
-            )
-
-        import json as _json
-        body = _json.dumps(payload, ensure_ascii=False, indent=2)
-        filename = f"history_{current_user.id}.json"
+        def _rows():
+            with Session(engine) as s:
+                query = s.query(History).options(joinedload(History.result_blob)).filter(History.user_id == user_id)
+                if item_type and item_type != "all":
+                    query = query.filter(History.item_type == item_type)
+                if q:
+                    query = query.filter(History.search_vector.op("@@")(history_search_query(q)))
+                query = query.order_by(History.created_at.desc(), History.id.desc())
+                for h in query.yield_per(EXPORT_BATCH_SIZE):
+                    yield h
+                    s.expunge(h)
+
+        def _pieces():
+            if fmt == "ndjson":
+                for h in _rows():
+                    yield json.dumps(_export_item(h), ensure_ascii=False) + "\n"
+                return
+            header = {
+                "version": 1,
+                "exported_at": _dt.utcnow().isoformat() + "Z",
+                "user": {
+                    "id": user_id,
+                    "email": user_email,
+                },
+                "filters": {
+                    "type": item_type,
+                    "q": q,
+                },
+            }
+            # Re-open the header object so items can be appended one by one
+            yield json.dumps(header, ensure_ascii=False, indent=2)[:-2] + ',\n  "items": ['
+            count = 0
+            for h in _rows():
+                item = json.dumps(_export_item(h), ensure_ascii=False, indent=2)
+                yield ("," if count else "") + "\n    " + item.replace("\n", "\n    ")
+                count += 1
+            yield ("\n  " if count else "") + f'],\n  "count": {count}\n}}\n'
+
+        def _chunks():
+            buf: list[str] = []
+            size = 0
+            try:
+                for piece in _pieces():
+                    buf.append(piece)
+                    size += len(piece)
+                    if size >= EXPORT_CHUNK_CHARS:
+                        yield "".join(buf)
+                        buf, size = [], 0
+            except Exception as e:
+                print(">>> ERROR: History export aborted mid-stream:", e)
+                raise
+            if buf:
+                yield "".join(buf)
+
+        ext = "ndjson" if fmt == "ndjson" else "json"
+        filename = f"history_{user_id}.{ext}"
         return Response(
-            body,
-            mimetype="application/json",
+            _chunks(),
+            mimetype="application/x-ndjson" if fmt == "ndjson" else "application/json",
             headers={"Content-Disposition": f"attachment; filename={filename}"},
         )
     except Exception as e:
         return jsonify({"error": f"Failed to export history: {e}"}), 500
 
 
-@app.before_request
-def _dbg_paths():
-    print(">>> template_folder:", app.template_folder, " static_folder:", app.static_folder)
-
-if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=5001, debug=True)
-
-app.config["DEBUG"] = True
-app.config["TEMPLATES_AUTO_RELOAD"] = True
-app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 0
-app.jinja_env.cache = {}
-
 @app.after_request
 def add_no_cache(resp):
+    # Static files carry their own caching headers (immutable when fingerprinted).
+    if request.endpoint == "static":
+        return resp
     resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
     resp.headers["Pragma"] = "no-cache"
     resp.headers["Expires"] = "0"
     return resp
 
-@app.before_request
-def _dbg_template_path():
-    print(">>> template_folder:", app.template_folder, " static_folder:", app.static_folder)
-    try:
-        src, filename, uptodate = app.jinja_loader.get_source(app.jinja_env, "i.html")
-        print(">>> i.html from:", filename)
-    except Exception as e:
-        print(">>> i.html not found:", e)
\ No newline at end of file
+
+if __name__ == "__main__":
+    app.run(host="127.0.0.1", port=5001, debug=DEV_MODE)
@@ -0,0 +1,148 @@
+# assets.py
+"""Fingerprinted, precompressed static assets.
+
+``python assets.py`` (run in the image build) copies every file under
+``static/`` to ``static/dist/<name>.<hash>.<ext>``, writes ``.gz`` and ``.br``
+siblings for text assets and records the mapping in ``static/dist/manifest.json``.
+
+At runtime ``Assets(app)``:
+- rewrites ``url_for('static', filename=...)`` to the hashed name (templates
+  can also call ``asset_url(name)``); without a manifest, e.g. in local
+  development, the plain file is served.
+- serves the ``.br``/``.gz`` variant when the client accepts it.
+- marks hashed files ``immutable`` for a year and everything else under
+  ``/static`` ``no-cache`` (revalidated via ETag).
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:  # optional; gzip variants are still produced
+    brotli = None
+
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+HASH_CHARS = 12
+COMPRESSIBLE = (".js", ".css", ".svg", ".html", ".json", ".txt", ".map", ".xml")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Preferred first.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def fingerprint(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            h.update(block)
+    return h.hexdigest()[:HASH_CHARS]
+
+
+def _write_variants(path: str, data: bytes) -> list[str]:
+    written = []
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        with open(path + ".gz", "wb") as f:
+            f.write(gz)
+        written.append("gzip")
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            with open(path + ".br", "wb") as f:
+                f.write(br)
+            written.append("br")
+    return written
+
+
+def build(static_dir: str) -> dict:
+    """(Re)build ``static_dir/dist`` and return the manifest."""
+    out_dir = os.path.join(static_dir, DIST_DIR)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != out_dir)
+        for name in sorted(files):
+            src = os.path.join(root, name)
+            rel = os.path.relpath(src, static_dir).replace(os.sep, "/")
+            stem, ext = os.path.splitext(rel)
+            hashed = f"{DIST_DIR}/{stem}.{fingerprint(src)}{ext}"
+            dst = os.path.join(static_dir, hashed)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copyfile(src, dst)
+            encodings = []
+            if ext.lower() in COMPRESSIBLE:
+                with open(src, "rb") as f:
+                    encodings = _write_variants(dst, f.read())
+            manifest[rel] = hashed
+            print(f">>> asset {rel} -> {hashed} {' '.join(encodings)}")
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest: dict[str, str] = {}
+        self.hashed: frozenset[str] = frozenset()
+        if app is not None:
+            self.init_app(app)
+
+    def load(self, static_dir: str) -> None:
+        path = os.path.join(static_dir, DIST_DIR, MANIFEST)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+        self.hashed = frozenset(self.manifest.values())
+
+    def init_app(self, app) -> None:
+        from flask import request, send_from_directory, url_for
+
+        self.load(app.static_folder)
+        if self.manifest:
+            print(f">>> Serving {len(self.manifest)} fingerprinted assets")
+        else:
+            print(">>> No asset manifest; serving static files unhashed (run `python assets.py`)")
+
+        @app.url_defaults
+        def _hashed_static(endpoint, values):
+            if endpoint == "static" and values.get("filename") in self.manifest:
+                values["filename"] = self.manifest[values["filename"]]
+                values.pop("v", None)
+
+        def static_view(filename):
+            if filename in self.hashed:
+                for encoding, suffix in ENCODINGS:
+                    variant = filename + suffix
+                    if request.accept_encodings[encoding] and os.path.isfile(os.path.join(app.static_folder, variant)):
+                        resp = send_from_directory(app.static_folder, variant, mimetype=_mimetype(filename))
+                        resp.headers["Content-Encoding"] = encoding
+                        break
+                else:
+                    resp = send_from_directory(app.static_folder, filename)
+                resp.headers["Vary"] = "Accept-Encoding"
+                resp.headers["Cache-Control"] = IMMUTABLE
+                return resp
+            resp = send_from_directory(app.static_folder, filename)
+            resp.headers["Cache-Control"] = "no-cache"
+            return resp
+
+        app.view_functions["static"] = static_view
+        app.jinja_env.globals["asset_url"] = lambda name: url_for("static", filename=name)
+
+
+def _mimetype(filename: str) -> str:
+    import mimetypes
+
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+if __name__ == "__main__":
+    here = os.path.dirname(os.path.abspath(__file__))
+    build(sys.argv[1] if len(sys.argv) > 1 else os.path.join(here, "static"))
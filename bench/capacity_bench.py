@@ -0,0 +1,135 @@
+# bench/capacity_bench.py
+"""Concurrent-request capacity of one pod, per gunicorn worker class.
+
+For each worker class the app is started under gunicorn (same config as the
+image) against a fresh bench/stub_openai.py whose answers take
+``--latency-ms`` each, like a slow model. ``sync`` (one request per worker,
+the image's original setup) is the reference; gthread and gevent are compared
+against it. Then ``--burst`` logged-in
+generation requests are fired at once. The stub's peak in-flight count is
+how many LLM calls the pod actually held open at the same time. Wall time and
+latency percentiles show how long the rest of the burst queued behind them.
+
+    python bench/capacity_bench.py
+    python bench/capacity_bench.py --burst 512 --workers 4 --latency-ms 10000
+    python bench/capacity_bench.py --modes gevent --worker-connections 2000
+
+The sync leg serves the burst ``--workers`` requests at a time, so with the
+defaults it alone takes ``burst / workers x latency`` (about 5 minutes).
+
+Needs requirements.txt installed and the usual DATABASE_URL / DB_*
+environment pointing at a reachable database.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import load_bench  # noqa: E402
+
+
+def run_mode(args, worker_class: str, index: int) -> dict:
+    mode_args = argparse.Namespace(**vars(args))
+    mode_args.worker_class = worker_class
+    if worker_class == "sync":
+        mode_args.threads = 1  # gunicorn turns sync with threads > 1 into gthread
+    mode_args.stub_port = args.stub_port + index
+    mode_args.port = args.port + index
+    stub_url, stub_server = load_bench.start_stub(mode_args)
+    proc = load_bench.start_app(mode_args, stub_url)
+    try:
+        client = load_bench.Client(f"http://127.0.0.1:{mode_args.port}")
+        client.login()
+        build = load_bench.ROUTES[args.route]
+        # A few requests per worker first, so lazy per-process setup (OpenAI
+        # client, tokenizer) is not part of the burst.
+        with ThreadPoolExecutor(max_workers=args.workers * 2) as pool:
+            list(pool.map(lambda req: client.request(*req), [build() for _ in range(args.workers * 2)]))
+        requests = [build() for _ in range(args.burst)]
+        latencies, statuses = [], []
+
+        def one(req):
+            method, path, data = req
+            t0 = time.perf_counter()
+            status = client.request(method, path, data)
+            return (time.perf_counter() - t0) * 1000, status
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.burst) as pool:
+            for elapsed, status in pool.map(one, requests):
+                latencies.append(elapsed)
+                statuses.append(status)
+        wall = time.perf_counter() - t0
+        stats = load_bench._stub_stats(stub_url) or {}
+    finally:
+        proc.terminate()
+        proc.wait()
+        stub_server.shutdown()
+        stub_server.server_close()
+
+    ok = sum(1 for s in statuses if 200 <= s < 300)
+    return {
+        "worker_class": worker_class,
+        "workers": args.workers,
+        "configured_capacity": load_bench.app_capacity(mode_args),
+        "burst": args.burst,
+        "ok": ok,
+        "errors": args.burst - ok,
+        "peak_llm_in_flight": stats.get("peak_in_flight"),
+        "wall_s": wall,
+        "throughput_rps": args.burst / wall if wall else 0.0,
+        "p50_ms": load_bench.percentile(latencies, 50),
+        "p95_ms": load_bench.percentile(latencies, 95),
+        "max_ms": max(latencies) if latencies else float("nan"),
+        "first_error": client.first_error,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modes", default="sync,gthread,gevent", help="comma-separated gunicorn worker classes; sync is the baseline")
+    ap.add_argument("--route", default="structure", choices=[r for r in load_bench.ROUTES if r not in ("history", "export")])
+    ap.add_argument("--burst", type=int, default=256, help="requests fired at once")
+    ap.add_argument("--workers", type=int, default=4, help="gunicorn workers per pod")
+    ap.add_argument("--threads", type=int, default=8, help="threads per gthread worker")
+    ap.add_argument("--worker-connections", type=int, default=1000, help="connections per gevent worker")
+    ap.add_argument("--latency-ms", type=float, default=5000, help="upstream time per answer")
+    ap.add_argument("--tokens-per-sec", type=float, default=0)
+    ap.add_argument("--completion-tokens", type=int, default=200)
+    ap.add_argument("--port", type=int, default=5080)
+    ap.add_argument("--stub-port", type=int, default=8095)
+    ap.add_argument("--boot-timeout", type=float, default=120)
+    ap.add_argument("--json", help="also write the results to this file")
+    ap.add_argument("--verbose", action="store_true", help="show gunicorn's stderr")
+    args = ap.parse_args()
+    args.error_rate = 0.0
+    args.cache = False
+
+    results = []
+    for i, mode in enumerate(m.strip() for m in args.modes.split(",") if m.strip()):
+        print(f">>> {mode}: {args.burst} concurrent {args.route} requests, {args.latency_ms:.0f} ms upstream", flush=True)
+        results.append(run_mode(args, mode, i))
+
+    print()
+    baseline = next((r for r in results if r["worker_class"] == "sync"), None)
+    print(f"{'worker class':<14}{'capacity':>9}{'llm peak':>10}{'ok':>6}{'err':>5}{'wall s':>8}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'vs sync':>9}")
+    for r in results:
+        speedup = f"{baseline['wall_s'] / r['wall_s']:.1f}x" if baseline and r["wall_s"] else "-"
+        r["speedup_vs_sync"] = baseline["wall_s"] / r["wall_s"] if baseline and r["wall_s"] else None
+        print(
+            f"{r['worker_class']:<14}{r['configured_capacity']:>9}{(r['peak_llm_in_flight'] or 0):>10}{r['ok']:>6}{r['errors']:>5}"
+            f"{r['wall_s']:>8.1f}{r['throughput_rps']:>8.1f}{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}{speedup:>9}"
+        )
+        if r["first_error"]:
+            print(f"  first error: {r['first_error']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
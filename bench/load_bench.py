@@ -0,0 +1,353 @@
+# bench/load_bench.py
+"""End-to-end load benchmark against a local OpenAI stub.
+
+Starts bench/stub_openai.py in-process and the app under gunicorn (same
+config as the image, pointed at the stub), registers a bench user, then
+drives each route at each concurrency level and reports throughput,
+p50/p95/p99 latency, errors and worker saturation: the in-flight
+request gauge from /metrics, sampled during the run, against
+workers x threads.
+
+    python bench/load_bench.py --concurrency 1,8,32 --requests 64
+    python bench/load_bench.py --routes structure,terraform --latency-ms 1500 --tokens-per-sec 60
+    python bench/load_bench.py --target http://127.0.0.1:5001 --capacity 32   # already running app
+
+Generation requests use a unique description each, so they miss the LLM
+cache, and the LLM cache and near-duplicate index are off in the spawned app
+unless ``--cache``. The spawned app needs the usual DATABASE_URL / DB_*
+environment pointing at a reachable database.
+"""
+import argparse
+import http.cookiejar
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import stub_openai  # noqa: E402
+
+STRUCTURE = """terraform/
+├── main.tf
+├── variables.tf
+├── outputs.tf
+└── modules/
+    ├── networking/              # VPC, subnets, security groups
+    │   └── outputs.tf           # Networking outputs (subnet_id, vpc_id)
+    ├── compute/                 # Container cluster
+    │   └── outputs.tf           # Compute outputs (cluster_id)
+    └── database/                # Managed PostgreSQL
+        └── outputs.tf           # Database outputs (connection_string)
+"""
+FORM = {
+    "provider": "AWS",
+    "scale": "Medium (1k-100k/day)",
+    "loading_pressure": "Everyday",
+    "country": "Germany",
+}
+_seq = itertools.count()
+
+
+def _description() -> str:
+    return f"Load test project {next(_seq)}-{time.time_ns()}: a web shop with PostgreSQL, Redis and a CDN."
+
+
+def _generation(path: str, structure: bool = False):
+    def build():
+        data = dict(FORM, description=_description())
+        if structure:
+            data["structure"] = STRUCTURE
+        return "POST", path, data
+
+    return build
+
+
+ROUTES = {
+    "cost": _generation("/best_practices_cost"),
+    "performance": _generation("/best_practices_performance"),
+    "structure": _generation("/structure"),
+    "terraform": _generation("/terraform", structure=True),
+    "cli": _generation("/infra_cli", structure=True),
+    "history": lambda: ("GET", "/history?limit=20", None),
+    "export": lambda: ("GET", "/history/export?format=ndjson", None),
+}
+
+
+class Client:
+    def __init__(self, base: str):
+        self.base = base.rstrip("/")
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.first_error: str | None = None
+
+    def request(self, method: str, path: str, data: dict | None = None, timeout: float = 600) -> int:
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=timeout) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            detail = e.read()[:300].decode("utf-8", "replace")
+            self.first_error = self.first_error or f"{method} {path} -> {e.code}: {detail}"
+            return e.code
+        except OSError as e:
+            self.first_error = self.first_error or f"{method} {path} -> {e}"
+            return 0
+
+    def login(self) -> None:
+        creds = {"email": f"bench-{os.getpid()}-{time.time_ns()}@example.com", "password": "bench-password"}
+        self.request("POST", "/auth/register", creds)
+        self.request("POST", "/auth/login", creds)
+        if self.request("GET", "/history?limit=1") != 200:
+            sys.exit("could not log in the bench user")
+
+
+class SaturationSampler(threading.Thread):
+    """Samples http_requests_in_flight / llm_requests_in_flight from /metrics."""
+
+    _GAUGE = re.compile(r"^(http_requests_in_flight|llm_requests_in_flight)(\{[^}]*\})?\s+([0-9.eE+-]+)$", re.M)
+
+    def __init__(self, client: Client, interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.client = client
+        self.interval = interval
+        self.samples: list[tuple[float, float]] = []
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            try:
+                with urllib.request.urlopen(self.client.base + "/metrics", timeout=2) as r:
+                    text = r.read().decode()
+                values = {"http_requests_in_flight": 0.0, "llm_requests_in_flight": 0.0}
+                for name, _labels, value in self._GAUGE.findall(text):
+                    values[name] += float(value)
+                # The scrape itself is one of the in-flight requests.
+                self.samples.append((max(values["http_requests_in_flight"] - 1, 0), values["llm_requests_in_flight"]))
+            except OSError:
+                pass
+            self._done.wait(self.interval)
+
+    def stop(self) -> dict:
+        self._done.set()
+        self.join()
+        if not self.samples:
+            return {"http_in_flight_mean": None, "http_in_flight_max": None, "llm_in_flight_max": None}
+        http_vals = [s[0] for s in self.samples]
+        return {
+            "http_in_flight_mean": sum(http_vals) / len(http_vals),
+            "http_in_flight_max": max(http_vals),
+            "llm_in_flight_max": max(s[1] for s in self.samples),
+        }
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, max(int(round(p / 100 * len(values) + 0.5)) - 1, 0))]
+
+
+def run_level(client: Client, route: str, concurrency: int, requests: int, stub_url: str | None) -> dict:
+    build = ROUTES[route]
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def one(_):
+        method, path, data = build()
+        t0 = time.perf_counter()
+        status = client.request(method, path, data)
+        elapsed = (time.perf_counter() - t0) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses.append(status)
+
+    upstream_before = _stub_stats(stub_url)
+    sampler = SaturationSampler(client)
+    sampler.start()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - t0
+    saturation = sampler.stop()
+    upstream_after = _stub_stats(stub_url)
+
+    ok = sum(1 for s in statuses if 200 <= s < 300)
+    result = {
+        "route": route,
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": ok,
+        "errors": requests - ok,
+        "status_counts": {str(s): statuses.count(s) for s in sorted(set(statuses))},
+        "throughput_rps": requests / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        **saturation,
+    }
+    if upstream_before and upstream_after:
+        result["upstream_requests"] = upstream_after["requests"] - upstream_before["requests"]
+        result["upstream_peak_in_flight"] = upstream_after["peak_in_flight"]
+    return result
+
+
+def _stub_stats(stub_url: str | None) -> dict | None:
+    if not stub_url:
+        return None
+    try:
+        with urllib.request.urlopen(stub_url.rsplit("/v1", 1)[0] + "/stats", timeout=2) as r:
+            return json.loads(r.read())
+    except OSError:
+        return None
+
+
+def start_stub(args) -> tuple[str, object]:
+    stub_args = stub_openai.build_parser().parse_args([
+        "--port", str(args.stub_port),
+        "--latency-ms", str(args.latency_ms),
+        "--tokens-per-sec", str(args.tokens_per_sec),
+        "--completion-tokens", str(args.completion_tokens),
+        "--error-rate", str(args.error_rate),
+    ])
+    server = stub_openai.serve(stub_args)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{args.stub_port}/v1", server
+
+
+def app_capacity(args) -> int:
+    if args.worker_class == "sync":
+        return args.workers
+    per_worker = args.worker_connections if args.worker_class == "gevent" else args.threads
+    return args.workers * per_worker
+
+
+def start_app(args, stub_url: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        PORT=str(args.port),
+        OPENAI_BASE_URL=stub_url,
+        OPENAI_API_KEY="sk-stub",
+        OPENAI_MAX_RETRIES="0",
+        GUNICORN_WORKERS=str(args.workers),
+        GUNICORN_WORKER_CLASS=args.worker_class,
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_WORKER_CONNECTIONS=str(args.worker_connections),
+        PROMETHEUS_MULTIPROC_DIR=os.environ.get("PROMETHEUS_MULTIPROC_DIR", f"/tmp/load-bench-prom-{args.port}"),
+    )
+    if not args.cache:
+        env.update(LLM_CACHE_ENABLED="0", NEAR_DUP_ENABLED="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "Flask_App:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + args.boot_timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"gunicorn exited with {proc.returncode}; rerun with --verbose")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{args.port}/readyz", timeout=1) as r:
+                if r.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    sys.exit(f"app not ready after {args.boot_timeout}s")
+
+
+def print_table(results: list[dict], capacity: int | None) -> None:
+    head = f"{'route':<12}{'conc':>5}{'ok':>6}{'err':>5}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'busy':>7}{'max':>5}{'sat':>6}{'llm':>5}"
+    print(head)
+    print("-" * len(head))
+    for r in results:
+        mean = r["http_in_flight_mean"]
+        sat = f"{mean / capacity:>6.0%}" if capacity and mean is not None else f"{'-':>6}"
+        print(
+            f"{r['route']:<12}{r['concurrency']:>5}{r['ok']:>6}{r['errors']:>5}{r['throughput_rps']:>8.2f}"
+            f"{r['p50_ms']:>10.0f}{r['p95_ms']:>10.0f}{r['p99_ms']:>10.0f}"
+            f"{(mean if mean is not None else float('nan')):>7.1f}{(r['http_in_flight_max'] or 0):>5.0f}{sat}"
+            f"{(r['llm_in_flight_max'] or 0):>5.0f}"
+        )
+    print("busy/max = requests in flight (mean/peak); sat = busy / (workers x threads or connections); llm = peak upstream calls")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--routes", default=",".join(ROUTES), help=f"comma-separated: {', '.join(ROUTES)}")
+    ap.add_argument("--concurrency", default="1,4,16", help="comma-separated client concurrency levels")
+    ap.add_argument("--requests", type=int, default=32, help="requests per route and level")
+    ap.add_argument("--target", help="benchmark an already running app instead of spawning gunicorn")
+    ap.add_argument("--capacity", type=int, help="workers x threads of --target, for the saturation column")
+    ap.add_argument("--port", type=int, default=5077)
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--worker-class", default="gthread", choices=("gthread", "gevent"))
+    ap.add_argument("--worker-connections", type=int, default=1000, help="per gevent worker")
+    ap.add_argument("--stub-port", type=int, default=8089)
+    ap.add_argument("--stub-url", help="use a separately started stub (its /stats is read for upstream counts)")
+    ap.add_argument("--latency-ms", type=float, default=400)
+    ap.add_argument("--tokens-per-sec", type=float, default=200)
+    ap.add_argument("--completion-tokens", type=int, default=400)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--cache", action="store_true", help="keep the LLM cache and near-duplicate index on")
+    ap.add_argument("--boot-timeout", type=float, default=120)
+    ap.add_argument("--json", help="also write the results to this file")
+    ap.add_argument("--verbose", action="store_true", help="show gunicorn's stderr")
+    args = ap.parse_args()
+
+    routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = [r for r in routes if r not in ROUTES]
+    if unknown:
+        sys.exit(f"unknown route(s): {', '.join(unknown)}")
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    stub_server, proc = None, None
+    stub_url = args.stub_url
+    if args.target:
+        base, capacity = args.target, args.capacity
+    else:
+        if not stub_url:
+            stub_url, stub_server = start_stub(args)
+        proc = start_app(args, stub_url)
+        base, capacity = f"http://127.0.0.1:{args.port}", app_capacity(args)
+    try:
+        client = Client(base)
+        client.login()
+        # Seed a page of history so /history and the export have rows to read.
+        for _ in range(5):
+            method, path, data = ROUTES["cost"]()
+            client.request(method, path, data)
+        results = []
+        for route in routes:
+            for level in levels:
+                results.append(run_level(client, route, level, args.requests, stub_url))
+                r = results[-1]
+                print(f">>> {route} x{level}: {r['throughput_rps']:.2f} rps, p95 {r['p95_ms']:.0f} ms", flush=True)
+        print()
+        print_table(results, capacity)
+        if client.first_error:
+            print(f"first error: {client.first_error}")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"capacity": capacity, "stub": stub_url, "results": results}, f, indent=2)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if stub_server is not None:
+            stub_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
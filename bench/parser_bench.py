@@ -0,0 +1,223 @@
+# bench/parser_bench.py
+"""Throughput and allocations of the history export normalization.
+
+Builds a synthetic history (structure trees, multi-file Terraform, CLI
+scripts and plain answers, fenced and unfenced, some with text before the
+first file header) and runs it through ``result_parser`` and through the
+closures ``/history/export`` used before it (kept below as the baseline).
+Both must produce identical output. Each implementation is timed over
+several rounds; allocations are measured in a separate round under
+tracemalloc, so its overhead does not skew the timings.
+
+    python bench/parser_bench.py
+    python bench/parser_bench.py --docs 5000 --doc-kb 64 --rounds 7
+    python bench/parser_bench.py --json /tmp/parser.json
+
+Needs no database or network.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from result_parser import normalize_result, strip_code_fences  # noqa: E402
+
+WORDS = (
+    "resource variable output module provider subnet cluster database backup storage "
+    "monitoring identity policy registry cache replica region zone tags name id"
+).split()
+KINDS = ("structure", "terraform", "cli", "cost")
+
+
+# -- baseline: the closures from history_export() before result_parser ------
+
+def legacy_strip_code_fences(txt: str) -> str:
+    if not txt:
+        return ""
+    t = txt.strip()
+    if t.startswith("```"):
+        lines = t.splitlines()
+        core = []
+        open_seen = False
+        for i, line in enumerate(lines):
+            if i == 0 and line.strip().startswith("```"):
+                open_seen = True
+                continue
+            if open_seen and line.strip().startswith("```"):
+                break
+            core.append(line)
+        return "\n".join(core).strip()
+    return txt
+
+
+def legacy_normalize_result(item_type: str, raw: str, include_raw_flag: bool) -> dict:
+    plain = legacy_strip_code_fences(raw)
+    if (item_type or "").lower() == "structure":
+        out = {"format": "tree", "lines": [ln.rstrip() for ln in plain.splitlines()]}
+        if include_raw_flag:
+            out["raw"] = raw
+        return out
+    if (item_type or "").lower() == "terraform":
+        files = []
+        current = None
+        for ln in plain.splitlines():
+            m = re.match(r"^###\s*FILE:\s*(.+)$", ln.strip())
+            if m:
+                if current:
+                    while current["content"] and current["content"][-1].strip() == "":
+                        current["content"].pop()
+                    files.append(current)
+                current = {"path": m.group(1).strip(), "content": []}
+            else:
+                if current is None:
+                    current = {"path": "_root.tf", "content": []}
+                current["content"].append(ln.rstrip())
+        if current:
+            while current["content"] and current["content"][-1].strip() == "":
+                current["content"].pop()
+            files.append(current)
+        out = {"format": "terraform", "files": files}
+        if include_raw_flag:
+            out["raw"] = raw
+        return out
+    if (item_type or "").lower() == "cli":
+        lines = [ln.rstrip() for ln in plain.splitlines()]
+        shebang = lines[0] if (lines and lines[0].startswith("#!")) else None
+        if shebang:
+            lines = lines[1:]
+        out = {"format": "bash", "shebang": shebang, "lines": lines}
+        if include_raw_flag:
+            out["raw"] = raw
+        return out
+    return {"format": "text", "text": plain}
+
+
+# -- synthetic history --------------------------------------------------------
+
+def _line(rng: random.Random, indent: int = 0) -> str:
+    words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 10)))
+    return " " * indent + words + (" " if rng.random() < 0.1 else "")
+
+
+def _body(rng: random.Random, kind: str, size: int) -> str:
+    out: list[str] = []
+    length = 0
+    if kind == "cli":
+        out.append("#!/usr/bin/env bash")
+    if kind == "terraform" and rng.random() < 0.2:
+        out.append("Here are the files:")
+    n_file = 0
+    while length < size:
+        if kind == "terraform" and (n_file == 0 or rng.random() < 0.02):
+            out.append("")
+            out.append(f"### FILE: modules/m{n_file}/main.tf")
+            n_file += 1
+        elif kind == "structure":
+            out.append("│   " * rng.randint(0, 3) + "├── " + rng.choice(WORDS) + ".tf  # " + _line(rng))
+        else:
+            out.append(_line(rng, indent=rng.choice((0, 2, 4))) if rng.random() > 0.05 else "")
+        length += len(out[-1]) + 1
+    text = "\n".join(out)
+    if rng.random() < 0.5:
+        text = f"```{'hcl' if kind == 'terraform' else ''}\n{text}\n```\n" + ("trailing note\n" if rng.random() < 0.3 else "")
+    return text
+
+
+def build_history(docs: int, doc_kb: float, seed: int) -> list[tuple[str, str, str]]:
+    rng = random.Random(seed)
+    history = []
+    for i in range(docs):
+        kind = KINDS[i % len(KINDS)]
+        size = int(doc_kb * 1024 * rng.uniform(0.5, 1.5))
+        history.append((kind, f"```\nDescribe {kind} #{i}\n```", _body(rng, kind, size)))
+    return history
+
+
+# -- measurement ----------------------------------------------------------------
+
+def export_pass(history, strip, normalize, include_raw: bool) -> int:
+    items = 0
+    for kind, prompt, raw in history:
+        strip(prompt)
+        normalize(kind, raw, include_raw)
+        items += 1
+    return items
+
+
+def measure(name: str, history, strip, normalize, rounds: int, include_raw: bool) -> dict:
+    total_bytes = sum(len(raw) + len(prompt) for _, prompt, raw in history)
+    export_pass(history, strip, normalize, include_raw)  # warm-up
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        export_pass(history, strip, normalize, include_raw)
+        samples.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    export_pass(history, strip, normalize, include_raw)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best, median = min(samples), statistics.median(samples)
+    return {
+        "name": name,
+        "rounds": rounds,
+        "min_s": best,
+        "median_s": median,
+        "stddev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "docs_per_s": len(history) / median,
+        "mb_per_s": total_bytes / median / 1e6,
+        "peak_alloc_mb": peak / 1e6,
+    }
+
+
+def check_equivalence(history) -> None:
+    for kind, prompt, raw in history:
+        for include_raw in (False, True):
+            if normalize_result(kind, raw, include_raw) != legacy_normalize_result(kind, raw, include_raw):
+                sys.exit(f"normalize_result differs from the baseline for a {kind} document")
+        if strip_code_fences(prompt) != legacy_strip_code_fences(prompt):
+            sys.exit("strip_code_fences differs from the baseline")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=4000)
+    ap.add_argument("--doc-kb", type=float, default=16, help="average result size")
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--include-raw", action="store_true")
+    ap.add_argument("--json", help="also write the results to this file")
+    args = ap.parse_args()
+
+    history = build_history(args.docs, args.doc_kb, args.seed)
+    mb = sum(len(raw) for _, _, raw in history) / 1e6
+    print(f">>> {len(history)} documents, {mb:.1f} MB of results")
+    check_equivalence(history)
+    print(">>> output identical to the baseline")
+
+    results = [
+        measure("baseline", history, legacy_strip_code_fences, legacy_normalize_result, args.rounds, args.include_raw),
+        measure("result_parser", history, strip_code_fences, normalize_result, args.rounds, args.include_raw),
+    ]
+    for r in results:
+        print(
+            f"{r['name']:<15} median={r['median_s'] * 1000:8.1f} ms  min={r['min_s'] * 1000:8.1f} ms  "
+            f"{r['docs_per_s']:9.0f} docs/s  {r['mb_per_s']:7.1f} MB/s  peak={r['peak_alloc_mb']:7.1f} MB"
+        )
+    print(f"speedup: {results[0]['median_s'] / results[1]['median_s']:.2f}x")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"docs": len(history), "results_mb": mb, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# bench/render_bench.py
+"""Render latency of index() and history_page(), per APP_ENV.
+
+Each mode runs in a fresh interpreter. A throwaway user is registered and
+logged in, then both pages are requested through the test client; the
+render-only figure times ``render_template`` inside a request context. The
+lookup figure is the per-render template fetch (an mtime check per render in
+development) and cold load is what a newly started worker pays per template:
+a full compile, or loading bytecode persisted by another process.
+
+    python bench/render_bench.py --iterations 500
+    python bench/render_bench.py --modes development,production
+
+Needs the usual DATABASE_URL / DB_* environment pointing at a reachable DB.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, statistics, sys, time, uuid
+import Flask_App
+from flask import render_template
+from flask_login import login_user
+
+n = int(sys.argv[1])
+app = Flask_App.app
+client = app.test_client()
+email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+client.post("/auth/register", data={"email": email, "password": "bench"})
+client.post("/auth/login", data={"email": email, "password": "bench"})
+
+def run(fn):
+    fn()
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    samples.sort()
+    return {"median_us": statistics.median(samples), "p95_us": samples[int(0.95 * (len(samples) - 1))]}
+
+with Flask_App.Session(Flask_App.engine) as s:
+    user = s.query(Flask_App.User).filter_by(email=email).one()
+
+def render(name, **context):
+    def fn():
+        with app.test_request_context("/"):
+            login_user(user)
+            render_template(name, **context)
+    return fn
+
+index_context = {
+    "providers": Flask_App.providers,
+    "scales": Flask_App.scales,
+    "loading_pressure": Flask_App.loading_pressure,
+}
+
+def cold_load(name):
+    # What a freshly started worker pays: compile (or load cached bytecode).
+    def fn():
+        app.jinja_env.cache.clear()
+        app.jinja_env.get_template(name)
+    return fn
+
+out = {
+    "GET /": run(lambda: client.get("/")),
+    "GET /history_page": run(lambda: client.get("/history_page")),
+    "render i.html": run(render("i.html", **index_context)),
+    "render history.html": run(render("history.html")),
+    "lookup i.html": run(lambda: app.jinja_env.get_template("i.html")),
+    "cold load i.html": run(cold_load("i.html")),
+}
+print("BENCH " + json.dumps(out))
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--iterations", type=int, default=300)
+    ap.add_argument("--modes", default="development,production", help="comma-separated APP_ENV values")
+    args = ap.parse_args()
+
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        env = dict(os.environ, APP_ENV=mode, DB_INIT_MODE=os.environ.get("DB_INIT_MODE", "skip"))
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE, str(args.iterations)],
+            cwd=ROOT, env=env, capture_output=True, text=True,
+        )
+        if out.returncode:
+            sys.exit(out.stderr)
+        line = next(l for l in out.stdout.splitlines() if l.startswith("BENCH "))
+        for name, r in json.loads(line[len("BENCH "):]).items():
+            print(f"{mode:<12} {name:<22} median={r['median_us']:9.1f} us  p95={r['p95_us']:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# bench/startup_bench.py
+"""Import-to-ready time for Flask_App, per DB_INIT_MODE.
+
+Each run starts a fresh interpreter, imports the app and polls /readyz through
+the test client until it answers 200, so the figure is what a new gunicorn
+worker (or a pod without preload) pays before it can serve traffic.
+
+    python bench/startup_bench.py --runs 5
+    python bench/startup_bench.py --modes skip --runs 20
+    python bench/startup_bench.py --gunicorn   # whole server: spawn -> /readyz 200
+
+Needs the usual DATABASE_URL / DB_* environment pointing at a reachable DB.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import Flask_App
+t1 = time.perf_counter()
+client = Flask_App.app.test_client()
+while client.get("/readyz").status_code != 200:
+    time.sleep(0.01)
+t2 = time.perf_counter()
+print("BENCH " + json.dumps({"import_ms": (t1 - t0) * 1000, "ready_ms": (t2 - t0) * 1000}))
+"""
+
+
+def run_probe(mode: str) -> dict:
+    env = dict(os.environ, DB_INIT_MODE=mode)
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if out.returncode:
+        sys.exit(out.stderr)
+    line = next(l for l in out.stdout.splitlines() if l.startswith("BENCH "))
+    return json.loads(line[len("BENCH "):])
+
+
+def run_gunicorn(port: int, timeout: float) -> float:
+    env = dict(os.environ, PORT=str(port))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "Flask_App:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=1) as r:
+                    if r.status == 200:
+                        return (time.perf_counter() - t0) * 1000
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError(f"gunicorn not ready after {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def summarize(name: str, values: list[float]) -> str:
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))]
+    return f"{name:<22} median={statistics.median(values):8.1f} ms  p95={p95:8.1f} ms  max={values[-1]:8.1f} ms"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--modes", default="import,skip", help="comma-separated DB_INIT_MODE values")
+    ap.add_argument("--gunicorn", action="store_true", help="also time a full gunicorn boot")
+    ap.add_argument("--port", type=int, default=5055)
+    ap.add_argument("--timeout", type=float, default=120)
+    args = ap.parse_args()
+
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        samples = [run_probe(mode) for _ in range(args.runs)]
+        print(summarize(f"{mode}: import", [s["import_ms"] for s in samples]))
+        print(summarize(f"{mode}: import->ready", [s["ready_ms"] for s in samples]))
+    if args.gunicorn:
+        boots = [run_gunicorn(args.port, args.timeout) for _ in range(args.runs)]
+        print(summarize("gunicorn: spawn->ready", boots))
+
+
+if __name__ == "__main__":
+    main()
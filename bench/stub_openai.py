@@ -0,0 +1,230 @@
+# bench/stub_openai.py
+"""Local stand-in for the OpenAI chat completions API, for load tests.
+
+Point the app at it with ``OPENAI_BASE_URL=http://127.0.0.1:8089/v1`` and
+any ``OPENAI_API_KEY``. It answers ``POST /v1/chat/completions`` with or
+without ``stream=true`` (including the ``include_usage`` chunk), so no real
+tokens or network are spent. Answers look like the real ones closely enough
+for the app's post-processing (``### FILE:`` sections for Terraform, a
+shebang for the CLI script).
+
+    python bench/stub_openai.py --port 8089 --latency-ms 400 --tokens-per-sec 80
+    python bench/stub_openai.py --error-rate 0.05 --error-status 429
+
+``GET /stats`` returns request counts and the peak number of concurrent
+requests, which shows how much upstream concurrency the app generated.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "resource module variable output network subnet cluster database backup monitoring alert "
+    "identity policy storage bucket registry cache replica autoscaling encryption region zone"
+).split()
+
+
+class StubConfig:
+    def __init__(self, args):
+        self.latency = args.latency_ms / 1000
+        self.jitter = args.jitter_ms / 1000
+        self.tokens_per_sec = args.tokens_per_sec
+        self.completion_tokens = args.completion_tokens
+        self.chunk_tokens = args.chunk_tokens
+        self.error_rate = args.error_rate
+        self.error_status = args.error_status
+        self.stall_rate = args.stall_rate
+        self.stall_seconds = args.stall_seconds
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.streamed = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completion_tokens = 0
+
+    def enter(self, stream: bool) -> None:
+        with self.lock:
+            self.requests += 1
+            self.streamed += int(stream)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def leave(self, tokens: int = 0, error: bool = False) -> None:
+        with self.lock:
+            self.in_flight -= 1
+            self.completion_tokens += tokens
+            self.errors += int(error)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {k: v for k, v in vars(self).items() if k != "lock"}
+
+
+def fake_answer(messages: list, n_tokens: int) -> list[str]:
+    """Deterministic per prompt, shaped like the real answer; returns token-ish pieces."""
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    prompt = "\n".join(m.get("content", "") for m in messages if m.get("role") == "user")
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    pieces: list[str] = []
+    if "Terraform" in system or "Infrastructure as Code" in system:
+        files = ["main.tf", "variables.tf", "outputs.tf"]
+        per_file = max(n_tokens // len(files), 8)
+        for name in files:
+            pieces.append(f"### FILE: {name}\n")
+            pieces.extend(f"{rng.choice(WORDS)} " for _ in range(per_file))
+            pieces.append("\n\n")
+        return pieces
+    if "Bash" in system:
+        pieces.append("#!/usr/bin/env bash\n")
+    pieces.extend(f"{rng.choice(WORDS)}{' ' if i % 12 else chr(10)}" for i in range(1, n_tokens))
+    return pieces
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: StubConfig
+    stats: Stats
+
+    def log_message(self, fmt, *args):  # keep load runs quiet
+        pass
+
+    def _json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            return self._json(200, self.stats.snapshot())
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            return self._json(200, {"object": "list", "data": [{"id": "gpt-4o", "object": "model"}]})
+        self._json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            return self._json(404, {"error": {"message": "not found"}})
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        stream = bool(body.get("stream"))
+        cfg = self.config
+        self.stats.enter(stream)
+        tokens = 0
+        try:
+            time.sleep(max(cfg.latency + random.uniform(-cfg.jitter, cfg.jitter), 0))
+            if random.random() < cfg.error_rate:
+                self.stats.leave(error=True)
+                tokens = None
+                return self._json(
+                    cfg.error_status,
+                    {"error": {"message": "injected failure", "type": "stub_error", "code": cfg.error_status}},
+                )
+            if random.random() < cfg.stall_rate:
+                time.sleep(cfg.stall_seconds)
+            n_tokens = min(cfg.completion_tokens, int(body.get("max_tokens") or cfg.completion_tokens))
+            pieces = fake_answer(body.get("messages") or [], n_tokens)
+            tokens = len(pieces)
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages") or []) // 4
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": tokens, "total_tokens": prompt_tokens + tokens}
+            if stream:
+                self._stream(body, pieces, usage)
+            else:
+                if cfg.tokens_per_sec:
+                    time.sleep(tokens / cfg.tokens_per_sec)
+                self._json(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "gpt-4o"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(pieces)},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                })
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            if tokens is not None:
+                self.stats.leave(tokens)
+
+    def _stream(self, body: dict, pieces: list[str], usage: dict) -> None:
+        cfg = self.config
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+        }
+
+        def send(payload) -> None:
+            data = f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        send({**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]})
+        step = max(cfg.chunk_tokens, 1)
+        for i in range(0, len(pieces), step):
+            if cfg.tokens_per_sec:
+                time.sleep(step / cfg.tokens_per_sec)
+            delta = "".join(pieces[i:i + step])
+            send({**base, "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]})
+        send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            send({**base, "choices": [], "usage": usage})
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency-ms", type=float, default=400, help="time before the first token")
+    ap.add_argument("--jitter-ms", type=float, default=100)
+    ap.add_argument("--tokens-per-sec", type=float, default=80, help="generation speed; 0 = instant")
+    ap.add_argument("--completion-tokens", type=int, default=600, help="answer length (capped by max_tokens)")
+    ap.add_argument("--chunk-tokens", type=int, default=4, help="tokens per streamed chunk")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    ap.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures (e.g. 429)")
+    ap.add_argument("--stall-rate", type=float, default=0.0, help="fraction of requests that stall")
+    ap.add_argument("--stall-seconds", type=float, default=30)
+    return ap
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default backlog of 5 drops connection bursts from load tests
+
+
+def serve(args) -> ThreadingHTTPServer:
+    handler = type("StubHandler", (Handler,), {"config": StubConfig(args), "stats": Stats()})
+    return StubServer((args.host, args.port), handler)
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    server = serve(args)
+    print(f">>> OpenAI stub on http://{args.host}:{args.port}/v1 (latency={args.latency_ms}ms, "
+          f"{args.tokens_per_sec} tok/s, errors={args.error_rate:.0%})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
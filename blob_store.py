@@ -0,0 +1,73 @@
+# blob_store.py
+"""Content-addressed, compressed storage for generated documents.
+
+Results are keyed by the SHA-256 of their text, so identical outputs (cache
+hits, regenerated structures) are stored once. Payloads are compressed with
+zstd when ``zstandard`` is installed and with zlib otherwise; the codec is
+recorded per blob so both can be read back.
+"""
+import hashlib
+import threading
+import zlib
+
+from sqlalchemy import select
+
+try:
+    import zstandard
+except ImportError:  # optional dependency; zlib is always available
+    zstandard = None
+
+DEFAULT_CODEC = "zstd" if zstandard is not None else "zlib"
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+
+# zstd (de)compressor objects are not thread-safe but are worth reusing.
+_local = threading.local()
+
+
+def content_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress(text: str, codec: str = DEFAULT_CODEC) -> tuple[str, bytes]:
+    raw = text.encode("utf-8")
+    if codec == "zstd":
+        cctx = getattr(_local, "cctx", None)
+        if cctx is None:
+            cctx = _local.cctx = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        return "zstd", cctx.compress(raw)
+    return "zlib", zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed results")
+        dctx = getattr(_local, "dctx", None)
+        if dctx is None:
+            dctx = _local.dctx = zstandard.ZstdDecompressor()
+        return dctx.decompress(data).decode("utf-8")
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown blob codec: {codec}")
+
+
+def put_blob(session, model, text: str) -> str:
+    """Store ``text`` in ``model``'s table unless already present; return its digest.
+
+    Runs inside the caller's transaction so the blob and the row referencing it
+    commit together.
+    """
+    digest = content_digest(text)
+    if session.scalar(select(model.digest).where(model.digest == digest)) is not None:
+        return digest
+    codec, data = compress(text)
+    values = {"digest": digest, "codec": codec, "size": len(text.encode("utf-8")), "data": data}
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+
+        session.execute(insert(model).values(**values).on_conflict_do_nothing(index_elements=["digest"]))
+    else:
+        session.add(model(**values))
+        session.flush()
+    return digest
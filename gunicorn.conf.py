@@ -0,0 +1,100 @@
+# gunicorn.conf.py
+"""Gunicorn settings for the container image.
+
+The app is imported once in the master (``preload_app``) so schema setup in
+``Flask_App`` runs a single time before the workers fork, and each worker
+starts from an already-imported module instead of repeating it. Connections
+opened in the master must not be shared across the fork, hence ``post_fork``.
+
+Prometheus metrics run in multiprocess mode; the sample directory is reset
+here, before the app (and prometheus_client) is imported.
+
+``GUNICORN_WORKER_CLASS=gevent`` runs each worker as an event loop instead of
+a fixed set of threads: a request waiting on OpenAI is a parked greenlet, so
+one worker holds up to ``GUNICORN_WORKER_CONNECTIONS`` requests. The standard
+library is patched here, before the app is preloaded, so every socket, lock,
+sleep and thread pool the app creates is cooperative; psycopg2 (a C driver the
+patch cannot reach) waits on the patched ``select`` via a wait callback. The
+per-worker limits sized for threads (OpenAI connection pool, /plan and module
+pools) get larger defaults unless they are set explicitly.
+
+The DB pool does not grow with the greenlets: a request only holds a
+connection for a few short queries, so greenlets queue for one (up to
+``DB_POOL_TIMEOUT``) instead. Every worker of every replica has its own pool,
+so workers x replicas x (``DB_POOL_SIZE`` + ``DB_MAX_OVERFLOW``) must stay
+under Postgres ``max_connections`` (100 in k8s_solution/db-deploy.yml; 4
+workers x 2 replicas x 10 = 80 with the gevent defaults).
+"""
+import os
+import shutil
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get("GUNICORN_WORKERS", "4"))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "1000"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+preload_app = True
+accesslog = "-"
+errorlog = "-"
+
+if worker_class == "gevent":
+    from gevent import monkey
+
+    try:
+        # The HTTP stack imports trio when it is installed, and trio reads
+        # select.epoll at import time, which the patch removes.
+        import trio  # noqa: F401
+    except ImportError:
+        pass
+    monkey.patch_all()
+
+    import psycopg2.extensions
+    import psycopg2.extras
+
+    psycopg2.extensions.set_wait_callback(psycopg2.extras.wait_select)
+
+    for name, value in {
+        "OPENAI_MAX_CONNECTIONS": worker_connections,
+        "OPENAI_MAX_KEEPALIVE_CONNECTIONS": 128,
+        "DB_POOL_SIZE": 10,
+        "DB_MAX_OVERFLOW": 0,
+        "PLAN_WORKERS": 256,
+        "TERRAFORM_MODULE_CONCURRENCY": 64,
+    }.items():
+        os.environ.setdefault(name, str(value))
+
+
+def when_ready(server):
+    # llm_client imports the OpenAI SDK lazily; pull it in here, after the
+    # app is preloaded and before any worker forks, so workers inherit it.
+    import openai  # noqa: F401
+
+
+def post_fork(server, worker):
+    import Flask_App
+
+    # Drop pooled connections inherited from the master without closing them
+    # on the master's behalf; each worker opens its own.
+    Flask_App.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    import Flask_App
+
+    # Jobs cannot outlive their worker; fail them now rather than letting
+    # them look "running" until JOB_STALE_SECONDS.
+    Flask_App.shutdown_jobs()
+    # Flush History rows still waiting in the write-behind queue.
+    Flask_App.history_writer.close()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    # Drop the dead worker's live gauges (in-flight counts) from the scrape.
+    multiprocess.mark_process_dead(worker.pid)
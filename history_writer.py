@@ -0,0 +1,129 @@
+# history_writer.py
+"""Write-behind queue for rows the response does not have to wait for.
+
+``submit`` hands a record to a background thread, which passes batches to
+``write_batch`` in one transaction each: up to ``max_batch`` records, or
+whatever arrived within ``flush_interval`` seconds. When the queue is full
+(``max_pending``), ``submit`` returns False and the caller should write
+synchronously instead, so back-pressure never drops a record.
+
+A failed batch is retried one record at a time, so one bad row does not
+take the rest down with it. Records that still fail are logged. For metrics,
+``report(outcome, n)``, if given, is called with ``"written"``, ``"retried"``,
+``"failed"`` or ``"rejected"``, and ``depth(n)`` with the number of queued
+records after every submit and flush; a growing depth means the database is
+not keeping up. ``close`` drains the queue. It runs at interpreter exit and
+from gunicorn's ``worker_exit`` hook.
+
+The thread starts on first use, so a module imported in the gunicorn master
+(``preload_app``) gets a fresh thread in each forked worker.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+
+class WriteBehindQueue:
+    def __init__(self, write_batch, max_batch: int = 50, flush_interval: float = 0.5, max_pending: int = 1000,
+                 name: str = "write-behind", report=None, depth=None):
+        self.write_batch = write_batch
+        self.report = report
+        self.depth = depth
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.name = name
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def _count(self, outcome: str, n: int = 1) -> None:
+        if self.report is not None:
+            self.report(outcome, n)
+
+    def _report_depth(self) -> None:
+        if self.depth is not None:
+            self.depth(self._queue.qsize())
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_pending)  # don't inherit the parent's backlog
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, record) -> bool:
+        """Queue ``record`` for writing; False if the caller must write it itself."""
+        if self._closed:
+            self._count("rejected")
+            return False
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._count("rejected")
+            return False
+        self._report_depth()
+        return True
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            self._report_depth()
+            if stop:
+                return
+
+    def _flush(self, batch: list) -> None:
+        try:
+            self.write_batch(batch)
+            self._count("written", len(batch))
+            return
+        except Exception as e:
+            print(f">>> WARN: {self.name} batch of {len(batch)} failed, retrying one by one: {e}")
+        self._count("retried", len(batch))
+        for record in batch:
+            try:
+                self.write_batch([record])
+                self._count("written")
+            except Exception as e:
+                print(f">>> ERROR: {self.name} dropped a record after retry: {e}")
+                self._count("failed")
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop accepting records and flush everything already queued."""
+        self._closed = True
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            print(f">>> WARN: {self.name} could not signal shutdown; {self._queue.qsize()} records unflushed")
+            return
+        thread.join(timeout)
+        if thread.is_alive():
+            print(f">>> WARN: {self.name} did not finish flushing within {timeout}s")
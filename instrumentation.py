@@ -0,0 +1,238 @@
+# instrumentation.py
+"""Sampled per-request timing, emitted as one JSON record per request.
+
+A sampled request carries a ``RequestTrace`` in a context variable. The app,
+SQLAlchemy and Jinja hooks add elapsed time to named phases on it:
+
+- ``routing``: from WSGI entry until the view's ``before_request`` runs
+  (URL matching, session and user loading)
+- ``db``: cursor execution time, plus the number of queries
+- ``template``: Jinja rendering
+- ``llm``: upstream model calls, which the app reports via ``timed``/``add``
+
+The record is written to the ``devops_advisor.requests`` logger when the
+response body is closed, so streamed responses include their full duration.
+Work a request hands to a thread pool records into the same trace when it is
+submitted through ``propagate`` (or with its own ``contextvars`` copy); work
+that outlives the request, such as an async job, gets a record of its own via
+``Instrumentation.background``.
+Requests slower than ``slow_ms`` are always logged, with total time only when
+they were not sampled. With sampling off and no slow threshold, nothing is
+installed and the hot path is untouched.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+from werkzeug.wsgi import ClosingIterator
+
+logger = logging.getLogger("devops_advisor.requests")
+
+_current: contextvars.ContextVar["RequestTrace | None"] = contextvars.ContextVar("request_trace", default=None)
+_NULL = nullcontext()
+
+
+class RequestTrace:
+    __slots__ = ("start", "phases", "counts", "route", "_marks", "_lock")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.route = None
+        self._marks: dict[str, float] = {}
+        self._lock = threading.Lock()  # pool threads of one request add concurrently
+
+    def add(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+
+
+class _Timer:
+    __slots__ = ("trace", "phase", "t0")
+
+    def __init__(self, trace: RequestTrace, phase: str):
+        self.trace = trace
+        self.phase = phase
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.phase, time.perf_counter() - self.t0)
+        return False
+
+
+def timed(phase: str):
+    """Context manager adding its duration to ``phase`` on the current trace (if any)."""
+    trace = _current.get()
+    return _Timer(trace, phase) if trace is not None else _NULL
+
+
+def add(phase: str, seconds: float) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.add(phase, seconds)
+
+
+def propagate(fn):
+    """``fn`` bound to a copy of the current context, for ``executor.submit``.
+
+    Pool threads do not inherit context variables; call this once per submit
+    (a context cannot be entered by two threads at once).
+    """
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+class Instrumentation:
+    def __init__(self, sample_rate: float = 0.0, slow_ms: float = 0.0):
+        self.sample_rate = max(0.0, min(sample_rate, 1.0))
+        self.slow_ms = max(slow_ms, 0.0)
+
+    @classmethod
+    def from_env(cls) -> "Instrumentation":
+        return cls(
+            sample_rate=float(os.environ.get("REQUEST_TRACE_SAMPLE_RATE", "0") or 0),
+            slow_ms=float(os.environ.get("REQUEST_TRACE_SLOW_MS", "0") or 0),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.slow_ms > 0
+
+    def init_app(self, app, engine=None) -> None:
+        if not self.enabled:
+            return
+        if not logger.handlers:
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        app.wsgi_app = self._wrap_wsgi(app.wsgi_app)
+        app.before_request_funcs.setdefault(None, []).insert(0, self._before_request)
+        self._connect_templates(app)
+        if engine is not None:
+            self._connect_engine(engine)
+
+    @contextmanager
+    def background(self, name: str, detail: str | None = None):
+        """Trace a unit of work that outlives its request (an async job) as its own record."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        trace = RequestTrace() if sampled else None
+        if trace is not None:
+            trace.route = detail
+        token = _current.set(trace)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+            self._log({"task": name}, start, trace)
+
+    # -- hooks -------------------------------------------------------------
+
+    def _wrap_wsgi(self, wsgi_app):
+        def instrumented(environ, start_response):
+            start = time.perf_counter()
+            sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+            trace = RequestTrace() if sampled else None
+            _current.set(trace)
+            status = []
+
+            def _start_response(s, headers, exc_info=None):
+                status.append(s)
+                return start_response(s, headers, exc_info)
+
+            app_iter = wsgi_app(environ, _start_response)
+            return ClosingIterator(app_iter, lambda: self._finish(environ, status, start, trace))
+
+        return instrumented
+
+    @staticmethod
+    def _before_request():
+        trace = _current.get()
+        if trace is not None:
+            from flask import request
+
+            trace.route = request.url_rule.rule if request.url_rule is not None else None
+            trace.phases["routing"] = time.perf_counter() - trace.start
+
+    def _connect_templates(self, app) -> None:
+        from flask import before_render_template, template_rendered
+
+        def _before(sender, template, context, **extra):
+            trace = _current.get()
+            if trace is not None:
+                trace._marks["template"] = time.perf_counter()
+
+        def _after(sender, template, context, **extra):
+            trace = _current.get()
+            if trace is not None and "template" in trace._marks:
+                trace.add("template", time.perf_counter() - trace._marks.pop("template"))
+
+        before_render_template.connect(_before, app, weak=False)
+        template_rendered.connect(_after, app, weak=False)
+
+    @staticmethod
+    def _connect_engine(engine) -> None:
+        from sqlalchemy import event
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            if _current.get() is not None and context is not None:
+                context._trace_t0 = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            t0 = getattr(context, "_trace_t0", None)
+            trace = _current.get()
+            if t0 is not None and trace is not None:
+                trace.add("db", time.perf_counter() - t0)
+
+    def _finish(self, environ, status, start, trace) -> None:
+        _current.set(None)
+        self._log(
+            {
+                "method": environ.get("REQUEST_METHOD"),
+                "path": environ.get("PATH_INFO"),
+                "status": int(status[0].split(" ", 1)[0]) if status else None,
+            },
+            start,
+            trace,
+        )
+
+    def _log(self, fields: dict, start: float, trace) -> None:
+        total_ms = (time.perf_counter() - start) * 1000
+        slow = self.slow_ms > 0 and total_ms >= self.slow_ms
+        if trace is None and not slow:
+            return
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "pid": os.getpid(),
+            **fields,
+            "total_ms": round(total_ms, 2),
+            "sampled": trace is not None,
+            "slow": slow,
+        }
+        if trace is not None:
+            record["route"] = trace.route
+            for phase, seconds in trace.phases.items():
+                record[f"{phase}_ms"] = round(seconds * 1000, 2)
+            for phase in ("db", "llm"):
+                if phase in trace.counts:
+                    record[f"{phase}_calls"] = trace.counts[phase]
+        logger.info(json.dumps(record, separators=(",", ":")))
@@ -0,0 +1,106 @@
+# jobs.py
+"""Bounded in-process worker pool for long-running generation jobs.
+
+Job *state* lives in the ``generation_jobs`` table so any gunicorn worker can
+answer a poll; this module only owns execution. Cancellation is cooperative:
+the job function receives a ``threading.Event`` it should check between
+chunks of work.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+TERMINAL_STATES = ("succeeded", "failed", "cancelled")
+
+
+class JobRunner:
+    """Run ``fn(job_id, cancel_event, *args)`` on a fixed-size thread pool.
+
+    At most ``max_workers`` jobs run at once and at most ``max_pending`` more
+    wait in the queue; ``submit`` returns False instead of queueing beyond that.
+    ``report(stats)``, if given, is called with ``stats()`` whenever the
+    running or queued count changes.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 32, report=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.report = report
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="genjob")
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+        self._events: dict[str, threading.Event] = {}
+        self._futures = {}
+        self._running = 0
+
+    def submit(self, job_id: str, fn, *args) -> bool:
+        if not self._slots.acquire(blocking=False):
+            return False
+        event = threading.Event()
+        with self._lock:
+            self._events[job_id] = event
+            future = self._executor.submit(self._run, job_id, event, fn, *args)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda _f: self._release(job_id))
+        self._report()
+        return True
+
+    def _run(self, job_id: str, event: threading.Event, fn, *args) -> None:
+        with self._lock:
+            self._running += 1
+        self._report()
+        try:
+            fn(job_id, event, *args)
+        except Exception as e:
+            print(f">>> ERROR: job {job_id} crashed: {e}")
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _release(self, job_id: str) -> None:
+        with self._lock:
+            self._events.pop(job_id, None)
+            self._futures.pop(job_id, None)
+        self._slots.release()
+        self._report()
+
+    def _report(self) -> None:
+        if self.report is not None:
+            self.report(self.stats())
+
+    def cancel(self, job_id: str) -> bool:
+        """Signal a job owned by this process. Returns False if it is not here."""
+        with self._lock:
+            event = self._events.get(job_id)
+            future = self._futures.get(job_id)
+        if event is None:
+            return False
+        event.set()
+        if future is not None:
+            future.cancel()
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            tracked = len(self._futures)
+            running = self._running
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "running": running,
+            "queued": max(tracked - running, 0),
+        }
+
+    def shutdown(self, wait: bool = False) -> list[str]:
+        """Signal every job to stop and drop queued ones; returns the ids that were still tracked.
+
+        The caller should record those jobs as failed: their owner is going
+        away, and nothing else would finish them.
+        """
+        with self._lock:
+            job_ids = list(self._events)
+            events = list(self._events.values())
+        for event in events:
+            event.set()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        return job_ids
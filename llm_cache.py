@@ -0,0 +1,293 @@
+# llm_cache.py
+"""Two-tier response cache for the LLM generation endpoints.
+
+Tier 1 is an in-process LRU bounded by entry count, total bytes and a TTL.
+Tier 2 is a table in Postgres shared by every gunicorn worker and pod, so an
+answer paid for once is reused everywhere. Keys are derived from the
+normalized request fields plus the prompt version and model.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+
+@dataclass
+class CachedAnswer:
+    value: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: int = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.value.encode("utf-8"))
+
+
+# Free text and form choices, where case carries no meaning. Every other field
+# (``structure``, module names, tree lines) ends up in file paths, so its case
+# is kept.
+CASE_FOLDED_FIELDS = frozenset(("description", "provider", "scale", "loading", "country", "sentences"))
+
+
+def normalize_field(value, name: str | None = None) -> str:
+    """Normalize a key field so trivial edits share a key.
+
+    Case-folded fields collapse all whitespace. Multi-line values keep their
+    case and indentation (a tree's depth) and only drop trailing spaces and
+    blank lines.
+    """
+    text = str(value or "")
+    if name in CASE_FOLDED_FIELDS:
+        return " ".join(text.split()).lower()
+    if "\n" in text:
+        return "\n".join(line.rstrip() for line in text.splitlines() if line.strip())
+    return " ".join(text.split())
+
+
+def make_cache_key(item_type: str, model: str, prompt_version, fields: dict) -> str:
+    payload = {
+        "type": item_type,
+        "model": model,
+        "prompt_version": str(prompt_version),
+        "fields": {k: normalize_field(v, k) for k, v in sorted(fields.items())},
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUTTLCache:
+    """Thread-safe LRU with a TTL and a total byte budget."""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.evictions = 0
+        self._data: "OrderedDict[str, tuple[float, int, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, _size, value = item
+            if expires_at < time.monotonic():
+                self._drop(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl, size, value)
+            self.bytes += size
+            while self._data and (len(self._data) > self.max_entries or self.bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def _drop(self, key: str) -> None:
+        _expires_at, size, _value = self._data.pop(key)
+        self.bytes -= size
+
+
+class PostgresCacheTier:
+    """Shared tier stored in the ``llm_cache`` table (see ``LLMCacheEntry``).
+
+    Expired rows are deleted by ``purge_expired``, which ``set`` runs at most
+    once per ``purge_interval`` seconds per process (0 disables it).
+    """
+
+    def __init__(self, engine, model, ttl: float = 86400, purge_interval: float = 3600):
+        self.engine = engine
+        self.model = model
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._purge_lock = threading.Lock()
+
+    def get(self, key: str, newer_than: datetime | None = None):
+        with Session(self.engine) as s:
+            row = s.get(self.model, key)
+            if row is None or row.expires_at < datetime.utcnow():
+                return None
+            if newer_than is not None and row.created_at < newer_than:
+                return None
+            return CachedAnswer(
+                value=row.value,
+                prompt_tokens=row.prompt_tokens or 0,
+                completion_tokens=row.completion_tokens or 0,
+                latency_ms=row.latency_ms or 0,
+            )
+
+    def set(self, key: str, answer: CachedAnswer, **meta) -> None:
+        now = datetime.utcnow()
+        values = {
+            "key": key,
+            "value": answer.value,
+            "prompt_tokens": answer.prompt_tokens,
+            "completion_tokens": answer.completion_tokens,
+            "latency_ms": answer.latency_ms,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=self.ttl),
+            **meta,
+        }
+        with Session(self.engine) as s:
+            if self.engine.dialect.name == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+
+                stmt = insert(self.model).values(**values)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["key"],
+                    set_={k: stmt.excluded[k] for k in values if k != "key"},
+                )
+                s.execute(stmt)
+            else:
+                s.merge(self.model(**values))
+            s.commit()
+        self._maybe_purge()
+
+    def _maybe_purge(self) -> None:
+        if not self.purge_interval or time.monotonic() < self._next_purge:
+            return
+        if not self._purge_lock.acquire(blocking=False):
+            return  # another thread of this process is purging
+        try:
+            self._next_purge = time.monotonic() + self.purge_interval
+            n = self.purge_expired()
+            if n:
+                print(f">>> LLM cache: purged {n} expired shared entries")
+        except Exception as e:
+            print(">>> WARN: LLM cache purge failed:", e)
+        finally:
+            self._purge_lock.release()
+
+    def purge_expired(self) -> int:
+        with Session(self.engine) as s:
+            n = (
+                s.query(self.model)
+                .filter(self.model.expires_at < datetime.utcnow())
+                .delete(synchronize_session=False)
+            )
+            s.commit()
+            return n
+
+
+class TwoTierCache:
+    """L1 (process-local) in front of an optional shared L2, with counters.
+
+    The counters are per process. ``report(counter, n)``, if given, is called
+    with every increment so the app can aggregate them across workers.
+    """
+
+    def __init__(self, l1: LRUTTLCache, l2: PostgresCacheTier | None = None, enabled: bool = True, report=None):
+        self.l1 = l1
+        self.l2 = l2
+        self.enabled = enabled
+        self.report = report
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits_l1": 0,
+            "hits_l2": 0,
+            "misses": 0,
+            "stores": 0,
+            "errors": 0,
+            "saved_latency_ms": 0,
+            "saved_prompt_tokens": 0,
+            "saved_completion_tokens": 0,
+        }
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for k, v in deltas.items():
+                self._counters[k] += v
+        if self.report is not None:
+            for k, v in deltas.items():
+                if v:
+                    self.report(k, v)
+
+    def _count_hit(self, tier: str, answer: CachedAnswer) -> None:
+        self._count(
+            **{f"hits_{tier}": 1},
+            saved_latency_ms=answer.latency_ms,
+            saved_prompt_tokens=answer.prompt_tokens,
+            saved_completion_tokens=answer.completion_tokens,
+        )
+
+    def get(self, key: str, count: bool = True):
+        """Return ``(answer, tier)`` where tier is ``"l1"``, ``"l2"`` or ``None``.
+
+        ``count=False`` looks up without touching the hit/miss counters.
+        """
+        if not self.enabled:
+            return None, None
+        answer = self.l1.get(key)
+        if answer is not None:
+            if count:
+                self._count_hit("l1", answer)
+            return answer, "l1"
+        if self.l2 is not None:
+            try:
+                answer = self.l2.get(key)
+            except Exception as e:
+                print(">>> WARN: LLM cache L2 lookup failed:", e)
+                self._count(errors=1)
+                answer = None
+            if answer is not None:
+                self.l1.set(key, answer, answer.size)
+                if count:
+                    self._count_hit("l2", answer)
+                return answer, "l2"
+        if count:
+            self._count(misses=1)
+        return None, None
+
+    def set(self, key: str, answer: CachedAnswer, **meta) -> None:
+        if not self.enabled or not answer.value:
+            return
+        self.l1.set(key, answer, answer.size)
+        if self.l2 is not None:
+            try:
+                self.l2.set(key, answer, **meta)
+            except Exception as e:
+                print(">>> WARN: LLM cache L2 store failed:", e)
+                self._count(errors=1)
+        self._count(stores=1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._counters)
+        lookups = out["hits_l1"] + out["hits_l2"] + out["misses"]
+        out["lookups"] = lookups
+        out["hit_ratio"] = round((out["hits_l1"] + out["hits_l2"]) / lookups, 4) if lookups else 0.0
+        out["l1_entries"] = len(self.l1)
+        out["l1_bytes"] = self.l1.bytes
+        out["l1_evictions"] = self.l1.evictions
+        out["shared_tier"] = self.l2 is not None
+        out["enabled"] = self.enabled
+        return out
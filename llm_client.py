@@ -0,0 +1,92 @@
+# llm_client.py
+"""Process-wide OpenAI client backed by a pooled keep-alive HTTP transport.
+
+Building ``OpenAI(...)`` per request throws away the connection pool and TLS
+session each time. ``get_client()`` builds one client per process (lazily,
+so it is never shared across a gunicorn fork) and ``reset_client()`` drops
+it so the next call picks up changed settings.
+
+``openai`` is imported on first use: it is most of the app's import time, and
+workers that never call the API (or fork from a master that already imported
+it, see gunicorn.conf.py) should not pay for it at startup.
+"""
+import os
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+_lock = threading.Lock()
+_client: "OpenAI | None" = None
+_client_pid: int | None = None
+
+
+def client_settings() -> dict:
+    env = os.environ
+    return {
+        "api_key": env.get("OPENAI_API_KEY") or None,
+        "base_url": env.get("OPENAI_BASE_URL") or None,
+        "max_retries": int(env.get("OPENAI_MAX_RETRIES", "2")),
+        "timeout": float(env.get("OPENAI_TIMEOUT_SECONDS", "300")),
+        "connect_timeout": float(env.get("OPENAI_CONNECT_TIMEOUT_SECONDS", "10")),
+        "max_connections": int(env.get("OPENAI_MAX_CONNECTIONS", "32")),
+        "max_keepalive": int(env.get("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "16")),
+        "keepalive_expiry": float(env.get("OPENAI_KEEPALIVE_EXPIRY_SECONDS", "90")),
+    }
+
+
+def _build_client(settings: dict) -> "OpenAI":
+    from openai import DEFAULT_CONNECTION_LIMITS, DefaultHttpxClient, OpenAI, Timeout
+
+    # Take Limits/Timeout from the SDK rather than importing httpx: newer SDK
+    # releases ship their own HTTP stack and reject plain httpx objects.
+    Limits = type(DEFAULT_CONNECTION_LIMITS)
+    http_client = DefaultHttpxClient(
+        limits=Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_keepalive"],
+            keepalive_expiry=settings["keepalive_expiry"],
+        ),
+        timeout=Timeout(settings["timeout"], connect=settings["connect_timeout"]),
+    )
+    return OpenAI(
+        api_key=settings["api_key"],
+        base_url=settings["base_url"],
+        max_retries=settings["max_retries"],
+        http_client=http_client,
+    )
+
+
+def get_client() -> "OpenAI | None":
+    """Return this process's shared client, or None if no API key is configured."""
+    global _client, _client_pid
+    client = _client
+    if client is not None and _client_pid == os.getpid():
+        return client
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            return _client
+        settings = client_settings()
+        if not settings["api_key"]:
+            return None
+        _client = _build_client(settings)
+        _client_pid = os.getpid()
+        print(
+            f">>> OpenAI client ready (pid={_client_pid}, max_connections={settings['max_connections']}, "
+            f"keepalive={settings['max_keepalive']}, timeout={settings['timeout']}s)"
+        )
+        return _client
+
+
+def reset_client() -> None:
+    """Close the shared client; the next ``get_client()`` builds a fresh one."""
+    global _client, _client_pid
+    with _lock:
+        old, owner = _client, _client_pid
+        _client, _client_pid = None, None
+    if old is not None and owner == os.getpid():
+        try:
+            old.close()
+        except Exception as e:
+            print(">>> WARN: Failed to close OpenAI client:", e)
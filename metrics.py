@@ -0,0 +1,268 @@
+# metrics.py
+"""Prometheus metrics for the app, served at /metrics.
+
+Under gunicorn every worker is a separate process, so metrics use
+prometheus_client's multiprocess mode: each process writes its samples to
+files in ``PROMETHEUS_MULTIPROC_DIR`` and the scrape aggregates them. The
+directory is prepared by gunicorn.conf.py before the app is imported. Without
+it (``python Flask_App.py``) the default single-process registry is used.
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client import REGISTRY as _DEFAULT_REGISTRY
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120, 300)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from WSGI entry until the response body is closed (covers streamed responses).",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled, including streaming bodies.",
+    multiprocess_mode="livesum",
+)
+LLM_IN_FLIGHT = Gauge(
+    "llm_requests_in_flight",
+    "Upstream model calls currently open.",
+    ["model"],
+    multiprocess_mode="livesum",
+)
+LLM_TTFT = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time until the first streamed token arrives from the model.",
+    ["model", "kind"],
+    buckets=LLM_BUCKETS,
+)
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds",
+    "Total upstream model call time.",
+    ["model", "kind", "outcome"],
+    buckets=LLM_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens reported in the model's usage block.",
+    ["model", "kind", "type"],
+)
+DB_QUERY = Histogram(
+    "db_query_duration_seconds",
+    "Cursor execution time per statement.",
+    ["verb"],
+    buckets=DB_BUCKETS,
+)
+DB_CONNECTION_HOLD = Histogram(
+    "db_connection_hold_seconds",
+    "Time a pooled connection is checked out, i.e. the length of a session's DB work.",
+    buckets=DB_BUCKETS,
+)
+NEAR_DUP_LOOKUPS = Counter(
+    "near_duplicate_lookups_total",
+    "Exact-key cache misses checked against the near-duplicate index, by outcome.",
+    ["outcome"],
+)
+NEAR_DUP_SIMILARITY = Histogram(
+    "near_duplicate_similarity",
+    "Best estimated similarity found per near-duplicate lookup (lookups with a candidate only).",
+    buckets=(0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 1.0),
+)
+LLM_CACHE_LOOKUPS = Counter(
+    "llm_cache_lookups_total",
+    "Exact-key LLM cache lookups, by result (hit_l1, hit_l2, miss).",
+    ["result"],
+)
+LLM_CACHE_STORES = Counter("llm_cache_stores_total", "Answers stored in the LLM cache.")
+LLM_CACHE_ERRORS = Counter("llm_cache_errors_total", "Failed reads or writes of the shared LLM cache tier.")
+LLM_CACHE_SAVED_TOKENS = Counter(
+    "llm_cache_saved_tokens_total",
+    "Tokens the original call used, summed over the cache hits that replaced it.",
+    ["type"],
+)
+LLM_CACHE_SAVED_SECONDS = Counter(
+    "llm_cache_saved_seconds_total",
+    "Upstream latency of the original call, summed over the cache hits that replaced it.",
+)
+JOBS_RUNNING = Gauge(
+    "generation_jobs_running",
+    "Async generation jobs currently running.",
+    multiprocess_mode="livesum",
+)
+JOBS_QUEUED = Gauge(
+    "generation_jobs_queued",
+    "Async generation jobs accepted and waiting for a job worker.",
+    multiprocess_mode="livesum",
+)
+HISTORY_WRITES = Counter(
+    "history_writes_total",
+    "History rows handled by the write-behind queue (rejected ones are written inline; "
+    "retried ones were in a failed batch and were written again one by one).",
+    ["outcome"],
+)
+HISTORY_QUEUE_DEPTH = Gauge(
+    "history_write_queue_depth",
+    "History rows waiting in the write-behind queue.",
+    multiprocess_mode="livesum",
+)
+
+_DB_VERBS = frozenset(("select", "insert", "update", "delete", "with"))
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render() -> tuple[bytes, str]:
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = _DEFAULT_REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def observe_tokens(model: str, kind: str, usage) -> None:
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    if prompt:
+        LLM_TOKENS.labels(model, kind, "prompt").inc(prompt)
+    if completion:
+        LLM_TOKENS.labels(model, kind, "completion").inc(completion)
+
+
+def observe_llm_cache(counter: str, n: int) -> None:
+    """``TwoTierCache`` report hook: map its counter names onto the metrics above."""
+    if counter in ("hits_l1", "hits_l2"):
+        LLM_CACHE_LOOKUPS.labels(counter.replace("hits_", "hit_")).inc(n)
+    elif counter == "misses":
+        LLM_CACHE_LOOKUPS.labels("miss").inc(n)
+    elif counter == "stores":
+        LLM_CACHE_STORES.inc(n)
+    elif counter == "errors":
+        LLM_CACHE_ERRORS.inc(n)
+    elif counter == "saved_latency_ms":
+        LLM_CACHE_SAVED_SECONDS.inc(n / 1000)
+    elif counter == "saved_prompt_tokens":
+        LLM_CACHE_SAVED_TOKENS.labels("prompt").inc(n)
+    elif counter == "saved_completion_tokens":
+        LLM_CACHE_SAVED_TOKENS.labels("completion").inc(n)
+
+
+def observe_jobs(stats: dict) -> None:
+    """``JobRunner`` report hook."""
+    JOBS_RUNNING.set(stats["running"])
+    JOBS_QUEUED.set(stats["queued"])
+
+
+class LLMCall:
+    """Times one upstream call: ``with LLMCall(model, kind) as call: ... call.first_token()``."""
+
+    __slots__ = ("model", "kind", "t0", "_ttft_seen")
+
+    def __init__(self, model: str, kind: str):
+        self.model = model
+        self.kind = kind
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        self._ttft_seen = False
+        LLM_IN_FLIGHT.labels(self.model).inc()
+        return self
+
+    def first_token(self) -> None:
+        if not self._ttft_seen:
+            self._ttft_seen = True
+            LLM_TTFT.labels(self.model, self.kind).observe(time.perf_counter() - self.t0)
+
+    def __exit__(self, exc_type, exc, tb):
+        LLM_IN_FLIGHT.labels(self.model).dec()
+        outcome = "error" if exc_type is not None else "ok"
+        LLM_LATENCY.labels(self.model, self.kind, outcome).observe(time.perf_counter() - self.t0)
+        return False
+
+
+def init_app(app, engine=None) -> None:
+    from flask import Response, request
+    from werkzeug.wsgi import ClosingIterator
+
+    wsgi_app = app.wsgi_app
+
+    def measured(environ, start_response):
+        start = time.perf_counter()
+        status = []
+
+        def _start_response(s, headers, exc_info=None):
+            status.append(s.split(" ", 1)[0])
+            return start_response(s, headers, exc_info)
+
+        def _done():
+            HTTP_IN_FLIGHT.dec()
+            route = environ.get("metrics.route", "unmatched")
+            HTTP_LATENCY.labels(environ.get("REQUEST_METHOD", ""), route, status[0] if status else "").observe(
+                time.perf_counter() - start
+            )
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            app_iter = wsgi_app(environ, _start_response)
+        except BaseException:
+            _done()
+            raise
+        return ClosingIterator(app_iter, _done)
+
+    app.wsgi_app = measured
+
+    @app.before_request
+    def _metrics_route():
+        # Label by URL rule, not path, so label cardinality stays bounded.
+        if request.url_rule is not None:
+            request.environ["metrics.route"] = request.url_rule.rule
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_endpoint():
+        body, content_type = render()
+        return Response(body, content_type=content_type)
+
+    if engine is not None:
+        _connect_engine(engine)
+
+
+def _connect_engine(engine) -> None:
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_t0 = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        t0 = getattr(context, "_metrics_t0", None)
+        if t0 is not None:
+            verb = statement.lstrip()[:7].split(None, 1)[0].lower() if statement.strip() else ""
+            DB_QUERY.labels(verb if verb in _DB_VERBS else "other").observe(time.perf_counter() - t0)
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        record.info["metrics_checkout"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_conn, record):
+        t0 = record.info.pop("metrics_checkout", None)
+        if t0 is not None:
+            DB_CONNECTION_HOLD.observe(time.perf_counter() - t0)
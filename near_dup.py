@@ -0,0 +1,183 @@
+# near_dup.py
+"""In-process near-duplicate index over generation descriptions.
+
+Descriptions are normalized (case, punctuation, stop words, a few synonyms
+and plurals), turned into word 1- and 2-gram shingles, and summarized by a
+MinHash signature. The signature is split into LSH bands, so a lookup
+only compares the few earlier entries that share a band, not every
+description seen so far. Similarity is the MinHash estimate of the Jaccard
+similarity of the two shingle sets.
+
+Entries are grouped by a *scope*, the exact values of every other input
+(kind, model, prompt version, provider, scale...). Only descriptions are
+compared fuzzily. The index maps to LLM cache keys and does not store
+answers itself. It also keeps a digest of each description's normalized word
+sequence, so a caller can tell a reworded request from one with the same words.
+"""
+import hashlib
+import random
+import re
+import threading
+from collections import OrderedDict
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#.-]*")
+_MERSENNE = (1 << 61) - 1
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have i in is it its my of on or our that the their this to us "
+    "using use uses we will with which would should need needs want wants".split()
+)
+SYNONYMS = {
+    "postgresql": "postgres",
+    "pg": "postgres",
+    "psql": "postgres",
+    "application": "app",
+    "webapp": "app",
+    "website": "site",
+    "database": "db",
+    "kubernetes": "k8s",
+    "amazon": "aws",
+    "gcp": "google",
+    "javascript": "js",
+    "typescript": "ts",
+    "frontend": "front-end",
+    "backend": "back-end",
+}
+_CANONICAL = frozenset(SYNONYMS.values())
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+
+def normalize_tokens(text: str) -> list[str]:
+    tokens = []
+    for token in _TOKEN.findall((text or "").lower()):
+        token = token.strip(".-")
+        if not token or token in STOP_WORDS:
+            continue
+        token = SYNONYMS.get(token, token)
+        if token not in _CANONICAL and len(token) > 4 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+            token = SYNONYMS.get(token[:-1], token[:-1])
+        tokens.append(token)
+    return tokens
+
+
+def shingles(text: str) -> set[str]:
+    tokens = normalize_tokens(text)
+    out = set(tokens)
+    out.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return out
+
+
+def words_digest(text: str) -> str:
+    """Digest of the normalized word sequence; equal for the same words in the same order."""
+    return hashlib.blake2b(" ".join(normalize_tokens(text)).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _hash64(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index from (scope, description) to a cache key.
+
+    With ``bands`` x ``rows`` = ``num_perm``, two descriptions become
+    candidates with probability ``1 - (1 - s**rows) ** bands`` at similarity
+    ``s``; the defaults (32 x 4) find nearly all pairs above 0.6.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, max_entries: int = 5000, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[str, tuple, str]] = OrderedDict()  # key -> (scope, signature, words)
+        self._buckets: dict[tuple, set[str]] = {}
+        self._counters = {"lookups": 0, "served": 0, "seeded": 0, "misses": 0, "stale": 0}
+        self._similarity = {str(b): 0 for b in SIMILARITY_BUCKETS}
+
+    def signature(self, text: str) -> tuple | None:
+        hashes = [_hash64(s) for s in shingles(text)]
+        if not hashes:
+            return None
+        return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in self._perms)
+
+    def _bands(self, scope: str, signature: tuple):
+        for i in range(self.bands):
+            yield (scope, i, signature[i * self.rows:(i + 1) * self.rows])
+
+    def add(self, scope: str, text: str, key: str) -> None:
+        signature = self.signature(text)
+        if signature is None:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (scope, signature, words_digest(text))
+            for band in self._bands(scope, signature):
+                self._buckets.setdefault(band, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._counters["stale"] += 1
+
+    def _drop(self, key: str) -> None:
+        scope, signature, _words = self._entries.pop(key)
+        for band in self._bands(scope, signature):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def query(self, scope: str, text: str, exclude: str | None = None) -> list[tuple[str, float]]:
+        """Candidates ``[(key, similarity)]`` in the same scope, most similar first."""
+        signature = self.signature(text)
+        if signature is None:
+            return []
+        with self._lock:
+            candidates = set()
+            for band in self._bands(scope, signature):
+                candidates |= self._buckets.get(band, set())
+            candidates.discard(exclude)
+            scored = []
+            for key in candidates:
+                other = self._entries[key][1]
+                same = sum(1 for x, y in zip(signature, other) if x == y)
+                scored.append((key, same / self.num_perm))
+                self._entries.move_to_end(key)
+        scored.sort(key=lambda kv: kv[1], reverse=True)
+        return scored
+
+    def same_words(self, key: str, text: str) -> bool:
+        """Whether ``key`` was indexed for a description with the same normalized words as ``text``."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry is not None and entry[2] == words_digest(text)
+
+    def record(self, outcome: str, similarity: float | None) -> None:
+        """Count a lookup outcome (``served``, ``seeded`` or ``misses``) and its best similarity."""
+        with self._lock:
+            self._counters["lookups"] += 1
+            self._counters[outcome] += 1
+            if similarity is not None:
+                for b in SIMILARITY_BUCKETS:
+                    if similarity <= b:
+                        self._similarity[str(b)] += 1
+                        break
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._counters)
+            out["entries"] = len(self._entries)
+            out["best_similarity_le"] = dict(self._similarity)
+        lookups = out["lookups"] or 1
+        out["serve_rate"] = round(out["served"] / lookups, 4)
+        out["seed_rate"] = round(out["seeded"] / lookups, 4)
+        return out
@@ -0,0 +1,87 @@
+# pipeline.py
+"""Run a small dependency graph of stages on a thread pool.
+
+Each ``Stage`` names the stages it needs; its ``run`` receives their results
+as a dict. A stage is submitted as soon as all of its dependencies have
+succeeded, so the wall time follows the critical path rather than the sum
+of the stages. Stages whose dependency failed are not run. Each stage runs in
+a copy of the caller's context, so context variables (the request trace)
+carry over to the pool thread.
+"""
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Callable, NamedTuple
+
+
+class Stage(NamedTuple):
+    name: str
+    run: Callable[[dict], object]
+    deps: tuple[str, ...] = ()
+
+
+class DependencyFailed(Exception):
+    def __init__(self, stage: str, dependency: str):
+        super().__init__(f"skipped: {dependency} failed")
+        self.stage = stage
+        self.dependency = dependency
+
+
+def run_dag(stages: list[Stage], executor: Executor):
+    """Yield ``(name, result, error)`` for every stage, in completion order.
+
+    ``error`` is the exception the stage raised (``result`` is then None), or
+    ``DependencyFailed`` for stages skipped because a dependency failed.
+    Closing the generator cancels stages that have not started yet.
+    """
+    names = {s.name for s in stages}
+    for s in stages:
+        missing = [d for d in s.deps if d not in names]
+        if missing:
+            raise ValueError(f"stage {s.name} depends on unknown stage(s): {', '.join(missing)}")
+
+    pending = {s.name: s for s in stages}
+    results: dict[str, object] = {}
+    failed: set[str] = set()
+    running = {}
+
+    def launch_ready():
+        for name, stage in list(pending.items()):
+            if all(d in results for d in stage.deps):
+                del pending[name]
+                deps = {d: results[d] for d in stage.deps}
+                running[executor.submit(contextvars.copy_context().run, stage.run, deps)] = name
+
+    def skip_blocked():
+        skipped = []
+        changed = True
+        while changed:
+            changed = False
+            for name, stage in list(pending.items()):
+                dep = next((d for d in stage.deps if d in failed), None)
+                if dep is not None:
+                    del pending[name]
+                    failed.add(name)
+                    skipped.append((name, None, DependencyFailed(name, dep)))
+                    changed = True
+        return skipped
+
+    try:
+        launch_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    failed.add(name)
+                    yield name, None, e
+                else:
+                    yield name, results[name], None
+            yield from skip_blocked()
+            launch_ready()
+        if pending:
+            raise ValueError(f"dependency cycle among: {', '.join(sorted(pending))}")
+    finally:
+        for future in running:
+            future.cancel()
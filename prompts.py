@@ -0,0 +1,1158 @@
+# prompts.py
+"""Named, versioned prompt templates with token budgeting.
+
+Each generation kind registers a ``PromptTemplate`` holding its version,
+model settings, system message and a render function. The render functions
+are plain f-string builders, compiled once with this module. ``fit()`` renders
+a template for one request after checking the token budget:
+
+- Free-text inputs (``description``, ``structure``) have a per-field token cap
+  (PROMPT_MAX_<FIELD>_TOKENS). Oversized values are shrunk locally: whitespace
+  is normalized, repeated lines are dropped, tree comments and the deepest
+  levels are removed, and head/tail truncation is the last resort.
+- The whole prompt plus ``max_tokens`` must fit the model's context window.
+  ``max_tokens`` is lowered if needed, and ``PromptBudgetError`` is raised
+  when fewer than MIN_OUTPUT_TOKENS would be left for the answer.
+
+Inputs within their caps are passed through untouched, so the prompt is
+byte-identical to an unbudgeted render.
+
+Token counts come from ``tiktoken`` when installed. Otherwise a conservative
+characters-per-token estimate is used.
+"""
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable
+
+try:
+    import tiktoken
+except ImportError:  # optional; falls back to a character-based estimate
+    tiktoken = None
+
+CONTEXT_WINDOWS = {"gpt-4o": 128000, "gpt-4o-mini": 128000}
+DEFAULT_CONTEXT_WINDOW = 8192
+# Chat framing per message plus the reply primer, per OpenAI's counting guide.
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_OVERHEAD_TOKENS = 3
+MIN_OUTPUT_TOKENS = int(os.environ.get("PROMPT_MIN_OUTPUT_TOKENS", "1024"))
+CHARS_PER_TOKEN = 3.5
+FIELD_TOKEN_CAPS = {
+    "description": int(os.environ.get("PROMPT_MAX_DESCRIPTION_TOKENS", "4000")),
+    "structure": int(os.environ.get("PROMPT_MAX_STRUCTURE_TOKENS", "6000")),
+}
+TRUNCATION_MARKER = "\n[... {n} tokens omitted to fit the prompt budget ...]\n"
+
+providers = ["AWS", "Azure", "Google Cloud"]
+scales = ["Small (<1k/day)", "Medium (1k-100k/day)", "Large (>100k/day)"]
+loading_pressure = ["Everyday", "3-5 days in week", "No loading pressure"]
+
+
+class PromptBudgetError(ValueError):
+    """The prompt cannot fit the model's context window with room to answer."""
+
+
+# -- token counting -----------------------------------------------------------
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:  # encoding files unavailable (offline image, etc.)
+        print(f">>> WARN: tiktoken unavailable for {model}, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    if not text:
+        return 0
+    enc = _encoding(model)
+    if enc is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str, tail_share: float = 0.25) -> str:
+    """Keep the head and tail of ``text`` within ``max_tokens``, marking the cut."""
+    total = count_tokens(text, model)
+    if total <= max_tokens:
+        return text
+    marker_tokens = count_tokens(TRUNCATION_MARKER.format(n=total), model)
+    keep = max(max_tokens - marker_tokens, 0)
+    tail = int(keep * tail_share)
+    head = keep - tail
+    enc = _encoding(model)
+    if enc is None:
+        chars = lambda n: int(n * CHARS_PER_TOKEN)
+        head_text, tail_text = text[: chars(head)], text[len(text) - chars(tail):] if tail else ""
+    else:
+        ids = enc.encode(text, disallowed_special=())
+        head_text = enc.decode(ids[:head])
+        tail_text = enc.decode(ids[len(ids) - tail:]) if tail else ""
+    return head_text + TRUNCATION_MARKER.format(n=total - keep) + tail_text
+
+
+# -- shrinking oversized inputs ----------------------------------------------
+
+_TREE_PREFIX = re.compile(r"^[\s│├└─]*")
+_TREE_COMMENT = re.compile(r"\s+#.*$")
+
+
+def _normalize_text(text: str) -> str:
+    lines = [re.sub(r"[ \t]+", " ", line).rstrip() for line in text.strip().splitlines()]
+    out, seen = [], set()
+    for line in lines:
+        key = line.strip().lower()
+        if key and key in seen:
+            continue  # repeated line: pasted twice, boilerplate, logs
+        if key:
+            seen.add(key)
+        if not key and out and not out[-1]:
+            continue
+        out.append(line)
+    return "\n".join(out)
+
+
+def shrink_description(text: str, max_tokens: int, model: str) -> str:
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    return truncate_tokens(_normalize_text(text), max_tokens, model)
+
+
+def _tree_depth(line: str) -> int:
+    return len(_TREE_PREFIX.match(line).group(0)) // 4
+
+
+def shrink_tree(text: str, max_tokens: int, model: str) -> str:
+    """Summarize a folder tree: drop comments, then the deepest levels."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    lines = [_TREE_COMMENT.sub("", line).rstrip() for line in text.strip().splitlines()]
+    lines = [line for line in lines if line.strip()]
+    text = "\n".join(lines)
+    depth = max((_tree_depth(line) for line in lines), default=0)
+    while depth > 1 and count_tokens(text, model) > max_tokens:
+        depth -= 1
+        kept = [line for line in lines if _tree_depth(line) <= depth]
+        text = "\n".join(kept) + f"\n[... entries deeper than {depth + 1} levels omitted ...]"
+    return truncate_tokens(text, max_tokens, model, tail_share=0.0)
+
+
+SHRINKERS: dict[str, Callable[[str, int, str], str]] = {
+    "description": shrink_description,
+    "structure": shrink_tree,
+}
+
+
+# -- templates ----------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    name: str
+    version: str
+    model: str
+    temperature: float
+    max_tokens: int
+    system: str
+    render: Callable[..., str]
+    budgeted: tuple[str, ...] = ()
+
+    @property
+    def context_window(self) -> int:
+        return CONTEXT_WINDOWS.get(self.model, DEFAULT_CONTEXT_WINDOW)
+
+
+@dataclass
+class FittedPrompt:
+    template: PromptTemplate
+    prompt: str
+    max_tokens: int
+    input_tokens: int
+    fields: dict
+    trimmed: dict = field(default_factory=dict)  # field -> (tokens before, tokens after)
+
+
+TEMPLATES: dict[str, PromptTemplate] = {}
+
+
+def template(name: str, *, version: str, model: str, temperature: float, max_tokens: int, system: str, budgeted=()):
+    def register(render):
+        TEMPLATES[name] = PromptTemplate(name, version, model, temperature, max_tokens, system, render, tuple(budgeted))
+        return render
+
+    return register
+
+
+def render(name: str, **fields) -> str:
+    return TEMPLATES[name].render(**fields)
+
+
+@lru_cache(maxsize=512)
+def _fixed_tokens(name: str, fixed: tuple) -> int:
+    """Tokens of the prompt (plus system message) with the budgeted fields empty."""
+    tpl = TEMPLATES[name]
+    empty = {f: "" for f in tpl.budgeted}
+    prompt = tpl.render(**dict(fixed), **empty)
+    return (
+        count_tokens(prompt, tpl.model)
+        + count_tokens(tpl.system, tpl.model)
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+        + REPLY_OVERHEAD_TOKENS
+    )
+
+
+def fit(name: str, fields: dict) -> FittedPrompt:
+    """Render template ``name`` for ``fields``, shrinking budgeted inputs as needed."""
+    tpl = TEMPLATES[name]
+    fixed = tuple(sorted((k, v) for k, v in fields.items() if k not in tpl.budgeted))
+    used = _fixed_tokens(name, fixed)
+    room = tpl.context_window - used - MIN_OUTPUT_TOKENS
+    fitted, trimmed = dict(fields), {}
+    # Earlier budgeted fields (description) get first claim on the room left.
+    for f in tpl.budgeted:
+        value = fields.get(f) or ""
+        cap = max(min(FIELD_TOKEN_CAPS.get(f, room), room), 0)
+        before = count_tokens(value, tpl.model)
+        if before > cap:
+            value = SHRINKERS[f](value, cap, tpl.model)
+            after = count_tokens(value, tpl.model)
+            trimmed[f] = (before, after)
+        else:
+            after = before
+        fitted[f] = value
+        used += after
+        room -= after
+    if room < 0:
+        raise PromptBudgetError(
+            f"{name} prompt needs {used} tokens; {tpl.model} allows {tpl.context_window} "
+            f"including at least {MIN_OUTPUT_TOKENS} for the answer"
+        )
+    prompt = tpl.render(**fitted)
+    return FittedPrompt(
+        template=tpl,
+        prompt=prompt,
+        max_tokens=min(tpl.max_tokens, tpl.context_window - used),
+        input_tokens=used,
+        fields=fitted,
+        trimmed=trimmed,
+    )
+
+
+def fit_extra_message(text: str, model: str, input_tokens: int, max_tokens: int) -> tuple[str, int]:
+    """Shrink ``text`` to fit as one more user message of an already fitted prompt.
+
+    The room is what the context window has left after ``input_tokens`` and
+    ``max_tokens`` for the answer. Returns ``(text, tokens)``, or ``("", 0)``
+    when there is no room for it at all.
+    """
+    room = CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW) - input_tokens - max_tokens - MESSAGE_OVERHEAD_TOKENS
+    if room <= 0 or not text:
+        return "", 0
+    text = truncate_tokens(text, room, model)
+    return text, count_tokens(text, model) + MESSAGE_OVERHEAD_TOKENS
+
+
+def build_region_accuracy_rules(provider: str | None, country: str | None = None) -> str:
+    """Return a short instruction block to keep region recommendations accurate.
+
+    - Never suggest regions a provider doesn't offer.
+    - Specific guardrails (e.g., Azure has no Bahrain region, AWS does).
+    """
+    p = (provider or "").strip().lower()
+    c = (country or "").strip()
+
+    rules: list[str] = [
+        "Do NOT list regions that the selected provider does not actually offer.",
+        "If a requested region is unavailable, clearly state it's not available for this provider and recommend the nearest supported regions instead.",
+    ]
+
+    if p == "azure":
+        # User highlighted this specifically; enforce it in the prompt to avoid hallucinations.
+        rules.append(
+            "Azure does not have a Bahrain region. Do not recommend 'Bahrain' for Azure; instead suggest nearby Azure regions (for example 'UAE North' or 'Qatar Central') and explicitly note Bahrain is not an Azure region when relevant."
+        )
+    elif p == "aws":
+        # Useful contrast to avoid removing Bahrain when AWS is selected.
+        rules.append("AWS includes the Bahrain region (me-south-1). Use it when appropriate.")
+    elif p in ("google cloud", "gcp", "google"):
+        rules.append(
+            "Google Cloud does not have a Bahrain region. Use valid GCP regions in the Middle East such as 'me-central2' (Dammam, Saudi Arabia), 'me-central1' (Doha, Qatar), or 'me-west1' (Tel Aviv, Israel). When the user's country is Saudi Arabia, prefer 'me-central2' (Dammam) for proximity/latency unless other constraints apply."
+        )
+
+    return "\nProvider region accuracy rules:\n- " + "\n- ".join(rules) + "\n"
+
+
+@template(
+    "cost",
+    version="1",
+    model="gpt-4o-mini",
+    temperature=0.7,
+    max_tokens=3000,
+    system="You are an expert Cloud Cost Optimization consultant. Provide strategic cost recommendations with SAR pricing without code or configurations.",
+    budgeted=("description",),
+)
+def cost_template(provider, description, scale, loading, country) -> str:
+    try:
+        scale_factors = {
+            scales[0]: 1.0,
+            scales[1]: 2.0,
+            scales[2]: 3.0,
+        }
+        pressure_factors = {
+            loading_pressure[2]: 1.0,
+            loading_pressure[1]: 1.5,
+            loading_pressure[0]: 2.0,
+        }
+    except Exception:
+        scale_factors = {scale: 1.0}
+        pressure_factors = {loading: 1.0}
+
+    scale_factor = scale_factors.get(scale, 1.0)
+    pressure_factor = pressure_factors.get(loading, 1.0)
+    combined_multiplier = round(scale_factor * pressure_factor, 2)
+
+    # Build region context
+    region_context = ""
+    if country:
+        region_context = f"""
+**CRITICAL: USER'S COUNTRY/REGION**: {country}
+
+Based on the user's location ({country}), you MUST provide:
+1. **TOP 3 RECOMMENDED REGIONS** for {provider} that offer the BEST COST-TO-PERFORMANCE ratio for users in {country}
+   - Consider: proximity/latency, regional pricing differences, data sovereignty, available services
+   - Rank them: #1 (Best), #2 (Alternative), #3 (Fallback)
+   - For each region, explain WHY it's recommended (latency, cost, compliance)
+
+2. **COST COMPARISON BY REGION**: Show the cost range (min-max in SAR) for EACH of the 3 recommended regions
+   - Region pricing varies significantly (some regions are 20-40% more expensive)
+   - Be specific: "Region A: SAR X,XXX - SAR Y,YYY/month"
+   - Highlight which region offers the best value
+
+Format this as the FIRST section of your response.
+"""
+    else:
+        region_context = ""
+
+    influence_context = f"""
+Things that strongly influence cost:
+1) The greater the pressure, the greater the cost.
+2) The greater the scale, the greater the cost.
+
+Apply the following numeric influence when producing SAR estimates:
+- Scale: {scale} → factor {scale_factor:.2f}
+- Loading pressure: {loading} → factor {pressure_factor:.2f}
+- Combined cost multiplier: {combined_multiplier:.2f}
+
+You MUST apply the combined cost multiplier to all SAR minimum/maximum estimates and to each
+service category proportionally. First base ranges on realistic {provider} pricing, then scale by
+this multiplier to reflect the user's scale and loading pressure.
+"""
+
+    prompt = f"""
+You are an expert DevOps and Cloud Cost Optimization consultant specializing in {provider}.
+
+Context:
+- Cloud provider: {provider}
+- Expected scale tier: {scale}
+- Loading pressure / request pattern: {loading}
+- Project description: {description}
+{region_context}
+
+{build_region_accuracy_rules(provider, country)}
+
+{influence_context}
+
+Your task is to provide **COST OPTIMIZATION BEST PRACTICES ONLY** - NO CODE, NO CONFIGURATIONS, NO TERRAFORM, NO CI/CD PIPELINES.
+
+Focus exclusively on cost optimization:
+
+### 1. REGIONAL COST OPTIMIZATION (if country provided)
+{f"Provide the TOP 3 cost-optimized {provider} regions for users in {country} with detailed cost ranges for each region in SAR." if country else "Skip this section if no country is provided."}
+
+### 2. COST-EFFICIENT ARCHITECTURE RECOMMENDATIONS
+Recommend the most cost-effective services and architectural patterns for {provider} based on the scale tier:
+- For Small scale: Emphasize serverless, pay-per-use, and managed services to minimize operational overhead
+- For Medium scale: Balance between cost and performance with autoscaling and caching strategies
+- For Large scale: Focus on reserved instances, committed use discounts, and multi-region optimization
+
+### 3. COST BREAKDOWN & ESTIMATES IN SAUDI RIYALS (SAR)
+Based on the project description and scale, provide:
+- **Minimum Monthly Cost (SAR)**: Most cost-optimized configuration
+- **Maximum Monthly Cost (SAR)**: Peak usage with high availability
+- Cost breakdown by service category:
+  * Compute costs
+  * Storage costs
+  * Database costs
+  * Network/bandwidth costs
+  * Additional services (monitoring, backup, etc.)
+
+Use realistic {provider} pricing converted to SAR (1 USD ≈ 3.75 SAR).
+ IMPORTANT: After determining realistic baseline costs, multiply the min/max and each category
+ by the combined cost multiplier of {combined_multiplier:.2f} derived from the user's
+ scale and loading pressure inputs.
+
+### 4. COST OPTIMIZATION BEST PRACTICES
+List specific recommendations to reduce costs:
+- Auto-scaling policies
+- Resource scheduling (shutdown during off-hours)
+- Reserved capacity vs on-demand
+- Data transfer optimization
+- Monitoring and alerting for cost anomalies
+- Right-sizing recommendations
+- Spot/preemptible instances where applicable
+- Storage lifecycle policies
+
+### 5. COST VS FEATURE TRADEOFFS
+Explain key decisions:
+- When to use premium vs standard tiers
+- When to use managed vs self-managed services
+- Reserved vs on-demand pricing strategies
+
+### OUTPUT FORMAT:
+- Use clear headings and bullet points
+- NO code blocks, NO configuration examples, NO YAML/JSON/HCL
+- Focus on WHAT to do and WHY, not HOW to implement
+- Provide specific service names from {provider}
+- Include realistic cost ranges in SAR with minimum and maximum estimates
+{f"- START with the Regional Recommendations section showing the 3 best regions for {country}" if country else ""}
+
+**IMPORTANT**: This is a cost-focused strategic advisory document. Keep it business-focused and decision-oriented.
+""".strip()
+
+    return prompt
+
+
+@template(
+    "performance",
+    version="1",
+    model="gpt-4o-mini",
+    temperature=0.7,
+    max_tokens=3000,
+    system="You are an expert Cloud Performance Optimization consultant. Provide strategic performance recommendations without code or configurations.",
+    budgeted=("description",),
+)
+def performance_template(provider, description, scale, loading, country) -> str:
+    region_perf_context = ""
+    if country:
+        region_perf_context = f"""
+**USER'S COUNTRY/REGION**: {country}
+
+Consider regional performance factors:
+- Recommend {provider} regions with lowest latency from {country}
+- Explain impact of region selection on performance (latency, data residency, edge locations)
+- Suggest multi-region strategies if applicable for high availability and performance
+"""
+
+    prompt = f"""
+You are an expert DevOps and Cloud Performance Optimization consultant specializing in {provider}.
+
+Context:
+- Cloud provider: {provider}
+- Expected scale tier: {scale}
+- Loading pressure / request pattern: {loading}
+- Project description: {description}
+{region_perf_context}
+
+{build_region_accuracy_rules(provider, country)}
+
+Your task is to provide **PERFORMANCE OPTIMIZATION BEST PRACTICES ONLY** - NO CODE, NO CONFIGURATIONS, NO TERRAFORM, NO CI/CD PIPELINES.
+
+Focus exclusively on performance optimization:
+
+### 1. REGIONAL PERFORMANCE OPTIMIZATION (if country provided)
+{f"Recommend the best {provider} regions for users in {country} based on latency, edge presence, and performance characteristics." if country else "Skip this section if no country is provided."}
+
+### 2. COMPUTE PERFORMANCE OPTIMIZATION
+Provide specific performance recommendations:
+- Right-sizing for performance (CPU, memory, IOPS requirements based on scale and loading)
+- Premium/compute-optimized SKUs when warranted
+- Autoscaling strategies for handling traffic spikes
+- Load balancing and traffic distribution
+- Containerization and orchestration benefits (AKS/EKS/GKE)
+
+### 3. STORAGE PERFORMANCE OPTIMIZATION
+- Storage tier selection (Premium SSD vs Standard, IOPS provisioning)
+- Caching strategies (Redis, CDN, application-level caching)
+- Database read replicas for read-heavy workloads
+- Content Delivery Networks (CDN) for static assets
+
+### 4. NETWORK PERFORMANCE OPTIMIZATION
+- CDN and edge locations for global performance
+- Private endpoints and network latency reduction
+- Traffic routing and geo-routing strategies
+- Connection pooling and keep-alive optimizations
+
+### 5. DATABASE PERFORMANCE OPTIMIZATION
+- Query optimization and indexing strategies
+- Read replicas and horizontal scaling
+- Caching layers (Redis, Memcached)
+- Connection pooling
+- Database SKU selection for IOPS and throughput
+
+### 6. APPLICATION-LEVEL PERFORMANCE
+- Caching strategies (in-memory, distributed cache)
+- Asynchronous processing and message queues
+- API optimization and rate limiting
+- Compression and minification
+
+### 7. MONITORING & OBSERVABILITY FOR PERFORMANCE
+- Application Performance Monitoring (APM) tools
+- Real-time metrics and alerting
+- Performance bottleneck identification
+- Load testing and capacity planning
+
+### 8. PERFORMANCE VS COST TRADEOFFS
+Explain when to prioritize performance over cost:
+- Premium vs standard tiers
+- Over-provisioning for reliability
+- Reserved capacity for predictable workloads
+
+### OUTPUT FORMAT:
+- Use clear headings and bullet points
+- NO code blocks, NO configuration examples, NO YAML/JSON/HCL
+- Focus on WHAT to do and WHY, not HOW to implement
+- Provide specific service names from {provider}
+- Explain performance impact quantitatively where possible (e.g., "reduces latency by 40%")
+{f"- START with the Regional Performance section for {country}" if country else ""}
+
+**IMPORTANT**: This is a performance-focused strategic advisory document. Keep it business-focused and decision-oriented.
+""".strip()
+
+    return prompt
+
+
+@template(
+    "structure",
+    version="1",
+    model="gpt-4o-mini",
+    temperature=0.6,
+    max_tokens=2500,
+    system="You are an expert Software Architect and DevOps engineer. Analyze the user's project description word-by-word and suggest best-practice infrastructure when details are missing. Output clear, well-organized project structures.",
+    budgeted=("description",),
+)
+def structure_template(provider, description, scale, loading) -> str:
+    structure_prompt = f"""
+You are an expert Software Architect and DevOps engineer specializing in {provider}.
+
+**PRIMARY INPUT (90% weight) - Read every word carefully:**
+Project description: {description}
+
+Context:
+- Cloud provider: {provider}
+- Expected scale: {scale}
+- Loading pressure: {loading}
+
+YOUR MISSION:
+Analyze the project description thoroughly and generate a COMPLETE, production-ready folder structure. Base 90% of your decisions on what the user wrote. If the description lacks infrastructure details (user may not know DevOps/cloud well), intelligently suggest best practices for {provider} that fit their application type.
+
+INTELLIGENT INFERENCE RULES:
+- If user mentions "web app" but no specifics → suggest appropriate frontend framework + backend + database
+- If user mentions "database" without type → suggest PostgreSQL (most versatile) or MySQL based on use case
+- If user mentions "API" without backend tech → suggest modern REST/GraphQL backend for {provider}
+- If user mentions "mobile app" → suggest backend API + database + possibly blob storage for media
+- If user mentions "authentication" → include identity/auth module in infrastructure
+- If user mentions "files/images/uploads" → include object storage (S3/Blob/Cloud Storage)
+- If user mentions "real-time" or "notifications" → suggest caching/Redis + message queue
+- If containers not mentioned but app is modern → suggest containerization as best practice
+- Always include monitoring, secrets management, and CI/CD unless user explicitly says otherwise
+
+Generate a CLEAR, WELL-FORMATTED project folder structure tailored to the project description.
+
+## FORMATTING RULES (CRITICAL - MUST FOLLOW EXACTLY):
+
+1. **Use ONLY these tree characters**: ├──, └──, │
+2. **Consistent spacing**: 4 spaces per indentation level
+3. **Clear hierarchy**: Parent folders before children
+4. **Comments**: Add concise comments using "  # " (two spaces then #). Keep comments ≤ 40 chars. Never wrap comments to a new line.
+5. **File extensions**: Always include (.tf, .yml, .json, .js, .py, etc.)
+6. **NO MARKDOWN**: Do NOT include triple backticks, code fences, or prose paragraphs. Output ONLY the tree lines.
+7. **LINE LENGTH**: Keep each line ≤ 100 characters to avoid wrapping in UIs.
+8. **ROOT NAME**: Always start with a single top-level folder named `project-root/` and put everything under it.
+
+## SECTION ORDER (TOP → BOTTOM):
+project-root/ → frontend/ (if any) → backend/ or services/ → terraform/ → .github/workflows/ (if any) → scripts/ → tests/ → docs/ → docker-compose.yml → README.md
+
+## TERRAFORM STRUCTURE (MOST IMPORTANT, ADAPTIVE):
+
+**If infrastructure provisioning is needed**, create a Terraform folder using the base layout below. The root files (main.tf, variables.tf, outputs.tf) are required, but under modules/ you must include only the modules that are actually needed for the described project. Omit any modules that are not relevant. Use conventional module names so downstream Terraform generation can rely on them.
+
+```
+terraform/
+├── main.tf                      # Root configuration - calls all modules
+├── variables.tf                 # Root-level input variables
+├── outputs.tf                   # Root-level outputs
+└── modules/                     # Reusable Terraform modules
+    ├── networking/              # VPC/VNet, subnets, security groups
+    │   ├── main.tf             # Networking resources definition
+    │   ├── variables.tf        # Networking input variables
+    │   └── outputs.tf          # Networking outputs (subnet_id, vpc_id)
+    ├── compute/                 # AKS/EKS/GKE, VMs, App Service
+    │   ├── main.tf             # Compute resources definition
+    │   ├── variables.tf        # Compute input variables
+    │   └── outputs.tf          # Compute outputs (cluster_id, endpoint)
+    ├── database/                # Database resources (flexible servers, RDS, Cloud SQL)
+    │   ├── main.tf             # Database resources definition
+    │   ├── variables.tf        # Database input variables
+    │   └── outputs.tf          # Database outputs (connection_string, db_id)
+    ├── security/                # Key Vault/Secrets Manager, IAM/roles, policies
+    │   ├── main.tf             # Security resources definition
+    │   ├── variables.tf        # Security input variables
+    │   └── outputs.tf          # Security outputs (keyvault_id, acr_id)
+    ├── monitoring/              # Log Analytics/CloudWatch/Cloud Monitoring + APM wiring
+    │   ├── main.tf             # Monitoring resources definition
+    │   ├── variables.tf        # Monitoring input variables
+    │   └── outputs.tf          # Monitoring outputs (workspace_id)
+    ├── storage/                 # Storage accounts, S3 buckets, Cloud Storage
+    │   ├── main.tf             # Storage resources definition
+    │   ├── variables.tf        # Storage input variables
+    │   └── outputs.tf          # Storage outputs (storage_id, bucket_name)
+    ├── registry/                # Container registry (ACR/ECR/Artifact Registry)
+    │   ├── main.tf             # Registry creation and RBAC
+    │   ├── variables.tf        # Registry input variables
+    │   └── outputs.tf          # Registry outputs (registry_id, login_server)
+    ├── cdn/                     # CDN/Front Door/Cloud CDN for web/static
+    │   ├── main.tf             # CDN profiles, endpoints/origins/rules
+    │   ├── variables.tf        # CDN input variables
+    │   └── outputs.tf          # CDN endpoint/hostname
+    └── cache/                   # Redis Cache, ElastiCache, Memorystore
+        ├── main.tf             # Cache resources definition
+        ├── variables.tf        # Cache input variables
+        └── outputs.tf          # Cache outputs (cache_endpoint)
+```
+
+**TERRAFORM MODULES TO INCLUDE** (based on project needs):
+- **networking/** - ALWAYS include if using AKS/EKS/GKE or multi-tier apps
+- **compute/** - Include for AKS, EKS, GKE, App Service, VMs, containers
+- **database/** - Include if database is mentioned (PostgreSQL, MySQL, MongoDB, etc.)
+- **security/** - Include for Key Vault/Secrets Manager, IAM roles/policies, secrets management
+- **monitoring/** - Include if observability/logging is mentioned
+- **storage/** - Include if file storage, backups, or object storage needed
+- **cache/** - Include if Redis/caching layer is mentioned
+- **registry/** - Include if containers are mentioned (grant pull to compute identity; disable admin on ACR)
+- **cdn/** - Include if you expose static assets or a public web app and want global performance
+
+PRODUCTION INFERENCE (GO BEYOND USER INPUT):
+- If the description hints at containers, proactively add `registry/` and wire `compute` to pull images via identity/role (no admin passwords).
+- If a public web or static site is implied, add `cdn/` in front of the app service/storage static website.
+- Always pair databases with secrets management in `security/` and connect monitoring/APM via `monitoring/`.
+- Prefer private networking (subnets, NSGs/SGs, private endpoints) when networking + database/storage exist.
+
+## APPLICATION STRUCTURE (ADAPTIVE):
+Infer the stack from the project description and generate ONLY the folders for the chosen technologies. Do NOT output multiple stacks; pick the best match and keep it consistent end‑to‑end.
+
+### Frontend (generate only if a web/mobile UI is mentioned)
+- Detect the framework and language: React, Next.js, Vue, Angular, Svelte, plain HTML, or mobile (React Native/Flutter). Also infer TypeScript vs JavaScript.
+- Produce a clean, idiomatic structure for that framework. Examples of conventions to follow (pick ONE based on description):
+    - React (JS/TS): `src/components/`, `src/pages/ or src/routes/`, `src/hooks/`, `src/context/`, entry (`src/main.tsx` or `src/index.jsx`), `public/`, `package.json`, `vite.config.*` or CRA config.
+    - Next.js: prefer `app/` router for new projects, otherwise `pages/`; include `app/layout.tsx`, `app/page.tsx`, `next.config.js`, `public/`.
+    - Vue 3 + Vite: `src/components/`, `src/views/`, `src/router/`, `src/store/`, `main.ts`, `vite.config.ts`.
+    - Angular: standard CLI layout with `src/app/`, feature modules, `angular.json`.
+    - Static site: `public/`, `assets/`, minimal `index.html`.
+- Use proper file extensions: .tsx/.ts when TypeScript is implied; otherwise .jsx/.js.
+- Include `.env` only if the framework supports runtime env injection; otherwise note build‑time env (e.g., NEXT_PUBLIC_*, Vite env files).
+
+### Backend (generate only if an API/service is mentioned)
+- Detect the backend stack and show the conventional structure for exactly one framework:
+    - Node.js Express or NestJS
+    - Python FastAPI/Flask/Django
+    - Java Spring Boot
+    - Go (Gin/Fiber)
+    - .NET (minimal API or MVC)
+- Follow community‑standard folder names for the selected stack. Examples of conventions to follow (pick ONE based on description):
+    - Express: `src/routes/`, `src/controllers/`, `src/services/`, `src/models/`, `src/middleware/`, `src/config/`, `src/server.ts`.
+    - NestJS: `src/modules/feature/`, `src/common/`, `src/main.ts`, `nest-cli.json`.
+    - FastAPI: `app/api/routers/`, `app/core/`, `app/models/`, `app/services/`, `app/main.py`, `pyproject.toml` or `requirements.txt`.
+    - Django: project folder + one app; `manage.py`, `settings.py`, `urls.py`, `apps/`.
+    - Spring Boot: `src/main/java/...`, `src/main/resources/`, `pom.xml` or `build.gradle`.
+    - Go: `cmd/service/main.go`, `internal/handlers`, `internal/services`, `internal/repository`, `go.mod`.
+- Use `.env` only for local dev; keep secrets out of VCS.
+
+### Multi‑service or monorepo
+- If the description implies multiple services, create a `services/` folder with one subfolder per service (e.g., `services/api/`, `services/web/`, `services/worker/`) each with its own Dockerfile and README.
+- If the user mentions packages/shared libs, include `packages/` for shared code.
+
+## CI/CD STRUCTURE:
+**If deployment is mentioned:**
+```
+.github/
+└── workflows/
+    ├── ci.yml                   # Build, test, lint pipeline
+    └── cd.yml                   # Deploy to {provider} pipeline
+```
+
+## ADDITIONAL FOLDERS (as needed):
+```
+scripts/                         # Deployment and utility scripts
+├── build.sh
+├── deploy.sh
+└── init-db.sh
+
+tests/                           # Test suites
+├── unit/                        # Unit tests
+├── integration/                 # Integration tests
+└── e2e/                         # End-to-end tests
+
+docs/                            # Documentation
+├── architecture.md              # System architecture
+├── api.md                       # API documentation
+└── setup.md                     # Setup instructions
+
+docker-compose.yml               # Local multi-service development
+README.md                        # Project overview
+```
+
+## OUTPUT FORMAT:
+Generate the structure with:
+- Clear ASCII tree using ├──, └──, │ characters
+- 4-space indentation per level
+- Descriptive comments for each major folder
+- ALL files must have extensions (.tf, .js, .yml, .md, etc.)
+- Keep it clean, readable, and properly aligned
+
+**IMPORTANT**: Terraform modules/ directory is CRITICAL for generating infrastructure code later. Make sure it's complete and well-organized!
+
+Generate the structure now based on the project description above.
+""".strip()
+
+    return structure_prompt
+
+
+@template(
+    "terraform",
+    version="1",
+    model="gpt-4o",
+    temperature=0.5,
+    max_tokens=10000,
+    system="You are an expert Infrastructure as Code engineer. Analyze the user's project description thoroughly and suggest production-grade infrastructure when they don't specify details. Output only valid Terraform HCL code organized as modules with clear file separators.",
+    budgeted=("description", "structure"),
+)
+def terraform_template(provider, description, scale, loading, structure) -> str:
+    terraform_prompt = f"""
+You are an expert DevOps and Infrastructure as Code (Terraform) engineer specializing in {provider}.
+
+**PRIMARY SOURCE (90% weight) - Read every word:**
+Project description: {description}
+
+Context:
+- Cloud provider: {provider}
+- Expected scale: {scale}
+- Loading pressure: {loading}
+
+**SECONDARY REFERENCE (for module organization hints):**
+Project structure:
+{structure}
+
+YOUR MISSION:
+Generate complete, production-ready, MODERN Terraform code based primarily (90%) on the project description. If the user didn't specify infrastructure details (they may not know DevOps/cloud), intelligently recommend best-practice resources for {provider} that fit their application needs.
+
+INTELLIGENT DEFAULTS WHEN USER DOESN'T SPECIFY:
+- No database mentioned but app needs data → suggest PostgreSQL Flexible/RDS/Cloud SQL
+- No networking mentioned but app is multi-tier → create VPC/VNet with subnets
+- No monitoring mentioned → include Log Analytics/CloudWatch/Cloud Monitoring + APM
+- No container registry mentioned but containers implied → create ACR/ECR/Artifact Registry
+- No secrets mentioned but DB exists → create Key Vault/Secrets Manager/Secret Manager
+- No CDN mentioned but static/web app → suggest Front Door/CloudFront/Cloud CDN
+- No identity mentioned but compute exists → use managed identity/IAM roles/service accounts
+- Always include: encryption at rest, HTTPS enforcement, health checks, backup policies
+
+Generate complete, production-ready, MODERN Terraform code organized as MODULES using current best practices for {provider}.
+
+## CRITICAL PRINCIPLES - MUST FOLLOW:
+
+### 1. MODULE ARCHITECTURE
+- **Self-contained modules**: Each module manages its own resources independently
+- **No cross-module resource references**: NEVER reference resources across modules directly
+- **Variable passing**: Pass resource IDs/ARNs between modules using outputs → variables
+- **Standard structure**: Each module MUST have main.tf, variables.tf, outputs.tf
+
+Example module wiring:
+```
+Root main.tf → module "networking" → outputs subnet_id
+             → module "compute" (receives var.subnet_id) → outputs cluster_id
+             → module "monitoring" (receives var.cluster_id)
+```
+
+### 2. USE MODERN, NON-DEPRECATED RESOURCES
+**Critical**: Research and use ONLY the latest resource types for {provider}:
+
+- **Azure AKS**: Use `default_node_pool` block (NOT deprecated `agent_pool_profile`)
+- **Azure AKS Auth**: Use `identity` block with `SystemAssigned` or `UserAssigned` (NOT deprecated `service_principal`)
+- **Azure PostgreSQL**: Use `azurerm_postgresql_flexible_server` (NOT deprecated `azurerm_postgresql_server`)
+- **Azure MySQL**: Use `azurerm_mysql_flexible_server` (NOT deprecated `azurerm_mysql_server`)
+- **AWS RDS**: Use `aws_db_instance` with current engine versions
+- **GCP Cloud SQL**: Use `google_sql_database_instance` with current versions
+
+### 3. NETWORKING & CONNECTIVITY
+- **VNet/VPC integration**: Wire compute resources to subnets via variables
+- **Private endpoints**: Use for databases and storage in production environments
+- **Security groups/NSGs**: Define with least-privilege rules
+- **Subnet passing**: networking module outputs → compute/database modules receive as variables
+
+### 4. MONITORING & OBSERVABILITY
+**Use proper monitoring resources for {provider}:**
+
+- **Azure**: Use `azurerm_log_analytics_workspace` for centralized logging
+  * Wire diagnostic settings to Log Analytics (NOT storage accounts)
+  * Enable Container Insights for AKS clusters
+  * Pass workspace_id from monitoring module to other modules
+
+- **AWS**: Use CloudWatch Log Groups and Container Insights for EKS
+  * Enable cluster logging for EKS
+  * Use CloudWatch alarms for critical metrics
+
+- **GCP**: Use Cloud Logging and Cloud Monitoring
+  * Enable GKE logging and monitoring
+  * Use Log sinks for centralized logging
+
+### 5. SECURITY BEST PRACTICES
+- **Managed identities**: Use managed/workload identities instead of service principals with secrets
+- **Key Vault/Secrets Manager**: Enable soft-delete and purge-protection
+- **Encryption**: Enable at-rest encryption for all storage and databases
+- **Network security**: Use network ACLs/security groups with deny-by-default
+- **Container registry integration**: Grant appropriate pull permissions (e.g., AcrPull for AKS)
+
+### 6. DATABASE CONFIGURATION
+- **High availability**: Use zone-redundant or multi-AZ configurations for production
+- **Backups**: Enable automated backups with appropriate retention
+- **Versions**: Use current stable versions (PostgreSQL 14/15/16, MySQL 8.0, etc.)
+- **Storage**: Configure appropriate storage sizes based on scale tier
+
+### 7. SCALE-APPROPRIATE SIZING
+- **Small scale ({scale})**: 
+  * Cost-optimized SKUs (B-series, burstable instances)
+  * Single region, basic redundancy
+  * Minimal node counts (1-3 nodes)
+  
+- **Medium scale**: 
+  * Balanced SKUs (Standard/General Purpose)
+  * Multi-AZ deployment
+  * Autoscaling enabled (3-10 nodes)
+  * Caching layer if applicable
+  
+- **Large scale**: 
+  * Performance SKUs (Premium, compute-optimized)
+  * Multi-region with geo-replication
+  * Advanced autoscaling (5-50 nodes)
+  * CDN and advanced monitoring
+
+### 8. OUTPUT FORMAT
+Use clear file separators for organization:
+
+```
+### FILE: main.tf
+# Root Terraform configuration
+# Calls all modules and wires them together
+
+### FILE: variables.tf
+# Root-level variables (region, environment, etc.)
+
+### FILE: outputs.tf
+# Root-level outputs (expose key resources)
+
+### FILE: modules/networking/main.tf
+# VPC/VNet, subnets, security groups
+
+### FILE: modules/networking/variables.tf
+# Networking input variables
+
+### FILE: modules/networking/outputs.tf
+# Export: subnet_ids, vpc_id, security_group_ids
+
+### FILE: modules/compute/main.tf
+# Compute resources (AKS/EKS/GKE, App Service, etc.)
+
+### FILE: modules/compute/variables.tf
+# Input: subnet_id (from networking module)
+
+### FILE: modules/compute/outputs.tf
+# Export: cluster_id, cluster_endpoint, managed_identity_id
+
+### FILE: modules/database/main.tf
+# Database resources (flexible servers, RDS, Cloud SQL)
+
+### FILE: modules/database/variables.tf
+# Input: subnet_id, security_group_id
+
+### FILE: modules/database/outputs.tf
+# Export: connection_string, database_id
+
+### FILE: modules/security/main.tf
+# Key Vault, Secrets Manager, IAM roles, ACR/ECR
+
+### FILE: modules/security/variables.tf
+# Input: managed_identity_id (if applicable)
+
+### FILE: modules/security/outputs.tf
+# Export: key_vault_id, registry_id
+
+### FILE: modules/monitoring/main.tf
+# Log Analytics, CloudWatch, Application Insights
+
+### FILE: modules/monitoring/variables.tf
+# Input: cluster_id, resource_ids to monitor
+
+### FILE: modules/monitoring/outputs.tf
+# Export: workspace_id, monitoring_endpoint
+
+[Include other modules as needed: storage, cache, load_balancing]
+```
+
+## QUALITY CHECKLIST:
+Before generating, verify:
+- ✅ All resource types are current (not deprecated)
+- ✅ No direct cross-module resource references
+- ✅ All modules receive inputs via variables
+- ✅ All modules expose outputs for other modules to consume
+- ✅ Monitoring wired to proper logging infrastructure
+- ✅ Security follows {provider} best practices
+- ✅ Scale tier ({scale}) reflected in SKU/instance sizing
+- ✅ Each module is independently valid and reusable
+
+## IMPORTANT NOTES:
+- Base decisions 90% on the project description; infer missing infrastructure intelligently
+- Use ONLY resources appropriate for {provider}
+- Reference the official {provider} Terraform provider documentation mentally
+- Ensure all resource names are valid for {provider} (e.g., ACR names must be alphanumeric)
+- Include data sources where needed (e.g., azurerm_client_config for Azure)
+- Add comments explaining key architectural decisions and why you chose specific resources
+
+Output ONLY valid Terraform HCL code with file separators. No explanations outside comments.
+""".strip()
+
+    return terraform_prompt
+
+
+@template(
+    "cli",
+    version="1",
+    model="gpt-4o",
+    temperature=0.3,
+    max_tokens=16000,
+    system="You are a senior Cloud SRE and infrastructure automation expert. Read the user's project description word-by-word and implement EVERY requirement they mentioned. Output only a single robust Bash script with no extra text.",
+    budgeted=("description", "structure"),
+)
+def cli_template(provider, description, scale, loading, structure) -> str:
+    cli_prompt = f"""
+You are a senior Cloud SRE. Generate a SINGLE Linux Bash CLI script that provisions the complete production infrastructure for the project described below. The script must use the correct cloud CLI for the provider ({provider}):
+
+- Azure → az
+- AWS → aws
+- Google Cloud → gcloud
+
+Context:
+- Cloud provider: {provider}
+- Scale tier: {scale}
+- Loading pressure: {loading}
+
+**PRIMARY SOURCE OF TRUTH - READ EVERY WORD CAREFULLY:**
+Project description: {description}
+
+**SECONDARY REFERENCE (for folder organization hints only):**
+Project structure (if available):
+{structure}
+
+GOAL:
+Create a production-ready CLI that builds ALL infrastructure requirements explicitly stated or clearly implied in the PROJECT DESCRIPTION above. Read EVERY detail the user wrote - database types, specific services, networking requirements, monitoring needs, container registries, CDN, identity/auth, secrets management, etc.
+
+The project structure is ONLY a folder layout reference. Your primary job is to implement EVERYTHING the user described in their requirements.
+
+STRICT REQUIREMENTS:
+1) Output ONLY a single Bash script with shebang (#!/usr/bin/env bash). No commentary outside script.
+2) Use: set -uo pipefail; IFS=$'\n\t'  # do NOT -e; we will keep going to maximize coverage
+3) Accept flags: --env (dev|staging|prod), --region, --name-prefix
+4) Validate prerequisites: correct CLI installed and logged in; print a clear error and exit if missing
+5) Creation policy: attempt resource creation UNCONDITIONALLY (no pre-checks). If the CLI returns an "already exists" error, TREAT AS SUCCESS and continue. Do not query for existence upfront.
+6) Safe defaults by provider and scale; choose sensible SKUs; parametrize where helpful
+7) Tag/label resources with environment and app name where supported
+8) Implement a run_step helper that executes commands, records success/failure without stopping the script, and logs human-friendly messages. Do not hard fail on individual step errors.
+9) At the END, print a coverage summary with percentage = (successful_steps / total_steps * 100). TARGET >= 95%. List failed steps so the user can retry them.
+10) Never echo secrets; avoid inline passwords; generate if needed and print retrieval instruction
+11) Keep it concise and readable; group by module; add helpful comments in the script
+
+CRITICAL REQUIREMENTS CHECKLIST (scan the description and implement ALL mentioned items):
+
+DATABASE:
+- If PostgreSQL mentioned → Azure Database for PostgreSQL Flexible Server (v16), NOT Azure SQL
+- If MySQL mentioned → Azure Database for MySQL Flexible Server (v8.0), NOT Azure SQL
+- If SQL Server/MSSQL mentioned → Azure SQL Database
+- If MongoDB/Cosmos mentioned → Cosmos DB with appropriate API
+- Store credentials in Key Vault/Secrets Manager; NEVER print them; output retrieval instruction
+
+CONTAINER REGISTRY & IMAGE PULL:
+- If containers/Docker/images mentioned → create ACR/ECR/Artifact Registry
+- Azure ACR: DISABLE admin user; create Managed Identity for App Service/AKS; grant AcrPull role assignment
+- AWS ECR: grant task/instance role ecr:GetAuthorizationToken, ecr:BatchGetImage, ecr:GetDownloadUrlForLayer
+- GCP Artifact Registry: grant service account artifactregistry.reader
+- Wire compute to pull images via identity/role (NO usernames/passwords)
+
+STATIC SITE & CDN:
+- If static site/frontend/web mentioned → enable Static Website on storage account
+- Set index document (index.html) and error document (404.html)
+- If CDN mentioned → create Azure Front Door/CloudFront/Cloud CDN with origin pointing to storage $web endpoint (NOT blob.core.windows.net)
+- Configure caching rules and HTTPS
+
+MONITORING & APPLICATION INSIGHTS:
+- Always create Log Analytics Workspace first
+- Create Application Insights and link it using the Log Analytics RESOURCE ID (not name)
+- Use correct CLI syntax: for Azure, pass --workspace as the full resource ID
+- Wire App Insights connection string to App Service via app settings (APPLICATIONINSIGHTS_CONNECTION_STRING)
+- Enable diagnostic settings for databases, storage, and compute
+
+IDENTITY & SECRETS:
+- App Service/Web App: enable System-Assigned Managed Identity
+- Store all secrets in Key Vault/Secrets Manager/Secret Manager
+- Grant the managed identity/role access to Key Vault secrets
+- Never use fake/placeholder connection strings; generate real ones and store in vault
+
+SECURITY & NETWORKING:
+- Enforce HTTPS-only on App Service/Web Apps
+- Configure health check endpoint (e.g., /health or /api/health)
+- Use private endpoints for databases if networking/vnet mentioned
+- Create NSGs/Security Groups with least-privilege rules
+- Enable minimum TLS version (1.2+)
+
+PROVIDER-SPECIFIC RULES FOR {provider}:
+
+Azure:
+- Resource Group first
+- VNet + Subnet (if multi-tier or DB mentioned)
+- PostgreSQL Flexible Server (NOT old PostgreSQL Server resource)
+- MySQL Flexible Server (NOT old MySQL Server resource)
+- ACR with admin disabled + managed identity + AcrPull
+- Storage Account with Static Website enabled (if static site mentioned)
+- Front Door with origin = storage $web endpoint (if CDN mentioned)
+- Log Analytics Workspace → Application Insights linked via resource ID
+- Key Vault with soft-delete and purge-protection
+- App Service with managed identity, HTTPS-only, health check, App Insights connection string
+
+AWS:
+- VPC + Subnets + Security Groups
+- RDS (PostgreSQL/MySQL with current versions)
+- ECR with IAM role for pull
+- S3 bucket with website hosting enabled (if static)
+- CloudFront with origin = S3 website endpoint (if CDN)
+- CloudWatch Logs + Alarms
+- Secrets Manager for DB creds
+- ECS/Fargate or Elastic Beanstalk with task role for ECR pull
+
+Google Cloud:
+- VPC + Subnets + Firewall rules
+- Cloud SQL (PostgreSQL/MySQL current versions)
+- Artifact Registry with service account reader
+- Cloud Storage with website config (if static)
+- Cloud CDN with backend = storage (if CDN)
+- Cloud Logging + Monitoring
+- Secret Manager for credentials
+- Cloud Run or GKE with service account for registry pullOUTPUT FORMAT:
+Print ONLY the script. No Markdown, no triple backticks, no explanations.
+""".strip()
+
+    return cli_prompt
+
+
+@template(
+    "terraform_root",
+    version="1",
+    model="gpt-4o",
+    temperature=0.5,
+    max_tokens=4000,
+    system="You are an expert Infrastructure as Code engineer. Output only valid Terraform HCL for the root configuration, with clear file separators.",
+    budgeted=("description", "structure"),
+)
+def terraform_root_template(provider, description, scale, loading, structure, modules) -> str:
+    root_prompt = f"""
+You are an expert DevOps and Infrastructure as Code (Terraform) engineer specializing in {provider}.
+
+**PRIMARY SOURCE (90% weight) - Read every word:**
+Project description: {description}
+
+Context:
+- Cloud provider: {provider}
+- Expected scale: {scale}
+- Loading pressure: {loading}
+
+**SECONDARY REFERENCE (module organization):**
+Project structure:
+{structure}
+
+The modules below are being generated separately, at the same time as this answer. Each lives in modules/<name>/ with main.tf, variables.tf and outputs.tf:
+{modules}
+
+YOUR MISSION:
+Generate ONLY the root Terraform configuration that wires these modules together:
+- main.tf: terraform and provider blocks with current provider versions for {provider}, then one module block per module above with `source = "./modules/<name>"`
+- Pass resource IDs between modules using module outputs → module input variables (e.g. networking subnet IDs into compute and database); use the output names listed above
+- variables.tf: root-level variables (region, environment, name prefix, scale-dependent sizing)
+- outputs.tf: expose the key endpoints and IDs
+
+Do NOT generate any files under modules/.
+
+OUTPUT FORMAT:
+```
+### FILE: main.tf
+### FILE: variables.tf
+### FILE: outputs.tf
+```
+
+Output ONLY valid Terraform HCL code with file separators. No explanations outside comments.
+""".strip()
+
+    return root_prompt
+
+
+@template(
+    "terraform_module",
+    version="1",
+    model="gpt-4o",
+    temperature=0.5,
+    max_tokens=4000,
+    system="You are an expert Infrastructure as Code engineer. Output only valid Terraform HCL for a single self-contained module, with clear file separators.",
+    budgeted=("description", "structure"),
+)
+def terraform_module_template(provider, description, scale, loading, structure, modules, module, purpose, outputs) -> str:
+    module_prompt = f"""
+You are an expert DevOps and Infrastructure as Code (Terraform) engineer specializing in {provider}.
+
+**PRIMARY SOURCE (90% weight) - Read every word:**
+Project description: {description}
+
+Context:
+- Cloud provider: {provider}
+- Expected scale: {scale}
+- Loading pressure: {loading}
+
+**SECONDARY REFERENCE (module organization):**
+Project structure:
+{structure}
+
+All modules of this project (each is generated separately; the root configuration wires them together):
+{modules}
+
+YOUR MISSION:
+Generate ONLY the `{module}` module ({purpose or "as implied by its name and the project description"}).
+- Self-contained: NEVER reference resources of other modules directly; take their IDs as input variables
+- Expose {outputs or "the IDs and endpoints other modules need"} in outputs.tf, using the listed output names
+- Use ONLY current, non-deprecated resource types for {provider}
+- Security: managed identities/IAM roles, encryption at rest, least-privilege network rules, soft-delete and purge protection for secrets
+- Size for the {scale} scale tier (cost-optimized for small, multi-AZ and autoscaling for medium, performance SKUs and multi-region for large)
+- Add comments explaining key architectural decisions
+
+OUTPUT FORMAT:
+```
+### FILE: modules/{module}/main.tf
+### FILE: modules/{module}/variables.tf
+### FILE: modules/{module}/outputs.tf
+```
+
+Output ONLY valid Terraform HCL code with file separators. No explanations outside comments.
+""".strip()
+
+    return module_prompt
@@ -0,0 +1,103 @@
+# result_parser.py
+"""Readable export form of stored generation results.
+
+``/history/export`` turns each stored answer into structured JSON: tree lines
+for structures, ``### FILE:`` sections for Terraform, shebang plus lines for
+the CLI script. Exports run over whole histories, so the parser splits each
+document once, finds the code fence and the file headers with precompiled
+patterns, and builds no intermediate copies of the text.
+"""
+import re
+
+_OPENING_FENCE = re.compile(r"\s*```")
+_FILE_HEADER = re.compile(r"^###\s*FILE:\s*(.+)$")
+
+
+def _trimmed(lines: list[str], start: int, end: int) -> list[str]:
+    """``"\\n".join(lines[start:end]).strip().splitlines()``, without the join."""
+    while start < end and not lines[start].strip():
+        start += 1
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    core = lines[start:end]
+    if core:
+        core[0] = core[0].lstrip()
+        core[-1] = core[-1].rstrip()
+    return core
+
+
+def _plain_lines(text: str | None) -> list[str]:
+    """The lines of ``strip_code_fences(text)``."""
+    if not text:
+        return []
+    if not _OPENING_FENCE.match(text):
+        return text.splitlines()
+    lines = text.splitlines()
+    start = 0
+    while not lines[start].strip():
+        start += 1
+    end = start + 1
+    while end < len(lines) and not lines[end].lstrip().startswith("```"):
+        end += 1
+    return _trimmed(lines, start + 1, end)
+
+
+def strip_code_fences(text: str | None) -> str:
+    """The body of a fenced answer (up to the closing fence), or the text unchanged."""
+    if not text:
+        return ""
+    if not _OPENING_FENCE.match(text):
+        return text
+    return "\n".join(_plain_lines(text))
+
+
+def _terraform_files(lines: list[str]) -> list[dict]:
+    files = []
+    path, content = None, None
+    for line in lines:
+        if "###" in line:
+            m = _FILE_HEADER.match(line.strip())
+            if m:
+                if content is not None:
+                    files.append(_file(path, content))
+                path, content = m.group(1).strip(), []
+                continue
+        if content is None:
+            # content before the first header
+            path, content = "_root.tf", []
+        content.append(line.rstrip())
+    if content is not None:
+        files.append(_file(path, content))
+    return files
+
+
+def _file(path: str, content: list[str]) -> dict:
+    while content and not content[-1]:
+        content.pop()
+    return {"path": path, "content": content}
+
+
+def normalize_result(item_type: str | None, raw: str | None, include_raw: bool = False) -> dict:
+    """Readable structure of one stored result for the JSON export.
+
+    - structure: tree lines (code fences removed)
+    - terraform: files split on ``### FILE: <path>`` headers, content as lines
+    - cli: shebang and lines
+    - others: the text with code fences removed
+
+    ``raw`` is added for the first three when ``include_raw`` is set.
+    """
+    kind = (item_type or "").lower()
+    if kind == "structure":
+        out = {"format": "tree", "lines": [line.rstrip() for line in _plain_lines(raw)]}
+    elif kind == "terraform":
+        out = {"format": "terraform", "files": _terraform_files(_plain_lines(raw))}
+    elif kind == "cli":
+        lines = [line.rstrip() for line in _plain_lines(raw)]
+        shebang = lines[0] if lines and lines[0].startswith("#!") else None
+        out = {"format": "bash", "shebang": shebang, "lines": lines[1:] if shebang else lines}
+    else:
+        return {"format": "text", "text": strip_code_fences(raw)}
+    if include_raw:
+        out["raw"] = raw
+    return out
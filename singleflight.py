@@ -0,0 +1,189 @@
+# singleflight.py
+"""Coalesce identical in-flight generations.
+
+Within a process, the first request for a key becomes the *leader* and runs
+the generation; concurrent requests for the same key become *followers* of
+its ``Flight``, replaying the streamed chunks as they arrive and receiving
+the same final answer.
+
+Across gunicorn workers and pods, leaders also claim the key in a shared
+lock table (``SharedFlightLocks``, see ``LLMInflight``). A worker that finds
+the key claimed elsewhere polls for the other leader's answer (via the
+shared LLM cache tier) instead of calling the model, and takes over if the
+claim is released without an answer or expires.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+
+class Flight:
+    """One in-flight generation: chunks published by the leader, replayed to followers."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.chunks: list[str] = []
+        self.done = False
+        self.result = None
+        self.error: BaseException | None = None
+        self.shared_claim = False
+
+    def publish(self, chunk: str) -> None:
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, result) -> None:
+        with self._cond:
+            self.result = result
+            self.done = True
+            self._cond.notify_all()
+
+    def fail(self, error: BaseException) -> None:
+        with self._cond:
+            if self.done:
+                return
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def follow(self, timeout: float):
+        """Yield ``("delta", chunk)`` for every chunk, then ``("done", result)``.
+
+        Re-raises the leader's error; raises ``TimeoutError`` if the flight
+        does not finish within ``timeout`` seconds.
+        """
+        seen = 0
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while seen >= len(self.chunks) and not self.done:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("coalesced generation did not finish in time")
+                    self._cond.wait(remaining)
+                new = self.chunks[seen:]
+                seen += len(new)
+                done = self.done
+            for chunk in new:
+                yield "delta", chunk
+            if done:
+                if self.error is not None:
+                    raise self.error
+                yield "done", self.result
+                return
+
+
+class SharedFlightLocks:
+    """Cross-process claims on a key, stored in the ``llm_inflight`` table (Postgres only)."""
+
+    def __init__(self, engine, model, ttl: float = 330):
+        self.engine = engine
+        self.model = model
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def acquire(self, key: str) -> bool:
+        from sqlalchemy.dialects.postgresql import insert
+
+        now = datetime.utcnow()
+        stmt = insert(self.model).values(key=key, owner=self.owner, expires_at=now + timedelta(seconds=self.ttl))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["key"],
+            set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+            where=self.model.expires_at < now,  # take over only expired claims
+        ).returning(self.model.owner)
+        with Session(self.engine) as s:
+            row = s.execute(stmt).first()
+            s.commit()
+        return row is not None and row.owner == self.owner
+
+    def held(self, key: str) -> bool:
+        with Session(self.engine) as s:
+            row = s.get(self.model, key)
+            return row is not None and row.expires_at >= datetime.utcnow()
+
+    def release(self, key: str) -> None:
+        with Session(self.engine) as s:
+            s.query(self.model).filter(self.model.key == key, self.model.owner == self.owner).delete(
+                synchronize_session=False
+            )
+            s.commit()
+
+
+class SingleFlight:
+    def __init__(self, shared: SharedFlightLocks | None = None, wait_timeout: float = 330, poll_interval: float = 0.5):
+        self.shared = shared
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._flights: dict[str, Flight] = {}
+        self._counters = {"leaders": 0, "followers_local": 0, "followers_shared": 0, "shared_timeouts": 0, "errors": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def begin(self, key: str) -> tuple[Flight, bool]:
+        """Return ``(flight, is_leader)`` for ``key`` in this process."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._counters["followers_local"] += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self._counters["leaders"] += 1
+            return flight, True
+
+    def claim_shared(self, key: str, flight: Flight, fetch):
+        """Claim ``key`` across workers, or wait for the worker that holds it.
+
+        Returns the other worker's answer (from ``fetch()``), or None once this
+        process holds the claim, or has given up waiting, and should generate.
+        """
+        if self.shared is None:
+            return None
+        deadline = time.monotonic() + self.wait_timeout
+        try:
+            while True:
+                if self.shared.acquire(key):
+                    flight.shared_claim = True
+                    return None
+                while True:
+                    if time.monotonic() >= deadline:
+                        self._count("shared_timeouts")
+                        return None
+                    time.sleep(self.poll_interval)
+                    answer = fetch()
+                    if answer is not None:
+                        self._count("followers_shared")
+                        return answer
+                    if not self.shared.held(key):
+                        break  # leader finished without a usable answer or died: try to take over
+        except Exception as e:
+            print(">>> WARN: shared in-flight lock unavailable, generating without it:", e)
+            self._count("errors")
+            return None
+
+    def end(self, key: str, flight: Flight) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        if flight.shared_claim and self.shared is not None:
+            try:
+                self.shared.release(key)
+            except Exception as e:
+                print(">>> WARN: failed to release shared in-flight lock:", e)
+                self._count("errors")
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._counters)
+            out["in_flight"] = len(self._flights)
+        out["shared"] = self.shared is not None
+        return out
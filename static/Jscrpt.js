@@ -438,6 +438,63 @@ $(document).ready(function() {
         if (navigator.clipboard) navigator.clipboard.writeText(txt);
     });
 
+    // Stream a generation endpoint as Server-Sent Events. Calls onDelta with the
+    // text accumulated so far and resolves with the final "done" payload.
+    function streamGeneration(url, data, onDelta) {
+        return fetch(url + '?stream=1', {
+            method: 'POST',
+            headers: { 'Accept': 'text/event-stream' },
+            body: new URLSearchParams(data)
+        }).then(function(res) {
+            const contentType = res.headers.get('Content-Type') || '';
+            if (!res.ok || contentType.indexOf('text/event-stream') === -1) {
+                return res.json().then(function(body) {
+                    throw new Error((body && body.error) || ('HTTP ' + res.status));
+                });
+            }
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let text = '';
+            let done = null;
+            function pump() {
+                return reader.read().then(function(chunk) {
+                    if (chunk.done) {
+                        if (!done) throw new Error('Stream ended unexpectedly.');
+                        return done;
+                    }
+                    buffer += decoder.decode(chunk.value, { stream: true });
+                    let sep;
+                    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+                        const raw = buffer.slice(0, sep);
+                        buffer = buffer.slice(sep + 2);
+                        let event = 'message';
+                        let payload = '';
+                        raw.split('\n').forEach(function(line) {
+                            if (line.startsWith('event: ')) event = line.slice(7);
+                            else if (line.startsWith('data: ')) payload += line.slice(6);
+                        });
+                        if (!payload) continue;
+                        const msg = JSON.parse(payload);
+                        if (event === 'error') throw new Error(msg.error || 'Generation failed.');
+                        if (event === 'done') done = msg;
+                        else if (event === 'message' && msg.delta) {
+                            text += msg.delta;
+                            onDelta(text);
+                        }
+                    }
+                    return pump();
+                });
+            }
+            return pump();
+        });
+    }
+
+    function showStreamingText($box, $card, text) {
+        $box.text(text);
+        $card.removeClass('hidden');
+    }
+
     $('#generate-terraform-btn').on('click', function(event) {
         event.preventDefault();
         const $btn = $(this);
@@ -459,28 +516,21 @@ $(document).ready(function() {
             description: $('#description').val(),
             structure: structure
         };
-        $.ajax({
-            url: '/terraform',
-            method: 'POST',
-            data: data,
-            success: function(response) {
-                if (response.terraform) {
-                    updateToast(toastId, 'success', 'Terraform Generated!', 'Infrastructure code is ready to deploy.');
-                    showTerraform(response.terraform);
-                } else if (response.error) {
-                    updateToast(toastId, 'error', 'Generation Failed', response.error);
-                    showTerraform('Error: ' + response.error);
-                } else {
-                    updateToast(toastId, 'error', 'No Response', 'Server returned empty response.');
-                    showTerraform('No response from server.');
-                }
-                $btn.prop('disabled', false);
-            },
-            error: function(xhr) {
-                updateToast(toastId, 'error', 'Request Failed', xhr.responseText || 'Network error occurred.');
-                showTerraform('Request failed: ' + xhr.responseText);
-                $btn.prop('disabled', false);
+        streamGeneration('/terraform', data, function(text) {
+            showStreamingText($('#terraform-text'), $('#terraform-card'), text);
+        }).then(function(response) {
+            if (response.terraform) {
+                updateToast(toastId, 'success', 'Terraform Generated!', 'Infrastructure code is ready to deploy.');
+                showTerraform(response.terraform);
+            } else {
+                updateToast(toastId, 'error', 'No Response', 'Server returned empty response.');
+                showTerraform('No response from server.');
             }
+            $btn.prop('disabled', false);
+        }).catch(function(err) {
+            updateToast(toastId, 'error', 'Generation Failed', err.message || 'Network error occurred.');
+            showTerraform('Error: ' + (err.message || 'Request failed.'));
+            $btn.prop('disabled', false);
         });
     });
 
@@ -505,28 +555,21 @@ $(document).ready(function() {
             description: $('#description').val(),
             structure: structure
         };
-        $.ajax({
-            url: '/infra_cli',
-            method: 'POST',
-            data: data,
-            success: function(response) {
-                if (response.cli) {
-                    updateToast(toastId, 'success', 'Infra CLI Ready!', 'Linux CLI script generated successfully.');
-                    showCli(response.cli);
-                } else if (response.error) {
-                    updateToast(toastId, 'error', 'Generation Failed', response.error);
-                    showCli('Error: ' + response.error);
-                } else {
-                    updateToast(toastId, 'error', 'No Response', 'Server returned empty response.');
-                    showCli('No response from server.');
-                }
-                $btn.prop('disabled', false);
-            },
-            error: function(xhr) {
-                updateToast(toastId, 'error', 'Request Failed', xhr.responseText || 'Network error occurred.');
-                showCli('Request failed: ' + xhr.responseText);
-                $btn.prop('disabled', false);
+        streamGeneration('/infra_cli', data, function(text) {
+            showStreamingText($('#cli-text'), $('#cli-card'), text);
+        }).then(function(response) {
+            if (response.cli) {
+                updateToast(toastId, 'success', 'Infra CLI Ready!', 'Linux CLI script generated successfully.');
+                showCli(response.cli);
+            } else {
+                updateToast(toastId, 'error', 'No Response', 'Server returned empty response.');
+                showCli('No response from server.');
             }
+            $btn.prop('disabled', false);
+        }).catch(function(err) {
+            updateToast(toastId, 'error', 'Generation Failed', err.message || 'Network error occurred.');
+            showCli('Error: ' + (err.message || 'Request failed.'));
+            $btn.prop('disabled', false);
         });
     });
 
@@ -737,17 +780,30 @@ $(document).ready(function() {
         return text;
     }
 
-    // Load history function (for history page)
-    window.loadHistory = function() {
+    // Load history function (for history page). Pages carry summaries only;
+    // full input/output is fetched from /history/<id> when an item is opened.
+    const historyState = { filter: 'all', cursor: null, items: [] };
+    const historyDetails = {};
+
+    window.loadHistory = function(filter, append) {
+        if (filter !== undefined) historyState.filter = filter;
+        if (!append) {
+            historyState.cursor = null;
+            historyState.items = [];
+        }
         const toastId = showToast('loading', 'Loading History', 'Fetching your recent activity...', 0);
+        const params = { type: historyState.filter, limit: 20 };
+        if (historyState.cursor) params.cursor = historyState.cursor;
         $.ajax({
             url: '/history',
             method: 'GET',
+            data: params,
             success: function(payload) {
                 try {
                     const items = (payload && payload.history) ? payload.history : [];
-                    window.__historyItems = items; // cache for filtering
-                    renderHistory('all');
+                    historyState.items = historyState.items.concat(items);
+                    historyState.cursor = payload.next_cursor || null;
+                    renderHistory();
                     updateToast(toastId, 'success', 'History Loaded', 'Recent activity displayed.');
                 } catch (e) {
                     updateToast(toastId, 'error', 'History Error', 'Could not parse history.');
@@ -759,8 +815,29 @@ $(document).ready(function() {
         });
     };
 
-    function renderHistory(filter) {
-        const items = (window.__historyItems || []).filter(it => filter === 'all' ? true : it.type === filter);
+    function fetchHistoryDetail(id) {
+        if (historyDetails[id]) return $.Deferred().resolve(historyDetails[id]).promise();
+        return $.getJSON('/history/' + id).then(function(detail) {
+            historyDetails[id] = detail;
+            return detail;
+        });
+    }
+
+    function historyResultText(item) {
+        const text = item.result || 'No output recorded';
+        return item.type === 'structure' ? stripCodeFences(text) : text;
+    }
+
+    function historyDownloadText(item) {
+        // For cost/performance/structure include both input and output
+        const includeIO = ['cost', 'performance', 'structure'].includes(item.type);
+        return includeIO
+            ? `Input\n${item.prompt || 'No input recorded'}\n\nOutput\n${historyResultText(item)}`
+            : (item.result || '');
+    }
+
+    function renderHistory() {
+        const items = historyState.items;
         const $list = $('#history-list');
         if (items.length === 0) {
             $list.html('<p style="color:#666;">No history yet for this filter.</p>');
@@ -783,50 +860,66 @@ $(document).ready(function() {
                 item.country ? `<span class="badge">${escapeHtml(item.country)}</span>` : ''
             ].join('');
 
-            const inputText = item.prompt || 'No input recorded';
-            const inputHtml = escapeHtml(inputText);
-            let resultText = item.result || 'No output recorded';
-            // Special handling for structure: strip code fences and render as code block (no wrap)
             const isStructure = item.type === 'structure';
-            if (isStructure) {
-                resultText = stripCodeFences(resultText);
-            }
-            const resultHtml = escapeHtml(resultText);
-
-            // Build download payload: for cost/performance/structure include both input and output
-            const includeIO = ['cost', 'performance', 'structure'].includes(item.type);
-            const downloadText = includeIO
-                ? `Input\n${inputText}\n\nOutput\n${resultText}`
-                : (item.result || '');
+            const inputHtml = escapeHtml(item.prompt_preview || 'No input recorded');
+            const resultHtml = escapeHtml(item.result_preview || 'No output recorded');
 
             html += `
-                <div class="history-item">
+                <div class="history-item" data-id="${item.id}">
                     <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:6px;">
                         <div class="title">${typeLabel}</div>
                         <div class="meta">${ts}</div>
                     </div>
                     <div class="badges">${badges}</div>
-                    <details>
+                    <details data-part="prompt">
                         <summary> Input</summary>
-                        <pre class="${isStructure ? '' : ''}" style="max-height:220px; overflow:auto">${inputHtml}</pre>
+                        <pre style="max-height:220px; overflow:auto">${inputHtml}</pre>
                     </details>
-                    <details>
+                    <details data-part="result">
                         <summary> Output</summary>
                         <pre class="${isStructure ? 'code-block' : ''}" style="max-height:${isStructure ? '520px' : '380px'}; overflow:auto">${resultHtml}</pre>
                     </details>
                     <div style="margin-top:10px; display:flex; gap:8px;">
-                        <button class="btn" data-copy="${items.indexOf(item)}">Copy Output</button>
-                        <a class="btn" href="data:text/plain;charset=utf-8,${encodeURIComponent(downloadText)}" download="${item.type}_${item.id}.txt">Download</a>
+                        <button class="btn" data-copy="${item.id}">Copy Output</button>
+                        <button class="btn" data-download="${item.id}">Download</button>
+                        ${['terraform', 'structure', 'cli'].includes(item.type) ? `<a class="btn" href="/history/${item.id}/zip">Download ZIP</a>` : ''}
                     </div>
                 </div>`;
         });
+        if (historyState.cursor) {
+            html += '<div style="text-align:center; margin-top:12px;"><button class="btn" id="history-more">Load more</button></div>';
+        }
         $list.html(html);
 
-        // Copy handlers
+        // Fill in the full text the first time a section is opened
+        $list.find('details').on('toggle', function() {
+            if (!this.open) return;
+            const $details = $(this);
+            const id = $details.closest('.history-item').data('id');
+            fetchHistoryDetail(id).then(function(detail) {
+                const text = $details.data('part') === 'prompt'
+                    ? (detail.prompt || 'No input recorded')
+                    : historyResultText(detail);
+                $details.find('pre').text(text);
+            });
+        });
         $list.find('button[data-copy]').on('click', function(){
-            const idx = Number($(this).attr('data-copy'));
-            const it = items[idx];
-            if (it && navigator.clipboard) navigator.clipboard.writeText(it.result || '');
+            fetchHistoryDetail(Number($(this).attr('data-copy'))).then(function(detail) {
+                if (navigator.clipboard) navigator.clipboard.writeText(detail.result || '');
+            });
+        });
+        $list.find('button[data-download]').on('click', function(){
+            fetchHistoryDetail(Number($(this).attr('data-download'))).then(function(detail) {
+                const blob = new Blob([historyDownloadText(detail)], { type: 'text/plain;charset=utf-8' });
+                const a = document.createElement('a');
+                a.href = URL.createObjectURL(blob);
+                a.download = `${detail.type}_${detail.id}.txt`;
+                a.click();
+                setTimeout(function() { URL.revokeObjectURL(a.href); }, 1000);
+            });
+        });
+        $('#history-more').on('click', function() {
+            loadHistory(undefined, true);
         });
     }
 
@@ -835,7 +928,7 @@ $(document).ready(function() {
         $('.history-toolbar .chip').removeClass('active');
         $(this).addClass('active');
         const filter = $(this).data('filter');
-        renderHistory(filter);
+        loadHistory(filter, false);
     });
     $(document).on('click', '#expand-all', function(){
         $('#history-list details').attr('open', true);
@@ -0,0 +1,270 @@
+# terraform_modules.py
+"""Split Terraform generation per module and stitch the parts back together.
+
+``parse_modules`` reads the ``terraform/modules/`` entries of a ``/structure``
+tree (the structure prompt asks for conventional module names with a comment
+per folder). Each module, plus the root files, is generated separately.
+``stitch_part`` turns each part into the single-answer ``### FILE: <path>``
+format that the history export already parses, so parts can be streamed as
+they finish and joined in order.
+"""
+import hashlib
+import json
+import re
+from typing import NamedTuple
+
+_TREE_PREFIX = re.compile(r"^[\s│├└─]*")
+_FILE_HEADER = re.compile(r"^###\s*FILE:\s*(.+?)\s*$")
+_FENCE = re.compile(r"^\s*```")
+_MODULE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]*$")
+
+
+class Module(NamedTuple):
+    name: str
+    purpose: str  # the folder's comment in the tree, if any
+    outputs: str  # the outputs.tf comment, e.g. "Networking outputs (subnet_id, vpc_id)"
+
+
+def _entry(line: str) -> tuple[int, str, str]:
+    prefix = len(_TREE_PREFIX.match(line).group(0))
+    name, _, comment = line[prefix:].partition("#")
+    return prefix // 4, name.strip(), comment.strip()
+
+
+def parse_modules(structure: str) -> list[Module]:
+    """Module folders listed under ``terraform/modules/`` (or a bare ``modules/``) in a tree."""
+    lines = [line for line in (structure or "").splitlines() if line.strip() and not _FENCE.match(line)]
+    modules: list[Module] = []
+    seen = set()
+    stack: list[tuple[int, str]] = []  # (depth, dir name) of the enclosing folders
+    modules_depth = None
+    current = None
+    for line in lines:
+        depth, name, comment = _entry(line)
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        if modules_depth is not None and depth <= modules_depth:
+            modules_depth = current = None
+        if name.rstrip("/") == "modules" and name.endswith("/"):
+            parents = [d for _, d in stack]
+            if not parents or parents[-1] == "terraform":
+                modules_depth = depth
+        elif modules_depth is not None and depth == modules_depth + 1 and name.endswith("/"):
+            module = name.rstrip("/")
+            current = None
+            if _MODULE_NAME.match(module) and module not in seen:
+                seen.add(module)
+                current = len(modules)
+                modules.append(Module(module, comment, ""))
+        elif current is not None and depth == modules_depth + 2 and name == "outputs.tf":
+            modules[current] = modules[current]._replace(outputs=comment)
+        if name.endswith("/"):
+            stack.append((depth, name.rstrip("/")))
+    return modules
+
+
+_PATH_PART = re.compile(r"^(?=.*\w)[\w.@+-]+$")
+
+
+def tree_paths(structure: str) -> list[str]:
+    """Relative paths of every entry in a tree; directories end with ``/``.
+
+    An entry is a directory if it ends with ``/`` or has children. Entries
+    that are not plain names (``...``, prose) are skipped.
+    """
+    entries = [_entry(line) for line in (structure or "").splitlines() if line.strip() and not _FENCE.match(line)]
+    paths: list[str] = []
+    stack: list[tuple[int, str]] = []
+    for i, (depth, name, _comment) in enumerate(entries):
+        base = name.rstrip("/")
+        if not _PATH_PART.match(base) or base in (".", ".."):
+            continue
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        path = "/".join([d for _, d in stack] + [base])
+        if name.endswith("/") or (i + 1 < len(entries) and entries[i + 1][0] > depth):
+            paths.append(path + "/")
+            stack.append((depth, base))
+        else:
+            paths.append(path)
+    return paths
+
+
+def split_files(text: str, default_path: str) -> list[tuple[str, str]]:
+    """``[(path, content)]`` from a ``### FILE:`` answer; code fences are dropped."""
+    files: list[tuple[str, list[str]]] = []
+    for line in (text or "").splitlines():
+        if _FENCE.match(line):
+            continue
+        m = _FILE_HEADER.match(line.strip())
+        if m:
+            files.append((m.group(1), []))
+            continue
+        if not files:
+            if not line.strip():
+                continue
+            files.append((default_path, []))
+        files[-1][1].append(line.rstrip())
+    return [(path, "\n".join(body).strip("\n")) for path, body in files]
+
+
+def _relative(path: str) -> str:
+    return path.strip().removeprefix("./").removeprefix("terraform/")
+
+
+def _module_path(module: str, path: str) -> str:
+    path = _relative(path)
+    prefix = f"modules/{module}/"
+    if path.startswith(prefix):
+        return path
+    return prefix + path.rsplit("/", 1)[-1]
+
+
+def stitch_part(answer: str, module: str | None = None) -> str:
+    """One generated part as ``### FILE:`` sections with normalized paths.
+
+    Module files are forced under ``modules/<name>/``. The root part keeps
+    only root files, since every module is generated on its own.
+    """
+    files: dict[str, str] = {}
+    if module is None:
+        for path, content in split_files(answer, "main.tf"):
+            path = _relative(path)
+            if not path.startswith("modules/"):
+                files[path] = content
+    else:
+        for path, content in split_files(answer, f"modules/{module}/main.tf"):
+            files[_module_path(module, path)] = content
+    return "\n\n".join(f"### FILE: {path}\n{content}" for path, content in files.items())
+
+
+def section_paths(section: str) -> list[str]:
+    return [path for path, _content in split_files(section, "")]
+
+
+# -- incremental regeneration -----------------------------------------------
+#
+# Each part is cached under a fingerprint of only the inputs that shape it,
+# instead of the whole request. A description sentence belongs to the modules
+# whose keywords it mentions; sentences that mention no module are global and
+# count for every part. Editing a sentence about the database therefore
+# regenerates only the database module and the root, which wires the modules
+# together; the other modules are served from cache.
+
+MODULE_KEYWORDS = {
+    "networking": ("network", "vpc", "vnet", "subnet", "firewall", "nat", "load balanc", "ingress", "dns", "private endpoint"),
+    "compute": ("compute", "aks", "eks", "gke", "kubernetes", "k8s", "vm", "virtual machine", "app service", "container", "fargate", "ecs", "cloud run", "server", "node", "lambda", "function"),
+    "database": ("database", "db", "postgres", "mysql", "sql", "rds", "aurora", "cosmos", "dynamo", "mongo", "replica", "backup"),
+    "security": ("security", "secret", "key vault", "kms", "iam", "identity", "role", "policy", "auth", "encrypt", "certificate", "tls", "ssl"),
+    "monitoring": ("monitor", "logging", "logs", "alert", "metric", "apm", "insight", "cloudwatch", "grafana", "prometheus", "trace", "observab"),
+    "storage": ("storage", "s3", "bucket", "blob", "file", "upload", "object"),
+    "registry": ("registry", "acr", "ecr", "artifact", "image", "docker"),
+    "cdn": ("cdn", "front door", "cloudfront", "static", "edge"),
+    "cache": ("cache", "redis", "memcache", "elasticache", "memorystore", "session"),
+}
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?;])\s+|\n+")
+_WORD = re.compile(r"[a-z][a-z0-9]{3,}")
+
+
+def _sentences(description: str) -> list[str]:
+    out = []
+    for part in _SENTENCE_SPLIT.split(description or ""):
+        sentence = " ".join(part.split()).lower()
+        if sentence:
+            out.append(sentence)
+    return out
+
+
+def _keywords(module: Module) -> tuple[str, ...]:
+    words = {module.name.lower().replace("_", " ").replace("-", " ")}
+    words.update(MODULE_KEYWORDS.get(module.name.lower(), ()))
+    words.update(w for w in _WORD.findall(module.purpose.lower()) if w not in ("resources", "definition", "with"))
+    return tuple(sorted(words))
+
+
+def _mentions(sentence: str, keyword: str) -> bool:
+    return re.search(r"\b" + re.escape(keyword), sentence) is not None
+
+
+def assign_sentences(description: str, modules: list[Module]) -> tuple[dict[str, list[str]], list[str]]:
+    """``({module: sentences}, global sentences)`` for a description."""
+    keywords = {m.name: _keywords(m) for m in modules}
+    per_module: dict[str, list[str]] = {m.name: [] for m in modules}
+    shared: list[str] = []
+    for sentence in _sentences(description):
+        hit = [name for name, words in keywords.items() if any(_mentions(sentence, w) for w in words)]
+        for name in hit:
+            per_module[name].append(sentence)
+        if not hit:
+            shared.append(sentence)
+    return per_module, shared
+
+
+def module_subtree(structure: str, module: str) -> str:
+    """The tree lines of ``modules/<module>/`` and below, without tree drawing characters."""
+    out, depth_of_module = [], None
+    for line in (structure or "").splitlines():
+        if not line.strip() or _FENCE.match(line):
+            continue
+        depth, name, comment = _entry(line)
+        if depth_of_module is not None:
+            if depth <= depth_of_module:
+                break
+            out.append(f"{depth - depth_of_module}:{name}#{comment}")
+        elif name.rstrip("/") == module and name.endswith("/"):
+            depth_of_module = depth
+            out.append(f"0:{name}#{comment}")
+    return "\n".join(out)
+
+
+def root_tree(structure: str) -> str:
+    """The tree lines outside the module folders, without tree drawing characters."""
+    out, stack, modules_depth = [], [], None
+    for line in (structure or "").splitlines():
+        if not line.strip() or _FENCE.match(line):
+            continue
+        depth, name, comment = _entry(line)
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        if modules_depth is not None:
+            if depth > modules_depth:
+                continue
+            modules_depth = None
+        if name.rstrip("/") == "modules" and name.endswith("/"):
+            parents = [d for _, d in stack]
+            if not parents or parents[-1] == "terraform":
+                modules_depth = depth
+        if name.endswith("/"):
+            stack.append((depth, name.rstrip("/")))
+        out.append(f"{depth}:{name}#{comment}")
+    return "\n".join(out)
+
+
+def part_fingerprints(fields: dict, modules: list[Module]) -> list[dict]:
+    """Cache fields for the root part followed by one per module, in ``modules`` order.
+
+    The root wires every module's inputs, so its fingerprint covers each
+    module part's fingerprint as well as the root files of the tree.
+    """
+    per_module, shared = assign_sentences(fields.get("description") or "", modules)
+    context = {k: fields.get(k) or "" for k in ("provider", "scale", "loading")}
+    module_parts = [
+        {
+            **context,
+            "part": m.name,
+            "purpose": m.purpose,
+            "outputs": m.outputs,
+            "subtree": module_subtree(fields.get("structure") or "", m.name),
+            "sentences": shared + per_module[m.name],
+        }
+        for m in modules
+    ]
+    root = {
+        **context,
+        "part": "root",
+        "modules": [[m.name, m.outputs] for m in modules],
+        "tree": root_tree(fields.get("structure") or ""),
+        "module_parts": hashlib.sha256(json.dumps(module_parts, sort_keys=True).encode("utf-8")).hexdigest(),
+        "sentences": shared,
+    }
+    return [root] + module_parts
@@ -0,0 +1,145 @@
+# zip_export.py
+"""Stream generated history items as a ZIP archive of real files.
+
+Terraform answers are split on their ``### FILE:`` headers, a structure
+becomes its tree text plus an empty scaffold of the listed paths, and a CLI
+answer becomes an executable script. The archive is written to a sink that
+``zipfile`` cannot seek, so every entry uses a trailing data descriptor and
+its bytes can be sent as soon as it is compressed. Memory holds at most one
+file, plus the central directory, which ``zipfile`` keeps until the end.
+
+In a multi-item archive each item gets its own folder. With ``dedup`` on,
+a file whose bytes were already written for an *earlier item* is stored once
+and ``manifest.json`` records where the other copies point. Files within one
+item are always written, even when two of them have the same bytes (e.g.
+identical ``versions.tf`` in two modules); ``dedup=False`` writes every copy.
+"""
+import hashlib
+import io
+import json
+import posixpath
+import stat
+import zipfile
+from datetime import datetime
+from typing import Iterable, Iterator, NamedTuple
+
+from result_parser import normalize_result, strip_code_fences
+from terraform_modules import tree_paths
+
+ARCHIVE_TYPES = ("terraform", "structure", "cli")
+CHUNK_BYTES = 64 * 1024
+_ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+class ArchiveItem(NamedTuple):
+    id: int
+    item_type: str
+    result: str
+    created_at: datetime | None
+
+
+class _Sink(io.RawIOBase):
+    """Write-only buffer that ``zipfile`` treats as an unseekable stream."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self.size += len(b)
+        return len(b)
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return out
+
+
+def _safe_path(path: str) -> str | None:
+    """A relative archive path, or None if it would escape the archive root."""
+    path = posixpath.normpath(path.strip().replace("\\", "/")).lstrip("/")
+    if not path or path == "." or path.startswith("../") or path == "..":
+        return None
+    return path
+
+
+def item_files(item_type: str, result: str) -> list[tuple[str, bytes, int]]:
+    """``[(path, data, mode)]`` for one item; directories end with ``/`` and have no data."""
+    kind = (item_type or "").lower()
+    files: list[tuple[str, bytes, int]] = []
+    if kind == "terraform":
+        for f in normalize_result(kind, result)["files"]:
+            path = _safe_path(f["path"])
+            if path is None or (path == "_root.tf" and not any(line.strip() for line in f["content"])):
+                continue
+            files.append((path, ("\n".join(f["content"]) + "\n").encode("utf-8"), 0o644))
+    elif kind == "structure":
+        tree = strip_code_fences(result)
+        files.append(("STRUCTURE.txt", (tree.rstrip() + "\n").encode("utf-8"), 0o644))
+        for path in tree_paths(tree):
+            safe = _safe_path(path)
+            if safe is not None and safe != "STRUCTURE.txt":
+                files.append((safe + "/" if path.endswith("/") else safe, b"", 0o755 if path.endswith("/") else 0o644))
+    elif kind == "cli":
+        script = strip_code_fences(result).rstrip() + "\n"
+        files.append(("provision.sh", script.encode("utf-8"), 0o755))
+    return files
+
+
+def archive_name(item: ArchiveItem) -> str:
+    return f"{item.item_type}-{item.id}"
+
+
+def _zip_info(path: str, mode: int, created_at: datetime | None) -> zipfile.ZipInfo:
+    date_time = created_at.timetuple()[:6] if created_at and created_at.year >= 1980 else _ZIP_EPOCH
+    info = zipfile.ZipInfo(path, date_time=date_time)
+    if path.endswith("/"):
+        info.external_attr = (stat.S_IFDIR | mode) << 16 | 0x10
+        info.compress_type = zipfile.ZIP_STORED
+    else:
+        info.external_attr = (stat.S_IFREG | mode) << 16
+        info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def stream_archive(items: Iterable[ArchiveItem], folders: bool = True, dedup: bool = True,
+                   manifest: bool = True, compresslevel: int = 6) -> Iterator[bytes]:
+    """Yield the ZIP archive of ``items`` in chunks of roughly ``CHUNK_BYTES``."""
+    sink = _Sink()
+    seen: dict[str, tuple[int, str]] = {}  # sha256 of file bytes -> (item id, archive path) first written
+    written: set[str] = set()
+    listing = []
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zf:
+        for item in items:
+            prefix = archive_name(item) + "/" if folders else ""
+            entry = {"id": item.id, "type": item.item_type, "folder": prefix.rstrip("/"), "files": []}
+            for path, data, mode in item_files(item.item_type, item.result):
+                arcname = prefix + path
+                if arcname in written:
+                    continue
+                written.add(arcname)
+                if arcname.endswith("/"):
+                    zf.writestr(_zip_info(arcname, mode, item.created_at), b"")
+                    continue
+                digest = hashlib.sha256(data).hexdigest()
+                first = seen.get(digest)
+                if dedup and data and first is not None and first[0] != item.id:
+                    entry["files"].append({"path": arcname, "same_as": first[1]})
+                    continue
+                seen.setdefault(digest, (item.id, arcname))
+                zf.writestr(_zip_info(arcname, mode, item.created_at), data)
+                entry["files"].append({"path": arcname, "size": len(data), "sha256": digest})
+                if sink.size >= CHUNK_BYTES:
+                    yield sink.drain()
+            listing.append(entry)
+            if sink.size >= CHUNK_BYTES:
+                yield sink.drain()
+        if manifest:
+            body = json.dumps({"version": 1, "items": listing}, ensure_ascii=False, indent=2)
+            zf.writestr(_zip_info("manifest.json", 0o644, datetime.utcnow()), body.encode("utf-8"))
+    yield sink.drain()